@@ -0,0 +1,103 @@
+"""
+Payload size and latency benchmark for sparse fieldsets and compression.
+
+Builds a throwaway in-memory database with one collection of N
+contributors, then requests the dashboard and collection endpoints with
+and without ``?fields=`` and with each Accept-Encoding, reporting body
+size on the wire and median server time.
+
+Usage:
+    python benchmarks/payloads.py
+    python benchmarks/payloads.py --contributors 2000 --runs 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+CASES = [
+    ("dashboard, all fields", "dashboard/", ""),
+    ("dashboard, name+status", "dashboard/", "?fields=name,payment_status"),
+    ("collection, all fields", "", ""),
+    ("collection, title+status", "", "?fields=title,status"),
+]
+ENCODINGS = ["identity", "gzip", "br"]
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "kontribute.settings")
+    import django
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = ":memory:"
+    settings.SHARD_DATABASES = ["default"]
+    settings.REPLICA_DATABASES = []
+    django.setup()
+
+    from django.core.management import call_command
+
+    call_command("migrate", verbosity=0)
+
+
+def seed(contributors):
+    from split.models import Collection, Contributor
+
+    collection = Collection.objects.create(
+        title="Benchmark", slug="benchmark", organizer_name="Bench", organizer_phone="08000000000",
+        amount_per_person=1000, number_of_people=contributors, total_amount=1000 * contributors
+    )
+    Contributor.objects.bulk_create([
+        Contributor(
+            collection=collection, name=f"Contributor {i}", phone=f"080{i:08d}",
+            phone_e164=f"+23480{i:08d}", email=f"c{i}@example.com", amount_owed=1000,
+            amount_paid=1000 if i % 2 else 0, payment_status="paid" if i % 2 else "pending",
+            payment_reference=f"KTR-BENCH{i:06d}"
+        )
+        for i in range(contributors)
+    ])
+    return collection.slug
+
+
+def measure(client, url, encoding, runs):
+    sizes, times = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = client.get(url, HTTP_ACCEPT_ENCODING=encoding)
+        times.append(time.perf_counter() - start)
+        sizes.append(len(result.content))
+    return sizes[-1], statistics.median(times), result.get("Content-Encoding", "identity")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--contributors", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import Client
+
+    slug = seed(args.contributors)
+    client = Client()
+
+    print(f"== {args.contributors} contributors, median of {args.runs} runs")
+    # Sizes are relative to the endpoint's full, uncompressed response (listed first)
+    baselines = {}
+    for label, suffix, query in CASES:
+        url = f"/api/collections/{slug}/{suffix}{query}"
+        for encoding in ENCODINGS:
+            size, seconds, used = measure(client, url, encoding, args.runs)
+            baseline = baselines.setdefault(suffix, size)
+            print(
+                f"   {label:26s} {used:9s} {size:>10,d} B ({size / baseline:6.1%})"
+                f"  {seconds * 1000:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
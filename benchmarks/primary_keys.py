@@ -0,0 +1,128 @@
+"""
+Insert and lookup benchmark for random vs time-ordered primary keys.
+
+Fills one SQLite table per key scheme, using the schema Django generates
+for a UUIDField primary key on SQLite (char(32) hex), with a page cache
+much smaller than the table so index locality matters. Reports insert
+throughput over the whole load and over its last tenth (once the index
+no longer fits in cache), the index size, and point lookups of random
+and of recent rows.
+
+Schemes:
+    uuid4     random keys (what every table used before)
+    uuid7     kontribute.ids.uuid7, used for collections, transactions, withdrawals
+    bucketed  kontribute.ids.bucketed_uuid, used for contributors; ordered per
+              bucket, so it gains less the more collections (--buckets)
+              take contributions at the same time
+
+Usage:
+    python benchmarks/primary_keys.py
+    python benchmarks/primary_keys.py --rows 2000000 --cache-mb 16
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+from kontribute.ids import bucketed_uuid, uuid7  # noqa: E402
+
+BATCH = 1000
+
+
+def schemes(buckets):
+    bucket_list = list(range(buckets))
+    return {
+        "uuid4": uuid.uuid4,
+        "uuid7": uuid7,
+        "bucketed": lambda: bucketed_uuid(random.choice(bucket_list)),
+    }
+
+
+def load(path, make_id, rows, cache_mb):
+    connection = sqlite3.connect(path, isolation_level=None)
+    connection.execute(f"PRAGMA cache_size = -{cache_mb * 1024}")
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("PRAGMA synchronous = NORMAL")
+    connection.execute(
+        'CREATE TABLE "row" ("id" char(32) NOT NULL PRIMARY KEY, "amount" decimal NOT NULL, "status" varchar(20) NOT NULL)'
+    )
+
+    ids = []
+    tail_start = rows - rows // 10
+    tail_seconds = 0.0
+    start = time.perf_counter()
+    for offset in range(0, rows, BATCH):
+        batch = [make_id().hex for _ in range(min(BATCH, rows - offset))]
+        ids.extend(batch)
+        batch_start = time.perf_counter()
+        connection.execute("BEGIN")
+        connection.executemany(
+            'INSERT INTO "row" ("id", "amount", "status") VALUES (?, 1000, \'pending\')',
+            [(row_id,) for row_id in batch]
+        )
+        connection.execute("COMMIT")
+        if offset >= tail_start:
+            tail_seconds += time.perf_counter() - batch_start
+    total_seconds = time.perf_counter() - start
+    return connection, ids, total_seconds, tail_seconds
+
+
+def lookup(connection, ids, count):
+    start = time.perf_counter()
+    for row_id in ids[:count]:
+        connection.execute('SELECT "amount" FROM "row" WHERE "id" = ?', (row_id,)).fetchone()
+    return count / (time.perf_counter() - start)
+
+
+def index_pages(connection):
+    try:
+        return connection.execute(
+            "SELECT count(*) FROM dbstat WHERE name = 'sqlite_autoindex_row_1'"
+        ).fetchone()[0]
+    except sqlite3.OperationalError:
+        # SQLite built without the dbstat table
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    parser.add_argument("--cache-mb", type=int, default=4, help="SQLite page cache per connection")
+    parser.add_argument("--buckets", type=int, default=64, help="Buckets receiving contributors at the same time (max 1024)")
+    args = parser.parse_args()
+
+    tail_rows = args.rows // 10
+    print(f"== {args.rows:,} rows, {args.cache_mb} MB page cache")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, make_id in schemes(args.buckets).items():
+            path = os.path.join(directory, f"{name}.sqlite3")
+            connection, ids, total_seconds, tail_seconds = load(path, make_id, args.rows, args.cache_mb)
+
+            recent = ids[-tail_rows:]
+            random.shuffle(recent)
+            random.shuffle(ids)
+            random_rate = lookup(connection, ids, args.lookups)
+            recent_rate = lookup(connection, recent, args.lookups)
+            pages = index_pages(connection)
+            connection.close()
+
+            print(
+                f"   {name:9s} insert {args.rows / total_seconds:>9,.0f} rows/s"
+                f" (last 10%: {tail_rows / tail_seconds:>9,.0f})"
+                f"  lookup random {random_rate:>8,.0f}/s  recent {recent_rate:>8,.0f}/s"
+                f"  index {pages if pages is not None else '?':>7} pages"
+                f"  file {os.path.getsize(path) / 2 ** 20:6.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
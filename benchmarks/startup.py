@@ -0,0 +1,89 @@
+"""
+Cold-start benchmark for worker processes.
+
+For each settings module, spawns fresh interpreters under
+``python -X importtime`` that set up Django, build the WSGI handler and
+resolve the URLconf (what a gunicorn worker does before its first
+request), then reports wall time, total import time and peak RSS, plus
+the slowest top-level imports.
+
+Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --settings kontribute.settings kontribute.settings_api
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+WORKER_BOOT = (
+    "import django; django.setup(); "
+    "from kontribute.wsgi import application; "
+    "from django.urls import get_resolver; get_resolver().url_patterns; "
+    "import resource; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+)
+
+# import time: self [us] | cumulative | imported package
+IMPORTTIME_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)")
+
+
+def boot_once(settings_module):
+    """Boot one worker; returns (wall seconds, peak RSS in KB, {top-level import: microseconds})"""
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings_module}
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", WORKER_BOOT],
+        cwd=BASE_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - start
+    if result.returncode:
+        raise SystemExit(f"{settings_module} failed to boot:\n{result.stderr}")
+
+    top_level = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # One space of indentation marks an import made by the boot script itself
+        if match and len(match.group(2)) == 1:
+            top_level[match.group(3)] = int(match.group(1))
+
+    rss_kb = int(result.stdout.strip().splitlines()[-1])
+    return wall, rss_kb, top_level
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    parser.add_argument("--settings", nargs="+", default=["kontribute.settings", "kontribute.settings_api"])
+    args = parser.parse_args()
+
+    for settings_module in args.settings:
+        walls, rss, imports = [], [], []
+        slowest = {}
+        for _ in range(args.runs):
+            wall, rss_kb, top_level = boot_once(settings_module)
+            walls.append(wall)
+            rss.append(rss_kb)
+            imports.append(sum(top_level.values()))
+            for name, micros in top_level.items():
+                slowest[name] = max(slowest.get(name, 0), micros)
+
+        print(f"== {settings_module} ({args.runs} runs)")
+        print(f"   wall time    median {statistics.median(walls) * 1000:8.1f} ms   min {min(walls) * 1000:8.1f} ms")
+        print(f"   import time  median {statistics.median(imports) / 1000:8.1f} ms")
+        print(f"   peak RSS     median {statistics.median(rss) / 1024:8.1f} MB")
+        for name, micros in sorted(slowest.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"      {micros / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Outbound requests to user-supplied URLs
+
+Webhook URLs are chosen by whoever subscribes, so they must not reach
+the server's own network: loopback, private ranges, link-local (cloud
+metadata at 169.254.169.254) and the like. Looking at the host name is
+not enough. Any DNS name can resolve to 127.0.0.1, and a name can
+resolve to a public address when it is checked and to an internal one
+when the request is sent (DNS rebinding). So:
+
+- check_url() resolves the host and rejects the URL unless every
+  address is public; it runs when a subscription is created.
+- PinnedTransport wraps an httpx async transport. It resolves and checks
+  the host again for every request, then connects to the address it
+  checked, keeping the original Host header and TLS server name.
+"""
+import asyncio
+import ipaddress
+import socket
+from urllib.parse import urlsplit
+
+SCHEMES = {'http': 80, 'https': 443}
+
+# Host names that never point at a public server
+LOCAL_HOST_SUFFIXES = ('localhost', '.localhost', '.local', '.internal', '.home.arpa')
+
+
+class UnsafeURL(ValueError):
+    pass
+
+
+def resolve(host, port):
+    """Every address `host` resolves to"""
+    return [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+
+
+def _ip_literal(host):
+    try:
+        return ipaddress.ip_address(host)
+    except ValueError:
+        pass
+    try:
+        # Shorthand IPv4 forms resolvers accept, like 127.1 or 2130706433
+        return ipaddress.ip_address(socket.inet_aton(host))
+    except OSError:
+        return None
+
+
+def is_public_address(address):
+    """False for loopback, private, link-local and other non-public addresses"""
+    if getattr(address, 'ipv4_mapped', None):
+        address = address.ipv4_mapped
+    return address.is_global
+
+
+def public_addresses(host, port):
+    """The addresses `host` resolves to, if all of them are public. Raises UnsafeURL otherwise."""
+    host = host.rstrip('.').lower()
+    if host == 'localhost' or host.endswith(LOCAL_HOST_SUFFIXES):
+        raise UnsafeURL("URL must point at a public host")
+
+    literal = _ip_literal(host)
+    if literal is not None:
+        addresses = [literal]
+    else:
+        try:
+            # Scoped IPv6 results look like fe80::1%eth0
+            addresses = [ipaddress.ip_address(address.split('%')[0]) for address in resolve(host, port)]
+        except (OSError, UnicodeError, ValueError):
+            addresses = []
+        if not addresses:
+            raise UnsafeURL("URL host could not be resolved")
+
+    if not all(is_public_address(address) for address in addresses):
+        raise UnsafeURL("URL must point at a public host")
+    return addresses
+
+
+def check_url(url):
+    """Resolve and check an http(s) URL's host. Returns its addresses or raises UnsafeURL."""
+    parts = urlsplit(url)
+    if parts.scheme not in SCHEMES:
+        raise UnsafeURL("URL must use http or https")
+    if not parts.hostname:
+        raise UnsafeURL("URL must point at a public host")
+    try:
+        port = parts.port or SCHEMES[parts.scheme]
+    except ValueError:
+        raise UnsafeURL("URL has an invalid port")
+    return public_addresses(parts.hostname, port)
+
+
+class PinnedTransport:
+    """
+    httpx async transport that only connects to checked public addresses.
+    It wraps another transport instead of subclassing httpx's, so this
+    module imports without httpx installed.
+    """
+
+    def __init__(self, transport):
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        import httpx
+
+        url = request.url
+        if url.scheme not in SCHEMES:
+            raise httpx.UnsupportedProtocol("URL must use http or https", request=request)
+        try:
+            addresses = await asyncio.get_running_loop().run_in_executor(
+                None, public_addresses, url.host, url.port or SCHEMES[url.scheme]
+            )
+        except UnsafeURL as e:
+            raise httpx.ConnectError(str(e), request=request)
+
+        # The Host header was set from the original URL; TLS still checks the name
+        request.url = url.copy_with(host=str(addresses[0]))
+        request.extensions = {**request.extensions, 'sni_hostname': url.host}
+        return await self.transport.handle_async_request(request)
+
+    async def __aenter__(self):
+        await self.transport.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.transport.__aexit__(*exc_info)
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,61 @@
+"""
+Time-ordered UUIDs for primary keys
+
+Random (version 4) keys land anywhere in the primary key index, so on a
+large table every insert dirties a random leaf page and lookups of
+recent rows are spread over the whole index. uuid7() follows RFC 9562:
+the first 48 bits are the Unix time in milliseconds, so new keys are
+appended at the right-hand edge of the index and recent rows, the ones
+that get read, share pages.
+
+Contributor ids must also carry their shard bucket in the first two
+bytes (see kontribute.sharding), which the version 7 layout has no room
+for. bucketed_uuid() is a version 8 (custom layout) UUID:
+
+    bucket (16) | time_hi (32) | version 8 (4) | time_lo (12) | variant (2) | random (62)
+
+where time is a 44-bit millisecond timestamp (good until the year 2527).
+Ids are time-ordered within a bucket, so inserts go to one of BUCKETS
+append points instead of a random one.
+
+Both are ordinary 128-bit UUIDs, so existing version 4 keys (and the
+receipt URLs built from them) stay valid next to the new ones.
+"""
+import os
+import time
+import uuid
+
+_TIMESTAMP_44 = (1 << 44) - 1
+_TIMESTAMP_48 = (1 << 48) - 1
+_VARIANT = 0b10 << 62
+
+
+def _now_ms():
+    return time.time_ns() // 1_000_000
+
+
+def uuid7(ms=None):
+    """Version 7 UUID: millisecond timestamp, then 74 random bits"""
+    ms = _now_ms() if ms is None else ms
+    rand_a = int.from_bytes(os.urandom(2), 'big') & 0xFFF
+    rand_b = int.from_bytes(os.urandom(8), 'big') >> 2
+    return uuid.UUID(int=(ms & _TIMESTAMP_48) << 80 | 7 << 76 | rand_a << 64 | _VARIANT | rand_b)
+
+
+def bucketed_uuid(bucket, ms=None):
+    """Version 8 UUID with `bucket` in the first two bytes, then a millisecond timestamp"""
+    ms = (_now_ms() if ms is None else ms) & _TIMESTAMP_44
+    rand = int.from_bytes(os.urandom(8), 'big') >> 2
+    return uuid.UUID(
+        int=(bucket & 0xFFFF) << 112 | (ms >> 12) << 80 | 8 << 76 | (ms & 0xFFF) << 64 | _VARIANT | rand
+    )
+
+
+def uuid_timestamp(value):
+    """Creation time (Unix milliseconds) of a version 7 or bucketed id, None for other versions"""
+    value = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    if value.version == 7:
+        return value.int >> 80
+    if value.version == 8:
+        return (value.int >> 80 & 0xFFFFFFFF) << 12 | (value.int >> 64 & 0xFFF)
+    return None
@@ -0,0 +1,99 @@
+"""
+Structured, non-blocking logging
+
+- RequestIdMiddleware gives every request an id (the incoming
+  X-Request-ID header when it looks sane, otherwise a new one), echoes it
+  in the response and exposes it to log records through RequestIdFilter.
+- JsonFormatter renders one JSON object per line: time, level, logger,
+  message, request_id, any `extra={...}` fields and the traceback.
+- QueuedStreamHandler formats records on the calling thread but hands
+  the writing to a QueueListener thread, so a slow stdout/pipe never
+  blocks a request.
+
+Wired up in settings.LOGGING.
+"""
+import contextvars
+import json
+import logging
+import queue
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+REQUEST_ID_HEADER = 'HTTP_X_REQUEST_ID'
+VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else came from extra={...}
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'taskName'}
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class RequestIdMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.META.get(REQUEST_ID_HEADER, '')
+        request_id = incoming if VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        request.request_id = request_id
+
+        token = _request_id.set(request_id)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_id.reset(token)
+        response['X-Request-ID'] = request_id
+        return response
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        request_id = _request_id.get()
+        if request_id is None:
+            # django.request logs after the middleware has returned, but passes the request
+            request_id = getattr(getattr(record, 'request', None), 'request_id', None)
+        record.request_id = request_id
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, default=str)
+
+
+class QueuedStreamHandler(QueueHandler):
+    """QueueHandler feeding a background QueueListener that writes to a stream"""
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.target = logging.StreamHandler(stream or sys.stdout)
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def close(self):
+        # Called by logging.shutdown() at exit: drain the queue, then stop
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self.target.close()
+        super().close()
@@ -0,0 +1,113 @@
+"""
+Opt-in request profiling
+
+ProfilingMiddleware runs pyinstrument (a sampling profiler) around a
+request when either
+
+- it carries the header `X-Kontribute-Profile: <settings.PROFILING_TOKEN>`, or
+- it is picked by the random sample (settings.PROFILING_SAMPLE_RATE, 0-1).
+
+The HTML report is stored as a RequestProfile together with the route,
+slug, status, duration and number of SQL queries, and the newest
+PROFILING_KEEP profiles are kept. Staff browse them at /api/profiles/.
+
+With no token and a zero sample rate (the default) the middleware
+removes itself at startup, so it costs nothing. pyinstrument is an
+optional dependency, only imported when profiling is enabled.
+"""
+import logging
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'HTTP_X_KONTRIBUTE_PROFILE'
+# The profile index itself is never profiled
+SKIP_PREFIXES = ('/api/profiles/',)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.token = getattr(settings, 'PROFILING_TOKEN', '')
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0)
+        self.keep = getattr(settings, 'PROFILING_KEEP', 200)
+        if not self.token and not self.sample_rate:
+            raise MiddlewareNotUsed()
+
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            logger.warning("Profiling is configured but pyinstrument is not installed")
+            raise MiddlewareNotUsed()
+        self.profiler_class = Profiler
+
+    def _trigger(self, request):
+        if request.path.startswith(SKIP_PREFIXES):
+            return None
+        header = request.META.get(PROFILE_HEADER)
+        if header and self.token and constant_time_compare(header, self.token):
+            return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sample'
+        return None
+
+    def __call__(self, request):
+        trigger = self._trigger(request)
+        if trigger is None:
+            return self.get_response(request)
+
+        counter = QueryCounter()
+        profiler = self.profiler_class(async_mode='disabled')
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+        duration_ms = (time.perf_counter() - start) * 1000
+
+        try:
+            self._save(request, response, trigger, duration_ms, counter.count, profiler.output_html())
+        except Exception:
+            logger.exception("Could not store the profile for %s", request.path)
+        return response
+
+    def _save(self, request, response, trigger, duration_ms, query_count, html):
+        from split.models import RequestProfile
+
+        match = request.resolver_match
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:500],
+            route=match.route[:200] if match else '',
+            slug=str(match.kwargs.get('slug', ''))[:100] if match else '',
+            status_code=response.status_code,
+            duration_ms=duration_ms,
+            query_count=query_count,
+            trigger=trigger,
+            html=html
+        )
+        response['X-Kontribute-Profile-Id'] = str(profile.pk)
+
+        stale = RequestProfile.objects.order_by('-pk').values_list('pk', flat=True)[self.keep:self.keep + 1]
+        if stale:
+            RequestProfile.objects.filter(pk__lte=stale[0]).delete()
@@ -0,0 +1,107 @@
+"""
+Read-replica routing
+
+ReplicaRoutingMiddleware marks safe (GET/HEAD/OPTIONS) requests as
+replica-eligible and ReplicaRouter then sends their reads to one of the
+aliases in settings.REPLICA_DATABASES. Everything else - writes, unsafe
+requests, management commands and workers - uses "default".
+
+Read-your-writes: after an unsafe request the client is pinned to the
+primary for REPLICA_STICKY_SECONDS, both with a cookie and with a cache
+marker keyed by client address (for clients that drop cookies), so a
+GET right after a POST never sees a lagging replica.
+
+A replica that can't be connected to is skipped for
+REPLICA_RETRY_SECONDS (per process); with none left, reads go to the
+primary.
+"""
+import contextvars
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = 'kontribute_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+# alias: time.monotonic() until which it is not tried again
+_down_until = {}
+
+
+def replica_aliases():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 5)
+
+
+def retry_seconds():
+    return getattr(settings, 'REPLICA_RETRY_SECONDS', 30)
+
+
+def _available(alias):
+    if _down_until.get(alias, 0) > time.monotonic():
+        return False
+    try:
+        # A no-op once the connection is open
+        connections[alias].ensure_connection()
+    except DatabaseError as e:
+        _down_until[alias] = time.monotonic() + retry_seconds()
+        logger.warning("Replica %s is unavailable, reading from the primary: %s", alias, e)
+        return False
+    return True
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if replicas and _use_replica.get():
+            for alias in random.sample(replicas, len(replicas)):
+                if _available(alias):
+                    return alias
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any alias can relate
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+def _client_marker(request):
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    address = forwarded.split(',')[0].strip() or request.META.get('REMOTE_ADDR', '')
+    return f"replica-sticky:{address}"
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in SAFE_METHODS
+        pinned = STICKY_COOKIE in request.COOKIES or cache.get(_client_marker(request))
+
+        token = _use_replica.set(bool(safe and not pinned and replica_aliases()))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+
+        if not safe and replica_aliases():
+            response.set_cookie(STICKY_COOKIE, '1', max_age=sticky_seconds(), httponly=True, samesite='Lax')
+            cache.set(_client_marker(request), True, sticky_seconds())
+
+        return response
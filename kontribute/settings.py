@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,9 +45,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "kontribute.log.RequestIdMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "kontribute.compression.CompressionMiddleware",
+    "kontribute.profiling.ProfilingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
+    "kontribute.routers.ReplicaRoutingMiddleware",
+    "kontribute.sharding.ShardRoutingMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
@@ -85,6 +91,36 @@ DATABASES = {
     }
 }
 
+# Read replicas: comma-separated SQLite paths in KONTRIBUTE_REPLICA_DBS
+# (e.g. copies of db.sqlite3 for local testing). GET requests read from
+# these unless the client wrote something in the last few seconds.
+REPLICA_DATABASES = []
+for index, replica_path in enumerate(filter(None, os.environ.get("KONTRIBUTE_REPLICA_DBS", "").split(","))):
+    alias = f"replica{index + 1}"
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": replica_path.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(alias)
+
+# Shards: comma-separated SQLite paths in KONTRIBUTE_SHARD_DBS. "default"
+# is always shard one; collections are spread over all of them by slug
+# hash (see kontribute/sharding.py).
+SHARD_DATABASES = ["default"]
+for index, shard_path in enumerate(filter(None, os.environ.get("KONTRIBUTE_SHARD_DBS", "").split(","))):
+    alias = f"shard{index + 2}"
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": shard_path.strip(),
+    }
+    SHARD_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ["kontribute.sharding.ShardRouter", "kontribute.routers.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = int(os.environ.get("KONTRIBUTE_REPLICA_STICKY_SECONDS", 5))
+# A replica that fails to connect is skipped for this long
+REPLICA_RETRY_SECONDS = int(os.environ.get("KONTRIBUTE_REPLICA_RETRY_SECONDS", 30))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -126,4 +162,51 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+# JSON logs with request ids, written to stdout off the request thread (kontribute/log.py)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "filters": {
+        "request_id": {"()": "kontribute.log.RequestIdFilter"},
+    },
+    "formatters": {
+        "json": {"()": "kontribute.log.JsonFormatter"},
+    },
+    "handlers": {
+        "queued": {
+            "class": "kontribute.log.QueuedStreamHandler",
+            "formatter": "json",
+            "filters": ["request_id"],
+        },
+    },
+    "root": {
+        "handlers": ["queued"],
+        "level": os.environ.get("KONTRIBUTE_LOG_LEVEL", "INFO"),
+    },
+    "loggers": {
+        "django": {"handlers": ["queued"], "level": "INFO", "propagate": False},
+        "django.server": {"handlers": ["queued"], "level": "INFO", "propagate": False},
+    },
+}
+
+# Responses smaller than this are not gzip/brotli compressed
+COMPRESSION_MIN_BYTES = int(os.environ.get("KONTRIBUTE_COMPRESSION_MIN_BYTES", 1024))
+
+# Request profiling (pyinstrument), see kontribute/profiling.py. Off unless
+# a token or a sample rate is set.
+PROFILING_TOKEN = os.environ.get("KONTRIBUTE_PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.environ.get("KONTRIBUTE_PROFILING_SAMPLE_RATE", 0))
+PROFILING_KEEP = int(os.environ.get("KONTRIBUTE_PROFILING_KEEP", 200))
+
+# Pending contributions older than this are expired by `manage.py expire_pending`
+PENDING_CONTRIBUTION_TTL_HOURS = int(os.environ.get("KONTRIBUTE_PENDING_TTL_HOURS", 72))
+
+# Card/USSD payment verification, see split/payments.py
+PAYSTACK_SECRET_KEY = os.environ.get("PAYSTACK_SECRET_KEY", "")
+PAYSTACK_BASE_URL = os.environ.get("PAYSTACK_BASE_URL", "https://api.paystack.co")
+
+# Refund payouts for cancelled collections, see split/refunds.py. No default:
+# process_refunds refuses to run until a real provider is configured
+PAYOUT_PROVIDER = os.environ.get("KONTRIBUTE_PAYOUT_PROVIDER", "")
 CORS_ALLOW_ALL_ORIGINS = True
\ No newline at end of file
@@ -0,0 +1,40 @@
+"""
+API-only settings for gunicorn workers, cron jobs and management commands.
+
+Select with DJANGO_SETTINGS_MODULE=kontribute.settings_api. The service
+only speaks JSON, so this drops the admin, sessions, messages,
+staticfiles and template machinery (and their middleware) that the full
+settings load for the admin site. Staff endpoints authenticate with
+HTTP Basic auth here since there are no sessions.
+
+Measure the difference with benchmarks/startup.py.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import INSTALLED_APPS, MIDDLEWARE
+
+API_DROPPED_APPS = [
+    "django.contrib.admin",
+    "django.contrib.sessions",
+    "django.contrib.messages",
+    "django.contrib.staticfiles",
+]
+
+API_DROPPED_MIDDLEWARE = [
+    "django.contrib.sessions.middleware.SessionMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "django.contrib.messages.middleware.MessageMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in API_DROPPED_APPS]
+MIDDLEWARE = [middleware for middleware in MIDDLEWARE if middleware not in API_DROPPED_MIDDLEWARE]
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+    "DEFAULT_AUTHENTICATION_CLASSES": ["rest_framework.authentication.BasicAuthentication"],
+    "UNAUTHENTICATED_USER": None,
+}
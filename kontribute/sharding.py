@@ -0,0 +1,197 @@
+"""
+Sharding of collections across databases
+
+Every collection belongs to one of BUCKETS virtual buckets, derived from
+a hash of its slug. Buckets are placed on the aliases in
+settings.SHARD_DATABASES with a consistent-hash ring, so adding a shard
+only moves the buckets that land on it (see `manage.py rebalance_shards`).
+
+A collection's contributors, transactions, withdrawals, webhooks and
+outbox events live on the same shard. Contributor ids carry the bucket
+in their first two bytes, so /receipts/<uuid>/ routes without a lookup.
+
+ShardRoutingMiddleware picks the shard from the slug or contributor_id
+URL kwarg; workers and fan-out queries use `use_shard(alias)`. Inside a
+shard, ShardRouter sends every ORM call there, so transactions must be
+opened with `atomic(using=current_db())`. Models in GLOBAL_MODELS
+(reference sequences, request profiles) always stay on "default". With a
+single shard configured the router steps aside and nothing changes.
+
+Integer primary keys on the Nth shard start at N * ID_BLOCK, so moved
+rows keep their ids. Outbox event ids in particular are what webhook
+deliveries are deduplicated on, by us and by receivers.
+"""
+import bisect
+import contextvars
+import hashlib
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+
+from .ids import bucketed_uuid
+
+BUCKETS = 1024
+VIRTUAL_NODES = 64
+GLOBAL_MODELS = {'split.referencesequence', 'split.requestprofile'}
+ID_BLOCK = 1 << 48
+
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+
+def shard_aliases():
+    return list(getattr(settings, 'SHARD_DATABASES', None) or ['default'])
+
+
+def is_sharded():
+    return len(shard_aliases()) > 1
+
+
+@lru_cache(maxsize=8)
+def _bucket_table(aliases):
+    ring = sorted(
+        (_hash(f"{alias}#{node}"), alias)
+        for alias in aliases
+        for node in range(VIRTUAL_NODES)
+    )
+    points = [point for point, _ in ring]
+    table = []
+    for bucket in range(BUCKETS):
+        index = bisect.bisect(points, _hash(f"bucket-{bucket}")) % len(ring)
+        table.append(ring[index][1])
+    return table
+
+
+def alias_for_bucket(bucket, aliases=None):
+    return _bucket_table(tuple(aliases or shard_aliases()))[bucket]
+
+
+def bucket_for_slug(slug):
+    return _hash(slug) % BUCKETS
+
+
+def bucket_for_uuid(value):
+    return int.from_bytes(uuid.UUID(str(value)).bytes[:2], 'big') % BUCKETS
+
+
+def shard_for_slug(slug, aliases=None):
+    return alias_for_bucket(bucket_for_slug(slug), aliases)
+
+
+def shard_for_uuid(value, aliases=None):
+    return alias_for_bucket(bucket_for_uuid(value), aliases)
+
+
+def uuid_for_slug(slug):
+    """A time-ordered UUID whose first two bytes hold the slug's bucket (see kontribute.ids)"""
+    return bucketed_uuid(bucket_for_slug(slug))
+
+
+def current_db():
+    """Alias ORM calls are routed to right now"""
+    return _current_shard.get() or 'default'
+
+
+@contextmanager
+def use_shard(alias):
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+def id_floor(alias):
+    """First integer id handed out on `alias`, 0 for the first shard and non-shards"""
+    aliases = shard_aliases()
+    return aliases.index(alias) * ID_BLOCK if alias in aliases else 0
+
+
+def reserve_id_block(connection, tables):
+    """Move the id sequences of `tables` up to the connection's block (never down)"""
+    floor = id_floor(connection.alias)
+    if not floor:
+        return
+    with connection.cursor() as cursor:
+        for table in tables:
+            if connection.vendor == 'sqlite':
+                # AUTOINCREMENT tables continue from the larger of this and their max id
+                cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, %s) WHERE name = %s", [floor, table])
+                if not cursor.rowcount:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, floor])
+            elif connection.vendor == 'postgresql':
+                quoted = connection.ops.quote_name(table)
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {quoted})))",
+                    [quoted, floor]
+                )
+            else:
+                raise NotImplementedError(f"Can't move id sequences on {connection.vendor}")
+
+
+def each_shard():
+    """Yield every shard alias with routing switched to it"""
+    for alias in shard_aliases():
+        with use_shard(alias):
+            yield alias
+
+
+class ShardRouter:
+    def _route(self, model, hints):
+        if not is_sharded():
+            return None
+        if model._meta.label_lower in GLOBAL_MODELS:
+            return 'default'
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return _current_shard.get()
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if not is_sharded():
+            return None
+        return obj1._state.db == obj2._state.db
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard carries the full schema
+        return None
+
+
+def shard_for_view_kwargs(view_kwargs):
+    """Shard picked by a view's slug or contributor_id URL kwarg, None if neither (or unsharded)"""
+    if not is_sharded():
+        return None
+    if 'slug' in view_kwargs:
+        return shard_for_slug(view_kwargs['slug'])
+    if 'contributor_id' in view_kwargs:
+        return shard_for_uuid(view_kwargs['contributor_id'])
+    return None
+
+
+class ShardRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _current_shard.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            _current_shard.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        alias = shard_for_view_kwargs(view_kwargs)
+        if alias:
+            _current_shard.set(alias)
+        return None
@@ -15,10 +15,19 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.apps import apps
 from django.urls import path,include
 
+from split.views import share_collection
+
 urlpatterns = [
-    path("admin/", admin.site.urls),
-    path("api/",include('split.urls'))
+    path("api/",include('split.urls')),
+    # Share page behind the collection_url returned by create_collections
+    path("collections/<slug:slug>/", share_collection, name="share-collection"),
 ]
+
+# The admin is left out of the API-only settings (kontribute.settings_api)
+if apps.is_installed("django.contrib.admin"):
+    from django.contrib import admin
+
+    urlpatterns.append(path("admin/", admin.site.urls))
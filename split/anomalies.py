@@ -0,0 +1,181 @@
+"""
+Online anomaly scoring for contributions and confirmations
+
+make_contribution and confirm_payment call score_contribution() /
+score_confirmation() after they commit; bulk_add_contributors calls
+score_contributions() and the admin's confirm action scores each row. Each call bumps a few sliding
+window counters kept in the Django cache and compares them (and the
+amount) against fixed limits; nothing reads contribution history from
+the database. Anything over a limit becomes a FlaggedEvent in the review
+queue (the FlaggedEvent admin), at most once per rule and key per window.
+
+Counters are split into BUCKETS sub-windows, so the window slides in
+steps of window/BUCKETS. They are only shared between workers when the
+cache is (e.g. Redis or Memcached); with the local-memory cache each
+process counts on its own.
+
+Scoring never fails the request: errors are logged and swallowed.
+"""
+import logging
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import FlaggedEvent
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = 6
+
+# name: (window seconds, limit)
+Rule = namedtuple('Rule', ['window', 'limit'])
+RULES = {
+    # New contributions to one collection
+    'contribution_burst': Rule(60, 20),
+    # Contributions from one phone number across all collections
+    'phone_velocity': Rule(600, 5),
+    # Payments confirmed across one organizer's collections
+    'confirmation_burst': Rule(300, 30),
+}
+# Amounts more than this many times above (or below) the expected share
+AMOUNT_OUTLIER_FACTOR = Decimal('5')
+AMOUNT_FLAG_SECONDS = 3600
+
+
+class SlidingWindowCounter:
+    """Approximate count of hits per key over the last `window` seconds"""
+
+    def __init__(self, name, window, buckets=BUCKETS):
+        self.name = name
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = max(window // buckets, 1)
+
+    def _key(self, key, bucket):
+        return f"anomaly:{self.name}:{key}:{bucket}"
+
+    def hit(self, key, now=None):
+        """Record one hit and return the total over the window"""
+        bucket = int((now or time.time()) // self.bucket_seconds)
+        current = self._key(key, bucket)
+        # Each bucket outlives the window by one bucket, then expires on its own
+        timeout = self.window + self.bucket_seconds
+        if not cache.add(current, 1, timeout):
+            try:
+                cache.incr(current)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(current, 1, timeout)
+
+        keys = [self._key(key, b) for b in range(bucket - self.buckets + 1, bucket + 1)]
+        return sum(cache.get_many(keys).values())
+
+
+COUNTERS = {name: SlidingWindowCounter(name, rule.window) for name, rule in RULES.items()}
+
+
+def _flag(rule, key, collection, contributor, reason, details, window):
+    # One flag per rule and key per window keeps a burst from flooding the queue
+    if not cache.add(f"anomaly:flagged:{rule}:{key}", 1, window):
+        return None
+    logger.warning("Flagged %s for %s: %s", rule, collection.slug, reason)
+    return FlaggedEvent.objects.create(
+        collection=collection,
+        contributor=contributor,
+        rule=rule,
+        reason=reason,
+        details=details
+    )
+
+
+def _check_counter(rule, key, collection, contributor, what):
+    # Memcached keys cannot contain spaces (organizer phones are stored as typed)
+    key = str(key).replace(' ', '')
+    count = COUNTERS[rule].hit(key)
+    window, limit = RULES[rule]
+    if count > limit:
+        return _flag(
+            rule, key, collection, contributor,
+            f"{count} {what} in {window}s (limit {limit})",
+            {'count': count, 'window': window, 'limit': limit, 'key': key},
+            window
+        )
+    return None
+
+
+def expected_amount(collection):
+    """What one contributor is expected to pay, if the collection says"""
+    if collection.amount_per_person:
+        return collection.amount_per_person
+    if collection.total_amount and collection.number_of_people:
+        return collection.total_amount / collection.number_of_people
+    return None
+
+
+def _check_amount(collection, contributor):
+    amount = Decimal(str(contributor.amount_owed or 0))
+    expected = expected_amount(collection)
+    if expected:
+        expected = Decimal(str(expected))
+        if amount > expected * AMOUNT_OUTLIER_FACTOR or amount * AMOUNT_OUTLIER_FACTOR < expected:
+            reason = f"Amount {amount} vs expected {expected}"
+        else:
+            return None
+    elif collection.total_amount and amount > collection.total_amount:
+        expected = collection.total_amount
+        reason = f"Amount {amount} exceeds the collection target {expected}"
+    else:
+        return None
+
+    return _flag(
+        'amount_outlier', contributor.pk, collection, contributor, reason,
+        {'amount': amount, 'expected': expected},
+        AMOUNT_FLAG_SECONDS
+    )
+
+
+def score_contribution(contributor, collection):
+    """Score a newly created contribution. Returns the FlaggedEvents raised."""
+    try:
+        flags = [
+            _check_counter('contribution_burst', collection.pk, collection, contributor, "contributions"),
+            _check_counter('phone_velocity', contributor.phone_e164 or contributor.phone, collection,
+                           contributor, "contributions from this phone"),
+            _check_amount(collection, contributor),
+        ]
+    except Exception:
+        logger.exception("Anomaly scoring failed for contributor %s", contributor.pk)
+        return []
+    return [flag for flag in flags if flag]
+
+
+def score_contributions(contributors, collection):
+    """
+    Score contributors an organizer added in one go. Returns the FlaggedEvents raised.
+    An import is a burst by design, so only phone velocity and amounts are checked.
+    """
+    try:
+        flags = []
+        for contributor in contributors:
+            flags.append(_check_counter('phone_velocity', contributor.phone_e164 or contributor.phone, collection,
+                                        contributor, "contributions from this phone"))
+            flags.append(_check_amount(collection, contributor))
+    except Exception:
+        logger.exception("Anomaly scoring failed for contributors added to %s", collection.slug)
+        return []
+    return [flag for flag in flags if flag]
+
+
+def score_confirmation(contributor, collection):
+    """Score an organizer confirming a payment. Returns the FlaggedEvents raised."""
+    try:
+        flags = [
+            _check_counter('confirmation_burst', collection.organizer_phone, collection, contributor,
+                           "confirmations by this organizer"),
+        ]
+    except Exception:
+        logger.exception("Anomaly scoring failed for confirmation of %s", contributor.pk)
+        return []
+    return [flag for flag in flags if flag]
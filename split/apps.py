@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class SplitConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "split"
+
+    def ready(self):
+        # Registers outbox handlers
+        from . import sharing, webhooks  # noqa: F401
@@ -0,0 +1,176 @@
+"""
+Batched API requests
+
+POST /api/batch/ carries several sub-requests against the routes in
+split/urls.py. Each one is resolved and its view called in-process,
+with the outer request's headers, cookies and user, so an app screen
+that needs get_collection, get_dashboard and send_reminders pays for
+one round trip instead of three. Views, permissions and throttles run
+exactly as they would for a direct call; only the middleware stack is
+skipped (the batch request itself went through it), so the shard is
+picked here from the sub-request's URL kwargs the same way
+ShardRoutingMiddleware does it.
+
+Sub-requests run in order on the request's thread and share its
+database connection. They are not one transaction: each commits (or
+fails) on its own, just as separate calls would. With "parallel": true,
+consecutive GETs run concurrently on a small thread pool; every worker
+thread opens its own connection and closes it when done, so this only
+pays off for slow reads. Unsafe sub-requests always run alone, in order,
+and act as barriers between parallel groups.
+"""
+import contextvars
+import io
+import json
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+
+from kontribute.sharding import shard_for_view_kwargs, use_shard
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUESTS = 20
+MAX_WORKERS = 4
+METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+API_NAMESPACE = 'kontribute'
+BATCH_URL_NAME = 'batch'
+
+# Attributes middleware puts on the request that views and authentication read
+INHERITED_ATTRIBUTES = ('user', 'session', 'request_id')
+
+# Headers that say nothing once the body is embedded in the batch response
+OMITTED_HEADERS = ('Content-Type', 'Content-Length', 'Allow', 'Vary')
+
+SubRequest = namedtuple('SubRequest', ['id', 'method', 'path', 'query', 'body', 'match'])
+
+
+class BatchError(ValueError):
+    pass
+
+
+def parse(payload):
+    """Validate the batch payload. Returns the list of SubRequests or raises BatchError."""
+    items = payload.get('requests') if isinstance(payload, dict) else None
+    if not isinstance(items, list) or not items:
+        raise BatchError("requests must be a non-empty list")
+    if len(items) > MAX_REQUESTS:
+        raise BatchError(f"A maximum of {MAX_REQUESTS} requests can be batched")
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BatchError(f"Request {index} must be an object")
+        method = str(item.get('method') or 'GET').upper()
+        if method not in METHODS:
+            raise BatchError(f"Request {index}: method must be one of {', '.join(METHODS)}")
+        path, _, query = str(item.get('path') or '').partition('?')
+        if not path.startswith('/api/'):
+            raise BatchError(f"Request {index}: path must start with /api/")
+
+        try:
+            match = resolve(path)
+        except Resolver404:
+            match = None
+        if match is not None:
+            if API_NAMESPACE not in match.namespaces:
+                match = None
+            elif match.url_name == BATCH_URL_NAME:
+                raise BatchError(f"Request {index}: batches cannot be nested")
+
+        parsed.append(SubRequest(
+            id=item.get('id', index),
+            method=method,
+            path=path,
+            query=query,
+            body=item.get('body'),
+            match=match
+        ))
+    return parsed
+
+
+def _build_request(request, sub):
+    body = b'' if sub.body is None else json.dumps(sub.body).encode()
+    environ = dict(request.META)
+    environ.update({
+        'REQUEST_METHOD': sub.method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': sub.path,
+        'QUERY_STRING': sub.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': io.BytesIO(body),
+    })
+    sub_request = WSGIRequest(environ)
+    for name in INHERITED_ATTRIBUTES:
+        if hasattr(request, name):
+            setattr(sub_request, name, getattr(request, name))
+    sub_request.resolver_match = sub.match
+    return sub_request
+
+
+def _result(sub, response):
+    result = {'id': sub.id, 'status': response.status_code}
+    if getattr(response, 'data', None) is not None:
+        result['body'] = response.data
+    elif response.streaming:
+        result['body'] = None
+    elif response.get('Content-Type', '').startswith('application/json'):
+        result['body'] = json.loads(response.content or b'null')
+    else:
+        result['body'] = response.content.decode(response.charset, errors='replace')
+    headers = {name: value for name, value in response.items() if name not in OMITTED_HEADERS}
+    if headers:
+        result['headers'] = headers
+    return result
+
+
+def run_one(request, sub):
+    """Call one sub-request's view and return its result entry"""
+    if sub.match is None:
+        return {'id': sub.id, 'status': 404, 'body': {'status': 'failed', 'message': "Not found"}}
+
+    match = sub.match
+    try:
+        with use_shard(shard_for_view_kwargs(match.kwargs)):
+            response = match.func(_build_request(request, sub), *match.args, **match.kwargs)
+    except Exception:
+        logger.exception("Batched %s %s failed", sub.method, sub.path)
+        return {'id': sub.id, 'status': 500, 'body': {'status': 'failed', 'message': "Internal server error"}}
+    return _result(sub, response)
+
+
+def _run_in_thread(request, sub):
+    try:
+        return run_one(request, sub)
+    finally:
+        # Worker threads get their own connections; don't leave them open
+        connections.close_all()
+
+
+def run(request, subs, parallel=False):
+    """Run the sub-requests of a batch. Returns their results in request order."""
+    results = [None] * len(subs)
+    index = 0
+    while index < len(subs):
+        end = index + 1
+        if parallel and subs[index].method == 'GET':
+            while end < len(subs) and subs[end].method == 'GET':
+                end += 1
+
+        if end - index == 1:
+            results[index] = run_one(request, subs[index])
+        else:
+            with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, end - index)) as pool:
+                futures = [
+                    # Each task gets its own copy of the context (shard, request id)
+                    pool.submit(contextvars.copy_context().run, _run_in_thread, request, subs[n])
+                    for n in range(index, end)
+                ]
+                results[index:end] = [future.result() for future in futures]
+        index = end
+    return results
@@ -0,0 +1,73 @@
+"""
+Expiry of abandoned pending contributions
+
+Pending contributors older than settings.PENDING_CONTRIBUTION_TTL_HOURS
+are moved to 'expired' (and their pending payment transactions to
+'failed') in batches, so the partial pending indexes and everything that
+reads them only see live rows.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+
+from kontribute.sharding import current_db
+
+from . import outbox
+from .models import Contributor, Transaction
+
+BATCH_SIZE = 1000
+
+
+def default_ttl():
+    return timedelta(hours=getattr(settings, 'PENDING_CONTRIBUTION_TTL_HOURS', 72))
+
+
+def expire_stale_contributions(ttl=None, batch_size=BATCH_SIZE):
+    """Expire pending contributions older than `ttl`. Returns how many were expired."""
+    cutoff = timezone.now() - (ttl or default_ttl())
+    expired = 0
+
+    while True:
+        with db_transaction.atomic(using=current_db()):
+            rows = list(
+                Contributor.objects.filter(
+                    payment_status='pending',
+                    created_at__lt=cutoff
+                ).select_for_update().order_by('created_at').values_list('id', 'collection_id')[:batch_size]
+            )
+            if not rows:
+                break
+
+            now = timezone.now()
+            ids = [contributor_id for contributor_id, _ in rows]
+            # Re-check the status so a payment confirmed meanwhile is left alone
+            updated = Contributor.objects.filter(id__in=ids, payment_status='pending').update(
+                payment_status='expired',
+                version=F('version') + 1
+            )
+            if updated < len(rows):
+                rows = list(Contributor.objects.filter(
+                    id__in=ids, payment_status='expired'
+                ).values_list('id', 'collection_id'))
+                ids = [contributor_id for contributor_id, _ in rows]
+
+            Transaction.objects.filter(
+                contributor_id__in=ids,
+                transaction_type='payment',
+                status='pending'
+            ).update(status='failed', updated_at=now)
+
+            outbox.publish_many(
+                outbox.CONTRIBUTION_EXPIRED,
+                [
+                    {'contributor_id': str(contributor_id), 'collection_id': str(collection_id)}
+                    for contributor_id, collection_id in rows
+                ],
+                collection_ids=[collection_id for _, collection_id in rows]
+            )
+        expired += updated
+
+    return expired
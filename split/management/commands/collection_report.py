@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from split.reports import CHUNK_SIZE, build_report
+
+
+class Command(BaseCommand):
+    help = "Print collection analytics (daily volume, conversion, time-to-pay, top organizers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Only include contributors from the last N days")
+        parser.add_argument('--top', type=int, default=10, help="Number of top organizers to list")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows fetched per chunk")
+
+    def handle(self, *args, **options):
+        report = build_report(
+            days=options['days'],
+            top=options['top'],
+            chunk_size=options['chunk_size']
+        )
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from kontribute.sharding import each_shard
+from split.webhooks import BATCH_SIZE, CONCURRENCY, WebhookSender, deliver_pending
+
+
+class Command(BaseCommand):
+    help = "Deliver queued organizer webhook events in signed batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Events per POST")
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="Parallel requests")
+        parser.add_argument('--loop', action='store_true', help="Keep running")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between rounds (with --loop)")
+
+    def handle(self, *args, **options):
+        sender = WebhookSender(concurrency=options['concurrency'])
+        totals = [0, 0, 0]
+        try:
+            while True:
+                for alias in each_shard():
+                    counts = deliver_pending(sender, batch_size=options['batch_size'])
+                    totals = [t + c for t, c in zip(totals, counts)]
+                if not options['loop']:
+                    break
+                # Waiting between rounds lets bursts coalesce into one batch
+                time.sleep(options['interval'])
+        finally:
+            sender.close()
+
+        self.stdout.write(
+            f"Delivered {totals[0]} event(s), {totals[1]} to retry, {totals[2]} dead-lettered"
+        )
@@ -0,0 +1,21 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from kontribute.sharding import each_shard
+from split.expiry import BATCH_SIZE, default_ttl, expire_stale_contributions
+
+
+class Command(BaseCommand):
+    help = "Expire pending contributions that were never paid"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ttl-hours', type=float, default=None, help="Override PENDING_CONTRIBUTION_TTL_HOURS")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Contributors expired per transaction")
+
+    def handle(self, *args, **options):
+        ttl = timedelta(hours=options['ttl_hours']) if options['ttl_hours'] is not None else default_ttl()
+        expired = 0
+        for alias in each_shard():
+            expired += expire_stale_contributions(ttl=ttl, batch_size=options['batch_size'])
+        self.stdout.write(f"Expired {expired} pending contribution(s) older than {ttl}")
@@ -0,0 +1,51 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from kontribute.sharding import each_shard, shard_for_slug, use_shard
+from split.models import Collection, RefundJob
+from split.refunds import (
+    BATCH_SIZE,
+    CHUNK_SIZE,
+    cancel_collection,
+    get_provider,
+    process_open_jobs,
+    retry_failed
+)
+
+
+class Command(BaseCommand):
+    help = "Refund paid contributors of cancelled collections (resumes unfinished jobs)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cancel', nargs='+', default=[], metavar='SLUG', help="Cancel these collections first")
+        parser.add_argument('--retry-failed', action='store_true', help="Queue failed refunds again")
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Contributors selected per transaction")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Refunds per payout request")
+
+    def handle(self, *args, **options):
+        try:
+            provider = get_provider()
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        for slug in options['cancel']:
+            with use_shard(shard_for_slug(slug)):
+                collection = Collection.objects.filter(slug=slug).first()
+                if collection is None:
+                    raise CommandError(f"No collection with slug {slug}")
+                cancel_collection(collection)
+                self.stdout.write(f"Cancelled {slug}")
+
+        completed = still_open = 0
+        for alias in each_shard():
+            if options['retry_failed']:
+                for job in RefundJob.objects.filter(failed_count__gt=0):
+                    retry_failed(job)
+            counts = process_open_jobs(provider, options['chunk_size'], options['batch_size'])
+            completed += counts[0]
+            still_open += counts[1]
+
+        self.stdout.write(f"Completed {completed} refund job(s), {still_open} still open")
+        for alias in each_shard():
+            for job in RefundJob.objects.filter(failed_count__gt=0).select_related('collection'):
+                self.stdout.write(f"  {job.collection.slug}: {job.failed_count} refund(s) failed")
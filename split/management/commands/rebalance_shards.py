@@ -0,0 +1,117 @@
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, connections, models
+from django.db import transaction as db_transaction
+
+from kontribute.sharding import reserve_id_block, shard_aliases, shard_for_slug
+from split.models import (
+    Collection,
+    CollectionDailyRollup,
+    Contributor,
+    FlaggedEvent,
+    OutboxEvent,
+    RecurringSchedule,
+    RefundJob,
+    Transaction,
+    WebhookDeadLetter,
+    WebhookEvent,
+    WebhookSubscription,
+    Withdrawal
+)
+
+# (model, lookup to the collection id); parents before children
+MOVE_PLAN = [
+    (Collection, 'id'),
+    (Contributor, 'collection_id'),
+    (Transaction, 'collection_id'),
+    (Withdrawal, 'collection_id'),
+    (WebhookSubscription, 'collection_id'),
+    (WebhookEvent, 'subscription__collection_id'),
+    (WebhookDeadLetter, 'subscription__collection_id'),
+    (CollectionDailyRollup, 'collection_id'),
+    (RefundJob, 'collection_id'),
+    (RecurringSchedule, 'collection_id'),
+    (FlaggedEvent, 'collection_id'),
+]
+
+# Tables whose integer ids must not collide across shards (see kontribute.sharding)
+ID_TABLES = [
+    model._meta.db_table
+    for model in [model for model, _ in MOVE_PLAN] + [OutboxEvent]
+    if isinstance(model._meta.pk, models.AutoField)
+]
+
+
+def move_collection(collection_id, source, target):
+    """
+    Copy a collection and everything hanging off it to `target`, keeping
+    primary keys, then delete it from `source`. Safe to run again after
+    a failure: a copy left on `target` by an earlier run is replaced.
+    """
+    with db_transaction.atomic(using=source):
+        with db_transaction.atomic(using=target):
+            # Events first: deleting the collection would only null their collection_id
+            OutboxEvent.objects.using(target).filter(collection_id=collection_id).delete()
+            Collection.objects.using(target).filter(id=collection_id).delete()
+
+            for model, lookup in MOVE_PLAN:
+                rows = list(model.objects.using(source).filter(**{lookup: collection_id}))
+                model.objects.using(target).bulk_create(rows)
+
+            # Undelivered events follow the collection; delivered ones stay behind
+            pending_events = OutboxEvent.objects.using(source).filter(
+                collection_id=collection_id,
+                processed_at__isnull=True
+            )
+            OutboxEvent.objects.using(target).bulk_create(list(pending_events))
+
+        pending_events.delete()
+        Collection.objects.using(source).filter(id=collection_id).delete()
+
+
+class Command(BaseCommand):
+    help = "Move collections whose slug now hashes to a different shard (run after adding shards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would move")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Collections scanned per query")
+
+    def handle(self, *args, **options):
+        aliases = shard_aliases()
+        moved = failed = 0
+
+        if not options['dry_run']:
+            for alias in aliases:
+                reserve_id_block(connections[alias], ID_TABLES)
+
+        for source in aliases:
+            last_id = None
+            while True:
+                keys = Collection.objects.using(source).order_by('id')
+                if last_id is not None:
+                    keys = keys.filter(id__gt=last_id)
+                keys = list(keys.values_list('id', 'slug')[:options['batch_size']])
+                if not keys:
+                    break
+                last_id = keys[-1][0]
+
+                for collection_id, slug in keys:
+                    target = shard_for_slug(slug, aliases)
+                    if target == source:
+                        continue
+                    self.stdout.write(f"{slug}: {source} -> {target}")
+                    if not options['dry_run']:
+                        try:
+                            move_collection(collection_id, source, target)
+                        except IntegrityError as e:
+                            # Ids from before the shards had their own blocks can clash
+                            self.stderr.write(f"{slug}: not moved, {e}")
+                            failed += 1
+                            continue
+                    moved += 1
+
+        verb = "Would move" if options['dry_run'] else "Moved"
+        self.stdout.write(f"{verb} {moved} collection(s)")
+        if failed:
+            self.stdout.write(f"{failed} collection(s) could not be moved")
+        if moved and not options['dry_run']:
+            self.stdout.write("Run `manage.py refresh_rollups --rebuild` to rebuild per-shard totals")
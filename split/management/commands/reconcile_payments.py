@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from kontribute.sharding import each_shard
+from split.payments import CONCURRENCY, SWEEP_LIMIT, PaystackClient, reconcile_pending
+
+
+class Command(BaseCommand):
+    help = "Verify pending card/USSD payments with Paystack and confirm or fail them"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=SWEEP_LIMIT, help="Payments verified per shard per round")
+        parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help="Parallel verification requests")
+        parser.add_argument('--loop', action='store_true', help="Keep running")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between rounds (with --loop)")
+
+    def handle(self, *args, **options):
+        client = PaystackClient(concurrency=options['concurrency'])
+        totals = [0, 0, 0]
+        try:
+            while True:
+                for alias in each_shard():
+                    counts = reconcile_pending(client, limit=options['limit'])
+                    totals = [t + c for t, c in zip(totals, counts)]
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            client.close()
+
+        self.stdout.write(
+            f"Confirmed {totals[0]} payment(s), failed {totals[1]}, {totals[2]} could not be verified"
+        )
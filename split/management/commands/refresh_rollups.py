@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from kontribute.sharding import each_shard
+from split.rollups import BATCH_SIZE, refresh_daily_rollups, reset_daily_rollups
+
+
+class Command(BaseCommand):
+    help = "Update the daily rollup tables with transactions changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Collections recomputed per query")
+        parser.add_argument('--rebuild', action='store_true', help="Drop all rollups and rebuild from scratch")
+
+    def handle(self, *args, **options):
+        # Each shard keeps rollups (and a watermark) for its own collections
+        for alias in each_shard():
+            if options['rebuild']:
+                reset_daily_rollups()
+
+            summary = refresh_daily_rollups(batch_size=options['batch_size'])
+            self.stdout.write(
+                f"[{alias}] Recomputed {summary['buckets']} collection-day bucket(s) across "
+                f"{summary['days']} day(s). Watermark: {summary['watermark']}"
+            )
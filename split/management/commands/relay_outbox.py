@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from kontribute.sharding import each_shard
+from split.outbox import BATCH_SIZE, purge_processed, relay
+
+
+class Command(BaseCommand):
+    help = "Deliver pending outbox events to their registered handlers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Events delivered per batch")
+        parser.add_argument('--loop', action='store_true', help="Keep running, polling for new events")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when idle (with --loop)")
+
+    def handle(self, *args, **options):
+        total_delivered = total_failed = 0
+
+        while True:
+            busy = False
+            for alias in each_shard():
+                delivered, failed = relay(batch_size=options['batch_size'])
+                total_delivered += delivered
+                total_failed += failed
+                busy = busy or delivered + failed >= options['batch_size']
+
+            if not busy:
+                if not options['loop']:
+                    break
+                for alias in each_shard():
+                    purge_processed()
+                time.sleep(options['interval'])
+
+        self.stdout.write(f"Delivered {total_delivered} event(s), {total_failed} failed")
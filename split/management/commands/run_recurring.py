@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from kontribute.sharding import each_shard
+from split.recurring import BATCH_SIZE, run_due_schedules
+
+
+class Command(BaseCommand):
+    help = "Create the next collection for every recurring schedule that is due"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Schedules cloned per batch")
+
+    def handle(self, *args, **options):
+        created = 0
+        for alias in each_shard():
+            created += run_due_schedules(batch_size=options['batch_size'])
+        self.stdout.write(f"Created {created} recurring collection(s)")
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0004_alter_contributor_amount_owed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='collection',
+            name='organizer_phone',
+            field=models.CharField(db_index=True, max_length=20),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0009_organizer_webhooks'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contributor',
+            name='payment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('expired', 'Expired')], default='pending', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='contributor',
+            index=models.Index(condition=models.Q(('payment_status', 'pending')), fields=['collection', 'created_at'], name='contributor_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contributor',
+            index=models.Index(condition=models.Q(('payment_status', 'pending')), fields=['created_at'], name='contributor_pending_age_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0010_contributor_expiry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contributor',
+            name='phone_e164',
+            field=models.CharField(blank=True, db_index=True, max_length=16),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:01
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def to_e164(value):
+    # Frozen copy of serializers.canonical_phone; returns '' for invalid numbers
+    phone = value.replace(' ', '').replace('-', '')
+    if phone.startswith('0') and len(phone) == 11:
+        return '+234' + phone[1:]
+    if phone.startswith('+234') and len(phone) == 14:
+        return phone
+    if phone.startswith('234') and len(phone) == 13:
+        return '+' + phone
+    return ''
+
+
+def backfill_phone_e164(apps, schema_editor):
+    Contributor = apps.get_model('split', 'Contributor')
+    db_alias = schema_editor.connection.alias
+
+    last_id = None
+    while True:
+        rows = Contributor.objects.using(db_alias).filter(phone_e164='').order_by('id')
+        if last_id is not None:
+            rows = rows.filter(id__gt=last_id)
+        batch = list(rows.only('id', 'phone')[:BATCH_SIZE])
+        if not batch:
+            break
+
+        for contributor in batch:
+            contributor.phone_e164 = to_e164(contributor.phone)
+        Contributor.objects.using(db_alias).bulk_update(
+            [c for c in batch if c.phone_e164], ['phone_e164']
+        )
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0011_contributor_phone_e164'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_phone_e164, migrations.RunPython.noop),
+    ]
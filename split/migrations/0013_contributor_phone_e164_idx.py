@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0012_backfill_phone_e164'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contributor',
+            index=models.Index(fields=['collection', 'phone_e164'], name='contributor_phone_e164_idx'),
+        ),
+    ]
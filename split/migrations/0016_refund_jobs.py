@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0015_admin_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='collection',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('closed', 'Closed'), ('withdrawn', 'Withdrawn'), ('cancelled', 'Cancelled')], default='active', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='contributor',
+            name='payment_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('expired', 'Expired'), ('refunded', 'Refunded')], default='pending', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='RefundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('selecting', 'Selecting contributors'), ('submitting', 'Submitting payouts'), ('completed', 'Completed')], default='selecting', max_length=20)),
+                ('cursor', models.UUIDField(blank=True, null=True)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('refunded_count', models.PositiveIntegerField(default=0)),
+                ('failed_count', models.PositiveIntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('collection', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='refund_job', to='split.collection')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'completed'), _negated=True), fields=['created_at'], name='refundjob_open_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:12
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0016_refund_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlaggedEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rule', models.CharField(choices=[('contribution_burst', 'Burst of contributions to one collection'), ('phone_velocity', 'One phone contributing too often'), ('confirmation_burst', 'Burst of confirmations by one organizer'), ('amount_outlier', 'Amount far from the expected contribution')], max_length=30)),
+                ('reason', models.CharField(max_length=255)),
+                ('details', models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('dismissed', 'Dismissed'), ('confirmed', 'Confirmed fraud')], default='open', max_length=20)),
+                ('reviewed_by', models.CharField(blank=True, max_length=150)),
+                ('reviewed_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='flags', to='split.collection')),
+                ('contributor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='flags', to='split.contributor')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'open')), fields=['created_at'], name='flaggedevent_open_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:21
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0018_request_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecurringSchedule',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('interval', models.CharField(choices=[('weekly', 'Weekly'), ('monthly', 'Monthly')], default='monthly', max_length=20)),
+                ('next_run_at', models.DateTimeField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('run_count', models.PositiveIntegerField(default=0)),
+                ('pending_slug', models.SlugField(blank=True, max_length=100)),
+                ('last_slug', models.SlugField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('collection', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_schedules', to='split.collection')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['next_run_at'], name='recurring_due_idx')],
+            },
+        ),
+    ]
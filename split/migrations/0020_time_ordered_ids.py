@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:23
+
+import kontribute.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0019_recurring_schedules'),
+    ]
+
+    # Only the Python-side default changes: existing ids are kept as they
+    # are and new rows get time-ordered ones, so there is nothing to do in
+    # the database (SQLite would otherwise rebuild all four tables)
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='collection',
+                    name='id',
+                    field=models.UUIDField(default=kontribute.ids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='contributor',
+                    name='id',
+                    field=models.UUIDField(default=kontribute.ids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='transaction',
+                    name='id',
+                    field=models.UUIDField(default=kontribute.ids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='withdrawal',
+                    name='id',
+                    field=models.UUIDField(default=kontribute.ids.uuid7, editable=False, primary_key=True, serialize=False),
+                ),
+            ],
+            database_operations=[],
+        ),
+    ]
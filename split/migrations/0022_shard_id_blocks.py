@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:20
+
+from django.db import migrations
+
+from kontribute.sharding import reserve_id_block
+
+# Sharded tables with integer ids, as of this migration
+TABLES = [
+    'split_outboxevent',
+    'split_webhookevent',
+    'split_webhookdeadletter',
+    'split_collectiondailyrollup',
+    'split_refundjob',
+    'split_flaggedevent',
+]
+
+
+def reserve_blocks(apps, schema_editor):
+    reserve_id_block(schema_editor.connection, TABLES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('split', '0021_payment_verify_backoff'),
+    ]
+
+    operations = [
+        migrations.RunPython(reserve_blocks, migrations.RunPython.noop),
+    ]
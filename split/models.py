@@ -1,15 +1,57 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
 import uuid
 from django.utils.text import slugify
 
-class Collection(models.Model):
+from kontribute.ids import uuid7
+
+
+class VersionedModel(models.Model):
+    """Rows with a version counter, updated by compare-and-swap instead of save()"""
+    version = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        abstract = True
+
+    def compare_and_swap(self, expected_version=None, where=None, **changes):
+        """
+        Write `changes` with one conditional UPDATE that only matches while
+        the row is still at `expected_version` (by default the version this
+        instance was loaded with), bumping the version. `where` adds lookups
+        the row must also still match. Returns False if another write got
+        there first; the instance is then left untouched.
+        """
+        expected = self.version if expected_version is None else int(expected_version)
+        now = timezone.now()
+        # update() skips auto_now fields, so fill them in here
+        for field in self._meta.concrete_fields:
+            if getattr(field, 'auto_now', False) and field.name not in changes:
+                changes[field.name] = now
+
+        updated = type(self)._default_manager.using(self._state.db).filter(
+            pk=self.pk,
+            version=expected,
+            **(where or {})
+        ).update(version=expected + 1, **changes)
+        if not updated:
+            return False
+
+        for name, value in changes.items():
+            setattr(self, name, value)
+        self.version = expected + 1
+        return True
+
+
+class Collection(VersionedModel):
     STATUS_CHOICES = [
         ('active', 'Active'),
         ('closed', 'Closed'),
         ('withdrawn', 'Withdrawn'),
+        ('cancelled', 'Cancelled'),
     ]
    
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     slug = models.SlugField(unique=True, max_length=100,blank=True)
    
     # Collection details
@@ -22,7 +64,7 @@ class Collection(models.Model):
    
     # Organizer details
     organizer_name = models.CharField(max_length=100)
-    organizer_phone = models.CharField(max_length=20)
+    organizer_phone = models.CharField(max_length=20, db_index=True)
     organizer_email = models.EmailField(blank=True)
    
     # Withdrawal details
@@ -35,7 +77,7 @@ class Collection(models.Model):
     deadline = models.DateTimeField(null=True, blank=True)
    
     # Tracking
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
    
     # Paystack
@@ -46,7 +88,11 @@ class Collection(models.Model):
     organizer_account_number = models.CharField(max_length=20, blank=True)
     organizer_account_name = models.CharField(max_length=100, blank=True)
 
-
+    class Meta:
+        indexes = [
+            # Admin status filter, newest first
+            models.Index(fields=['status', 'created_at'], name='collection_status_idx'),
+        ]
    
     def __str__(self):
         return self.title
@@ -62,19 +108,23 @@ class Collection(models.Model):
         return self.contributors.filter(payment_status='paid').count()
 
 
-class Contributor(models.Model):
+class Contributor(VersionedModel):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('paid', 'Paid'),
         ('failed', 'Failed'),
+        ('expired', 'Expired'),
+        ('refunded', 'Refunded'),
     ]
    
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='contributors')
    
     # Contributor details
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=20)
+    # E.164 form of phone (+234...), see serializers.canonical_phone
+    phone_e164 = models.CharField(max_length=16, blank=True, db_index=True)
     email = models.EmailField(blank=True)
    
     # Payment details
@@ -87,7 +137,7 @@ class Contributor(models.Model):
     paystack_reference = models.CharField(max_length=100, blank=True)
    
     # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     paid_at = models.DateTimeField(null=True, blank=True)
     
     payment_method = models.CharField(
@@ -103,6 +153,25 @@ class Contributor(models.Model):
     verified_by = models.CharField(max_length=100, blank=True)
     verified_at = models.DateTimeField(null=True, blank=True)
    
+    class Meta:
+        indexes = [
+            # Only live pending rows: pending lists, reminders and the expiry job
+            models.Index(
+                fields=['collection', 'created_at'],
+                condition=models.Q(payment_status='pending'),
+                name='contributor_pending_idx'
+            ),
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(payment_status='pending'),
+                name='contributor_pending_age_idx'
+            ),
+            # Duplicate checks within a collection
+            models.Index(fields=['collection', 'phone_e164'], name='contributor_phone_e164_idx'),
+            # Admin status filter, newest first
+            models.Index(fields=['payment_status', 'created_at'], name='contributor_status_idx'),
+        ]
+   
     def __str__(self):
         return f"{self.name} - {self.collection.title}"
 
@@ -120,7 +189,7 @@ class Transaction(models.Model):
         ('refund', 'Refund'),
     ]
    
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='transactions')
     contributor = models.ForeignKey(Contributor, on_delete=models.SET_NULL, null=True, blank=True)
    
@@ -134,9 +203,24 @@ class Transaction(models.Model):
    
     # Metadata
     metadata = models.JSONField(default=dict, blank=True)
+
+    # Provider checks that left a pending payment unresolved, see split/payments.py
+    verify_attempts = models.PositiveSmallIntegerField(default=0)
+    next_verify_at = models.DateTimeField(null=True, blank=True)
    
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Admin status filter, newest first
+            models.Index(fields=['status', 'created_at'], name='transaction_status_idx'),
+            models.Index(
+                fields=['next_verify_at', 'created_at'],
+                condition=models.Q(status='pending', transaction_type='payment'),
+                name='transaction_verify_due_idx'
+            ),
+        ]
    
     def __str__(self):
         return f"{self.transaction_type} - {self.reference}"
@@ -150,7 +234,7 @@ class Withdrawal(models.Model):
         ('failed', 'Failed'),
     ]
    
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     collection = models.OneToOneField(Collection, on_delete=models.CASCADE)
    
     amount = models.DecimalField(max_digits=12, decimal_places=2)
@@ -168,8 +252,317 @@ class Withdrawal(models.Model):
     transfer_code = models.CharField(max_length=100, blank=True)
     paystack_reference = models.CharField(max_length=100, blank=True)
    
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Admin status filter, newest first
+            models.Index(fields=['status', 'created_at'], name='withdrawal_status_idx'),
+        ]
    
     def __str__(self):
-        return f"Withdrawal - {self.collection.title}"
\ No newline at end of file
+        return f"Withdrawal - {self.collection.title}"
+
+class ReferenceSequence(models.Model):
+    """Counter that hands out blocks of ids for slugs and payment references"""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} @ {self.next_value}"
+
+
+# ==================== REFUNDS ====================
+
+class RefundJob(models.Model):
+    """Progress of refunding a cancelled collection, see split/refunds.py"""
+    STATUS_CHOICES = [
+        ('selecting', 'Selecting contributors'),
+        ('submitting', 'Submitting payouts'),
+        ('completed', 'Completed'),
+    ]
+
+    collection = models.OneToOneField(Collection, on_delete=models.CASCADE, related_name='refund_job')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='selecting')
+    # Last contributor id turned into a refund transaction
+    cursor = models.UUIDField(null=True, blank=True)
+
+    created_count = models.PositiveIntegerField(default=0)
+    refunded_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['created_at'],
+                condition=~models.Q(status='completed'),
+                name='refundjob_open_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f"Refunds for {self.collection_id} ({self.status})"
+
+
+# ==================== RECURRING COLLECTIONS ====================
+
+class RecurringSchedule(models.Model):
+    """Re-run a collection with the same members every interval, see split/recurring.py"""
+    INTERVAL_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # The template: its details and members are copied on every run
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='recurring_schedules')
+
+    interval = models.CharField(max_length=20, choices=INTERVAL_CHOICES, default='monthly')
+    next_run_at = models.DateTimeField()
+    is_active = models.BooleanField(default=True)
+
+    run_count = models.PositiveIntegerField(default=0)
+    # Slug reserved for the run in progress, so a retried run reuses it
+    pending_slug = models.SlugField(max_length=100, blank=True)
+    last_slug = models.SlugField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['next_run_at'],
+                condition=models.Q(is_active=True),
+                name='recurring_due_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.collection.title} ({self.interval})"
+
+
+# ==================== ANOMALY REVIEW ====================
+
+class FlaggedEvent(models.Model):
+    """A contribution or confirmation the anomaly scorer wants a human to look at"""
+    RULE_CHOICES = [
+        ('contribution_burst', 'Burst of contributions to one collection'),
+        ('phone_velocity', 'One phone contributing too often'),
+        ('confirmation_burst', 'Burst of confirmations by one organizer'),
+        ('amount_outlier', 'Amount far from the expected contribution'),
+    ]
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('dismissed', 'Dismissed'),
+        ('confirmed', 'Confirmed fraud'),
+    ]
+
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='flags')
+    contributor = models.ForeignKey(Contributor, on_delete=models.SET_NULL, null=True, blank=True, related_name='flags')
+    rule = models.CharField(max_length=30, choices=RULE_CHOICES)
+    reason = models.CharField(max_length=255)
+    details = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    reviewed_by = models.CharField(max_length=150, blank=True)
+    reviewed_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The review queue
+            models.Index(
+                fields=['created_at'],
+                condition=models.Q(status='open'),
+                name='flaggedevent_open_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.rule}: {self.reason}"
+
+
+# ==================== PROFILING ====================
+
+class RequestProfile(models.Model):
+    """A sampled request profile, see kontribute/profiling.py"""
+    TRIGGER_CHOICES = [
+        ('header', 'Requested with the profiling token'),
+        ('sample', 'Random sample'),
+    ]
+
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    route = models.CharField(max_length=200, blank=True)
+    slug = models.CharField(max_length=100, blank=True, db_index=True)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    # pyinstrument HTML report (flamegraph/call tree)
+    html = models.TextField()
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+# ==================== REPORTING ROLLUPS ====================
+
+class CollectionDailyRollup(models.Model):
+    """Pre-aggregated transactions per collection per day (by created_at)"""
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=Transaction.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, blank=True)
+
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['collection', 'date', 'transaction_type', 'status', 'payment_method'],
+                name='unique_collection_daily_rollup'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.collection_id} {self.date} {self.transaction_type}/{self.status}"
+
+
+class DailyRollup(models.Model):
+    """Pre-aggregated transactions across all collections per day (by created_at)"""
+    date = models.DateField()
+    transaction_type = models.CharField(max_length=20, choices=Transaction.TYPE_CHOICES)
+    status = models.CharField(max_length=20, choices=Transaction.STATUS_CHOICES)
+    payment_method = models.CharField(max_length=20, blank=True)
+
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'transaction_type', 'status', 'payment_method'],
+                name='unique_daily_rollup'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.transaction_type}/{self.status}"
+
+
+class RollupWatermark(models.Model):
+    """Last Transaction.updated_at a rollup job has processed"""
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.value}"
+
+
+# ==================== OUTBOX ====================
+
+class OutboxEvent(models.Model):
+    """Domain event written in the same transaction as the change it describes"""
+    event_type = models.CharField(max_length=50)
+    collection = models.ForeignKey(Collection, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['available_at', 'id'],
+                condition=models.Q(processed_at__isnull=True),
+                name='outbox_pending_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.pk}"
+
+
+# ==================== ORGANIZER WEBHOOKS ====================
+
+class WebhookSubscription(models.Model):
+    EVENT_CHOICES = [
+        ('contribution.created', 'Contribution created'),
+        ('payment.confirmed', 'Payment confirmed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    collection = models.ForeignKey(Collection, on_delete=models.CASCADE, related_name='webhooks')
+
+    url = models.URLField(max_length=500)
+    secret = models.CharField(max_length=64)
+    # Empty list means every event type
+    event_types = models.JSONField(default=list, blank=True)
+    is_active = models.BooleanField(default=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.collection.title} -> {self.url}"
+
+    def wants(self, event_type):
+        return not self.event_types or event_type in self.event_types
+
+
+class WebhookEvent(models.Model):
+    """An event waiting to be delivered to a subscription"""
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='pending_events')
+    outbox_event_id = models.BigIntegerField()
+
+    event_type = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['subscription', 'outbox_event_id'],
+                name='unique_webhook_event'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} #{self.outbox_event_id}"
+
+
+class WebhookDeadLetter(models.Model):
+    """A batch of events that could not be delivered after every retry"""
+    subscription = models.ForeignKey(WebhookSubscription, on_delete=models.CASCADE, related_name='dead_letters')
+    events = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+
+    attempts = models.PositiveIntegerField(default=0)
+    status_code = models.IntegerField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.subscription.url} ({len(self.events)} events)"
@@ -0,0 +1,134 @@
+"""
+Transactional outbox
+
+Views call publish() inside the same atomic block that writes the
+Contributor/Transaction rows, so an event exists if and only if the
+change was committed. The relay (relay_outbox management command) drains
+pending events in batches and passes each one to every handler
+registered for its type. An event is only marked processed after all of
+its handlers succeed, so delivery is at-least-once and handlers must be
+idempotent.
+"""
+import logging
+from datetime import timedelta
+
+from django.db import connections, transaction as db_transaction
+from django.utils import timezone
+
+from kontribute.sharding import current_db
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+CONTRIBUTION_CREATED = 'contribution.created'
+PAYMENT_CONFIRMED = 'payment.confirmed'
+CONTRIBUTION_EXPIRED = 'contribution.expired'
+WITHDRAWAL_REQUESTED = 'withdrawal.requested'
+COLLECTION_CANCELLED = 'collection.cancelled'
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 10
+MAX_BACKOFF_SECONDS = 3600
+
+_handlers = {}
+
+
+def register(*event_types):
+    """Decorator registering a handler(event) for one or more event types ('*' for all)"""
+    def decorator(func):
+        for event_type in event_types:
+            _handlers.setdefault(event_type, []).append(func)
+        return func
+    return decorator
+
+
+def handlers_for(event_type):
+    return _handlers.get(event_type, []) + _handlers.get('*', [])
+
+
+def publish(event_type, payload, collection=None):
+    """Record an event; call inside the transaction that makes the change"""
+    return OutboxEvent.objects.create(
+        event_type=event_type,
+        collection=collection,
+        payload=payload
+    )
+
+
+def publish_many(event_type, payloads, collection=None, collection_ids=None):
+    """
+    Record several events of one type. They all belong to `collection`,
+    unless `collection_ids` gives each payload's collection.
+    """
+    payloads = list(payloads)
+    if collection_ids is None:
+        collection_ids = [collection.pk if collection else None] * len(payloads)
+    return OutboxEvent.objects.bulk_create([
+        OutboxEvent(event_type=event_type, collection_id=collection_id, payload=payload)
+        for payload, collection_id in zip(payloads, collection_ids)
+    ])
+
+
+def contribution_payload(contributor, collection):
+    return {
+        'contributor_id': str(contributor.id),
+        'collection_id': str(collection.id),
+        'slug': collection.slug,
+        'name': contributor.name,
+        'amount_owed': contributor.amount_owed,
+        'amount_paid': contributor.amount_paid,
+        'payment_status': contributor.payment_status,
+        'payment_reference': contributor.payment_reference,
+        'paid_at': contributor.paid_at,
+    }
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(2 ** attempts, MAX_BACKOFF_SECONDS))
+
+
+def relay(batch_size=BATCH_SIZE):
+    """
+    Deliver one batch of pending events to their handlers.
+    Returns (delivered, failed) counts.
+    """
+    now = timezone.now()
+    delivered = []
+    failed = 0
+
+    with db_transaction.atomic(using=current_db()):
+        pending = OutboxEvent.objects.filter(
+            processed_at__isnull=True,
+            available_at__lte=now,
+            attempts__lt=MAX_ATTEMPTS
+        ).order_by('available_at', 'id')
+        if connections[current_db()].features.has_select_for_update_skip_locked:
+            pending = pending.select_for_update(skip_locked=True)
+
+        for event in pending[:batch_size]:
+            try:
+                # Savepoint per event so a failing handler can't poison the batch
+                with db_transaction.atomic(using=current_db()):
+                    for handler in handlers_for(event.event_type):
+                        handler(event)
+            except Exception as e:
+                logger.exception("Outbox handler failed for %s", event)
+                failed += 1
+                event.attempts += 1
+                event.last_error = str(e)
+                event.available_at = now + _backoff(event.attempts)
+                event.save(update_fields=['attempts', 'last_error', 'available_at'])
+            else:
+                delivered.append(event.pk)
+
+        OutboxEvent.objects.filter(pk__in=delivered).update(processed_at=now)
+
+    return len(delivered), failed
+
+
+def purge_processed(older_than=timedelta(days=7)):
+    """Delete delivered events older than `older_than`"""
+    cutoff = timezone.now() - older_than
+    deleted, _ = OutboxEvent.objects.filter(processed_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,283 @@
+"""
+Payment provider (Paystack) verification client
+
+PaystackClient keeps one pooled httpx.AsyncClient and its event loop for
+the lifetime of a worker, so verification never happens on a request
+thread. verify_many() checks references concurrently (asyncio.gather
+behind a semaphore). A circuit breaker stops calling the API for
+RESET_SECONDS after FAILURE_THRESHOLD consecutive failures (network
+errors, timeouts, 5xx); references skipped while the circuit is open are
+reported as errors and picked up again on the next sweep.
+
+reconcile_pending() is the sweep behind `manage.py reconcile_payments`:
+it verifies pending card/USSD payment transactions and confirms or fails
+them the same way confirm_payment does. A payment the provider leaves
+unresolved (still in flight, underpaid, unknown reference, error) is not
+checked again until next_verify_at, which backs off exponentially, so a
+pile of stuck references never crowds newer payments out of a sweep.
+Point PAYSTACK_BASE_URL at a local fake server, or pass an httpx
+transport, to run it offline.
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from kontribute.sharding import current_db
+
+from . import outbox
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY = 10
+TIMEOUT_SECONDS = 10
+CONNECT_TIMEOUT_SECONDS = 3
+FAILURE_THRESHOLD = 5
+RESET_SECONDS = 30
+SWEEP_LIMIT = 500
+# Give the payer time to finish checkout before asking the provider
+GRACE_PERIOD = timedelta(minutes=5)
+MAX_VERIFY_BACKOFF = timedelta(hours=6)
+
+ONLINE_METHODS = ['card', 'ussd']
+
+# Paystack transaction statuses mapped onto ours; anything else is still in flight
+PROVIDER_STATUSES = {
+    'success': 'success',
+    'failed': 'failed',
+    'abandoned': 'failed',
+    'reversed': 'failed',
+}
+
+# status is 'success', 'failed', 'pending' or None when verification itself failed
+Verification = namedtuple('Verification', ['reference', 'status', 'amount', 'paid_at', 'error'])
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker; half-opens after `reset_seconds` to let one call probe"""
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        state = self.state
+        if state == 'open':
+            raise CircuitOpenError("Payment provider circuit is open")
+        if state == 'half-open':
+            # Only the first caller probes; the rest wait for its outcome
+            self.opened_at = time.monotonic()
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning("Payment provider circuit opened after %s failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+class PaystackClient:
+    """Owns an event loop and a pooled AsyncClient reused across sweeps"""
+
+    def __init__(self, secret_key=None, base_url=None, concurrency=CONCURRENCY,
+                 timeout=TIMEOUT_SECONDS, breaker=None, transport=None):
+        import httpx
+
+        self.httpx = httpx
+        self.loop = asyncio.new_event_loop()
+        self.concurrency = concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            base_url=base_url or settings.PAYSTACK_BASE_URL,
+            headers={'Authorization': f"Bearer {secret_key or settings.PAYSTACK_SECRET_KEY}"},
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            transport=transport
+        )
+
+    async def verify(self, reference):
+        """Verify one reference; never raises, errors come back on the result"""
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as e:
+            return Verification(reference, None, None, None, str(e))
+
+        try:
+            result = await self.client.get(f"/transaction/verify/{reference}")
+        except self.httpx.HTTPError as e:
+            self.breaker.record_failure()
+            return Verification(reference, None, None, None, str(e) or e.__class__.__name__)
+
+        if result.status_code >= 500:
+            self.breaker.record_failure()
+            return Verification(reference, None, None, None, f"HTTP {result.status_code}")
+        # The provider answered, so the circuit is healthy even if the reference is not
+        self.breaker.record_success()
+
+        if result.status_code == 404:
+            return Verification(reference, None, None, None, "Unknown reference")
+        if result.status_code != 200:
+            return Verification(reference, None, None, None, f"HTTP {result.status_code}")
+
+        data = result.json().get('data') or {}
+        amount = data.get('amount')
+        return Verification(
+            reference,
+            PROVIDER_STATUSES.get(data.get('status'), 'pending'),
+            # Paystack amounts are in kobo
+            Decimal(amount) / 100 if amount is not None else None,
+            data.get('paid_at'),
+            None
+        )
+
+    async def _verify_all(self, references):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def limited(reference):
+            async with semaphore:
+                return await self.verify(reference)
+
+        return await asyncio.gather(*(limited(reference) for reference in references))
+
+    def verify_many(self, references):
+        """Verify references concurrently. Returns [Verification] in the same order."""
+        return self.loop.run_until_complete(self._verify_all(references))
+
+    def close(self):
+        self.loop.run_until_complete(self.client.aclose())
+        self.loop.close()
+
+
+def _apply(payment, verification):
+    """Confirm or fail one pending payment transaction. Returns True if it changed."""
+    contributor = payment.contributor
+    now = timezone.now()
+
+    with db_transaction.atomic(using=current_db()):
+        if verification.status == 'failed':
+            updated = Transaction.objects.filter(pk=payment.pk, status='pending').update(
+                status='failed',
+                updated_at=now
+            )
+            if updated and contributor and contributor.payment_status == 'pending':
+                if not contributor.compare_and_swap(payment_status='failed'):
+                    db_transaction.set_rollback(True, using=current_db())
+                    return False
+            return bool(updated)
+
+        if verification.amount is None or verification.amount < payment.amount:
+            logger.warning(
+                "Payment %s verified for %s, expected %s; leaving it pending",
+                verification.reference, verification.amount, payment.amount
+            )
+            return False
+
+        updated = Transaction.objects.filter(pk=payment.pk, status='pending').update(
+            status='success',
+            updated_at=now
+        )
+        if not updated or contributor is None:
+            return bool(updated)
+
+        if contributor.payment_status != 'paid':
+            confirmed = contributor.compare_and_swap(
+                payment_status='paid',
+                amount_paid=payment.amount,
+                paid_at=now,
+                verified_by='paystack',
+                verified_at=now
+            )
+            if not confirmed:
+                # Changed under us (e.g. confirmed by the organizer); retry next sweep
+                db_transaction.set_rollback(True, using=current_db())
+                return False
+
+            # Already-paid contributors were announced when they were confirmed
+            outbox.publish(
+                outbox.PAYMENT_CONFIRMED,
+                outbox.contribution_payload(contributor, payment.collection),
+                collection=payment.collection
+            )
+    return True
+
+
+def _verify_backoff(attempts, grace):
+    return min(grace * 2 ** attempts, MAX_VERIFY_BACKOFF)
+
+
+def _postpone(payments, grace):
+    """Push unresolved payments back: grace, then twice as long after every check"""
+    now = timezone.now()
+    for payment in payments:
+        payment.verify_attempts += 1
+        payment.next_verify_at = now + _verify_backoff(payment.verify_attempts, grace)
+    # Only the check schedule changes, which nothing reading updated_at cares about
+    Transaction.objects.bulk_update(payments, ['verify_attempts', 'next_verify_at'])
+
+
+def reconcile_pending(client, limit=SWEEP_LIMIT, grace=GRACE_PERIOD):
+    """Verify pending online payments on the current shard. Returns (confirmed, failed, errors)."""
+    now = timezone.now()
+    payments = list(
+        Transaction.objects.filter(
+            Q(next_verify_at__isnull=True, created_at__lt=now - grace) | Q(next_verify_at__lte=now),
+            transaction_type='payment',
+            status='pending',
+            contributor__payment_method__in=ONLINE_METHODS
+        ).select_related('contributor', 'collection').order_by(
+            # Never-checked payments first, then the longest overdue
+            F('next_verify_at').asc(nulls_first=True), 'created_at'
+        )[:limit]
+    )
+    if not payments:
+        return 0, 0, 0
+
+    verifications = client.verify_many([p.paystack_reference or p.reference for p in payments])
+
+    confirmed = failed = errors = 0
+    unresolved = []
+    for payment, verification in zip(payments, verifications):
+        if verification.error:
+            logger.warning("Could not verify %s: %s", verification.reference, verification.error)
+            errors += 1
+            unresolved.append(payment)
+        elif verification.status == 'pending':
+            unresolved.append(payment)
+        elif _apply(payment, verification):
+            if verification.status == 'success':
+                confirmed += 1
+            else:
+                failed += 1
+        elif verification.status == 'success':
+            # Underpaid or missing an amount; left for support, checked again later
+            unresolved.append(payment)
+
+    if unresolved:
+        _postpone(unresolved, grace)
+    return confirmed, failed, errors
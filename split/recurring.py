@@ -0,0 +1,219 @@
+"""
+Recurring collections
+
+A RecurringSchedule points at a template collection. `manage.py
+run_recurring` finds the schedules that are due and, for each one,
+creates a new collection with the template's details and a pending
+Contributor (fresh KTR- reference and payment Transaction) for every
+member of the template, then moves next_run_at on by the interval. A
+scheduler that was down catches up with one run, not one per missed
+interval.
+
+Schedules are handled in batches: slugs and references are allocated
+for the whole batch at once, members are read with one query and the
+clones are written with bulk_create, one transaction per target shard.
+A clone's new slug decides its shard, which need not be the template's,
+so a run is restartable rather than atomic: the slug is reserved on the
+schedule (pending_slug) before anything is cloned, a retried run skips
+clones whose slug already exists, and the schedule only advances once
+its clone is committed.
+"""
+import calendar
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from kontribute.sharding import current_db, shard_for_slug, use_shard, uuid_for_slug
+
+from . import outbox
+from .models import Collection, Contributor, RecurringSchedule, Transaction
+from .references import new_collection_slugs, new_payment_references
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+CHUNK_SIZE = 500
+
+# Copied from the template onto every clone
+CLONED_FIELDS = [
+    'title', 'description', 'total_amount', 'amount_per_person', 'number_of_people',
+    'organizer_name', 'organizer_phone', 'organizer_email',
+    'bank_name', 'account_number', 'account_name', 'paystack_subaccount',
+    'organizer_bank_name', 'organizer_account_number', 'organizer_account_name',
+]
+
+
+def add_months(when, months):
+    """Same day `months` later, clamped to the end of shorter months"""
+    month = when.month - 1 + months
+    year = when.year + month // 12
+    month = month % 12 + 1
+    day = min(when.day, calendar.monthrange(year, month)[1])
+    return when.replace(year=year, month=month, day=day)
+
+
+def step(when, interval):
+    if interval == 'weekly':
+        return when + timedelta(weeks=1)
+    return add_months(when, 1)
+
+
+def next_run(when, interval, now):
+    """The first run time after `now`"""
+    while when <= now:
+        when = step(when, interval)
+    return when
+
+
+def _members(collection_ids):
+    """Each template's members, one per phone number (latest details win)"""
+    rows = Contributor.objects.filter(
+        collection_id__in=collection_ids
+    ).exclude(
+        payment_status='refunded'
+    ).order_by('created_at').values(
+        'collection_id', 'name', 'phone', 'phone_e164', 'email', 'amount_owed'
+    )
+    members = defaultdict(dict)
+    for row in rows:
+        members[row['collection_id']][row['phone_e164'] or row['phone']] = row
+    return {collection_id: list(by_phone.values()) for collection_id, by_phone in members.items()}
+
+
+def _clone(schedules, members):
+    """Create the pending clones on the current shard. Returns how many were created."""
+    existing = set(Collection.objects.filter(
+        slug__in=[schedule.pending_slug for schedule in schedules]
+    ).values_list('slug', flat=True))
+
+    clones = []
+    for schedule in schedules:
+        if schedule.pending_slug in existing:
+            # Cloned by a run that died before advancing the schedule
+            continue
+        template = schedule.collection
+        clone = Collection(
+            slug=schedule.pending_slug,
+            status='active',
+            **{field: getattr(template, field) for field in CLONED_FIELDS}
+        )
+        if template.deadline and template.deadline > template.created_at:
+            # Same time to pay as the template had
+            clone.deadline = schedule.next_run_at + (template.deadline - template.created_at)
+
+        rows = []
+        for member in members.get(template.id, []):
+            amount = template.amount_per_person or member['amount_owed']
+            if amount is None:
+                continue
+            rows.append((member, amount))
+        clones.append((clone, rows))
+
+    if not clones:
+        return 0
+
+    references = iter(new_payment_references(sum(len(rows) for _, rows in clones)))
+    contributors = []
+    transactions = []
+    contributors_by_clone = []
+    for clone, rows in clones:
+        created = []
+        for member, amount in rows:
+            payment_reference = next(references)
+            contributor = Contributor(
+                id=uuid_for_slug(clone.slug),
+                collection=clone,
+                name=member['name'],
+                phone=member['phone'],
+                phone_e164=member['phone_e164'],
+                email=member['email'],
+                amount_owed=amount,
+                amount_paid=0,
+                payment_status='pending',
+                payment_method='bank_transfer',
+                payment_reference=payment_reference
+            )
+            created.append(contributor)
+            transactions.append(Transaction(
+                collection=clone,
+                contributor=contributor,
+                transaction_type='payment',
+                amount=amount,
+                status='pending',
+                reference=payment_reference
+            ))
+        contributors.extend(created)
+        contributors_by_clone.append((clone, created))
+
+    with db_transaction.atomic(using=current_db()):
+        Collection.objects.bulk_create([clone for clone, _ in clones])
+        Contributor.objects.bulk_create(contributors, batch_size=CHUNK_SIZE)
+        Transaction.objects.bulk_create(transactions, batch_size=CHUNK_SIZE)
+        for clone, created in contributors_by_clone:
+            outbox.publish_many(
+                outbox.CONTRIBUTION_CREATED,
+                [outbox.contribution_payload(c, clone) for c in created],
+                collection=clone
+            )
+
+    return len(clones)
+
+
+def _run_batch(schedules, now):
+    cancelled = [schedule.pk for schedule in schedules if schedule.collection.status == 'cancelled']
+    if cancelled:
+        RecurringSchedule.objects.filter(pk__in=cancelled).update(is_active=False, updated_at=now)
+        schedules = [schedule for schedule in schedules if schedule.pk not in cancelled]
+
+    # Reserve every slug before cloning anything
+    fresh = [schedule for schedule in schedules if not schedule.pending_slug]
+    if fresh:
+        for schedule, slug in zip(fresh, new_collection_slugs([s.collection.title for s in fresh])):
+            schedule.pending_slug = slug
+            schedule.updated_at = now
+        RecurringSchedule.objects.bulk_update(fresh, ['pending_slug', 'updated_at'])
+
+    members = _members([schedule.collection_id for schedule in schedules])
+
+    by_shard = defaultdict(list)
+    for schedule in schedules:
+        by_shard[shard_for_slug(schedule.pending_slug)].append(schedule)
+    created = 0
+    for alias, group in by_shard.items():
+        with use_shard(alias):
+            created += _clone(group, members)
+
+    for schedule in schedules:
+        schedule.last_slug = schedule.pending_slug
+        schedule.pending_slug = ''
+        schedule.run_count += 1
+        schedule.next_run_at = next_run(schedule.next_run_at, schedule.interval, now)
+        schedule.updated_at = now
+    RecurringSchedule.objects.bulk_update(
+        schedules,
+        ['last_slug', 'pending_slug', 'run_count', 'next_run_at', 'updated_at']
+    )
+    return created
+
+
+def run_due_schedules(now=None, batch_size=BATCH_SIZE):
+    """Run every schedule due on the current shard. Returns the number of collections created."""
+    now = now or timezone.now()
+    created = 0
+    while True:
+        schedules = list(
+            RecurringSchedule.objects.filter(
+                is_active=True,
+                next_run_at__lte=now
+            ).select_related('collection').order_by('next_run_at')[:batch_size]
+        )
+        if not schedules:
+            break
+        created += _run_batch(schedules, now)
+        logger.info("Ran %d recurring schedule(s)", len(schedules), extra={'shard': current_db()})
+        if len(schedules) < batch_size:
+            break
+    return created
@@ -0,0 +1,150 @@
+"""
+Collision-free slugs and payment references
+
+Ids come from ReferenceSequence rows. Each process reserves a block of
+values with one locked UPDATE and then hands them out from memory, so
+uniqueness is guaranteed by the counter rather than by retrying on the
+unique constraint.
+
+Payment references are the id in Crockford base32 (no I, L, O or U)
+followed by a Luhn mod 32 check character, e.g. KTR-00000001Y. The check
+character catches every single-character typo and almost every swap of
+neighbouring characters, so bank-statement reconciliation can reject a
+mistyped reference without touching the database. The admin searches
+use canonical_reference() for that.
+"""
+import threading
+
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils.text import slugify
+
+from .models import ReferenceSequence
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+BASE = len(ALPHABET)
+REFERENCE_PREFIX = 'KTR-'
+# Legacy references were KTR- plus 8 hex characters and legacy slugs ended
+# in 6 hex characters; new codes are one character longer so they never clash
+REFERENCE_WIDTH = 8
+SLUG_SUFFIX_WIDTH = 7
+BLOCK_SIZE = 100
+
+PAYMENT_REFERENCE_SEQUENCE = 'payment_reference'
+COLLECTION_SLUG_SEQUENCE = 'collection_slug'
+
+# Common misreadings map back onto the alphabet
+_READ_AS = {'O': '0', 'I': '1', 'L': '1'}
+
+_lock = threading.Lock()
+_blocks = {}
+
+
+def _reserve_block(name, size):
+    # Sequences are global, so they always live on the default database
+    with db_transaction.atomic(using='default'):
+        ReferenceSequence.objects.get_or_create(name=name)
+        sequence = ReferenceSequence.objects.select_for_update().get(name=name)
+        start = sequence.next_value
+        ReferenceSequence.objects.filter(pk=sequence.pk).update(next_value=F('next_value') + size)
+    return [start, start + size]
+
+
+def allocate(name, count=1, block_size=BLOCK_SIZE):
+    """Return `count` unused ids from the named sequence"""
+    if db_transaction.get_connection('default').in_atomic_block:
+        # The reservation would roll back with the caller's transaction,
+        # so only take what is used now and keep nothing in memory
+        start, end = _reserve_block(name, count)
+        return list(range(start, end))
+
+    ids = []
+    with _lock:
+        while len(ids) < count:
+            block = _blocks.get(name)
+            if block is None or block[0] >= block[1]:
+                block = _blocks[name] = _reserve_block(name, max(block_size, count - len(ids)))
+            take = min(block[1] - block[0], count - len(ids))
+            ids.extend(range(block[0], block[0] + take))
+            block[0] += take
+    return ids
+
+
+def encode(number, width=0):
+    """Crockford base32 for a non-negative integer"""
+    chars = []
+    while number:
+        number, remainder = divmod(number, BASE)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars)).rjust(width, '0') or '0'
+
+
+def check_character(code):
+    """Luhn mod 32 check character for a base32 string"""
+    total = 0
+    factor = 2
+    for char in reversed(code):
+        addend = factor * ALPHABET.index(char)
+        total += addend // BASE + addend % BASE
+        factor = 1 if factor == 2 else 2
+    return ALPHABET[(BASE - total % BASE) % BASE]
+
+
+def normalize_reference(value):
+    """Uppercase, drop the prefix and separators and fix look-alike characters"""
+    code = value.strip().upper().replace('-', '').replace(' ', '')
+    prefix = REFERENCE_PREFIX.rstrip('-')
+    if code.startswith(prefix):
+        code = code[len(prefix):]
+    return ''.join(_READ_AS.get(char, char) for char in code)
+
+
+def is_valid_reference(value):
+    """True when the reference is well formed and its check character matches"""
+    code = normalize_reference(value)
+    if len(code) != REFERENCE_WIDTH + 1 or any(char not in ALPHABET for char in code):
+        return False
+    return check_character(code[:-1]) == code[-1]
+
+
+def looks_like_reference(value):
+    """Prefixed and as long as a current reference, whether or not it is valid"""
+    prefixed = value.strip().upper().startswith(REFERENCE_PREFIX.rstrip('-'))
+    return prefixed and len(normalize_reference(value)) == REFERENCE_WIDTH + 1
+
+
+def canonical_reference(value):
+    """Stored form (KTR-00000001Y) of a reference typed by hand, None if it is not a valid one"""
+    if not is_valid_reference(value):
+        return None
+    return f"{REFERENCE_PREFIX}{normalize_reference(value)}"
+
+
+def format_reference(number):
+    code = encode(number, REFERENCE_WIDTH)
+    return f"{REFERENCE_PREFIX}{code}{check_character(code)}"
+
+
+def new_payment_references(count):
+    """Allocate `count` unique payment references"""
+    return [format_reference(n) for n in allocate(PAYMENT_REFERENCE_SEQUENCE, count)]
+
+
+def new_payment_reference():
+    return new_payment_references(1)[0]
+
+
+def _collection_slug(title, number):
+    suffix = encode(number, SLUG_SUFFIX_WIDTH).lower()
+    base_slug = slugify(title)[:100 - len(suffix) - 1].strip('-')
+    return f"{base_slug}-{suffix}" if base_slug else suffix
+
+
+def new_collection_slugs(titles):
+    """One unique slug per title, allocated together"""
+    return [_collection_slug(title, n) for title, n in zip(titles, allocate(COLLECTION_SLUG_SEQUENCE, len(titles)))]
+
+
+def new_collection_slug(title):
+    """slugify(title) plus a base32 id that is unique across all collections"""
+    return new_collection_slugs([title])[0]
@@ -0,0 +1,242 @@
+"""
+Bulk refunds for cancelled collections
+
+cancel_collection() marks a collection cancelled and opens a RefundJob.
+`manage.py process_refunds` then works through open jobs in two phases:
+
+1. selecting: paid contributors are read in chunks (keyset on id) and a
+   'refund' Transaction is bulk-created for each. The job cursor is saved
+   in the same transaction as the rows, and refund references are
+   derived from the contributor id, so a crash never duplicates or skips
+   a refund.
+2. submitting: pending refunds are sent to the payout provider in
+   batches and their outcome written back with bulk_update. Providers
+   must treat the refund reference as an idempotency key, so a batch
+   that was sent but not recorded before a crash is safely sent again.
+
+The provider is settings.PAYOUT_PROVIDER, a dotted path to a
+PayoutProvider subclass. It has no default: refunds are not processed
+until one is configured.
+"""
+import logging
+import uuid
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from kontribute.sharding import current_db
+
+from . import outbox
+from .models import Collection, Contributor, RefundJob, Transaction
+
+logger = logging.getLogger(__name__)
+
+REFUND_PREFIX = 'RFD-'
+CHUNK_SIZE = 500
+BATCH_SIZE = 100
+
+# status is 'success', 'failed' or 'pending' (accepted, outcome not known yet)
+PayoutResult = namedtuple('PayoutResult', ['status', 'provider_reference', 'error'])
+
+
+class PayoutProvider:
+    """Sends refunds back to contributors"""
+
+    def submit(self, refunds):
+        """
+        Pay out a batch of refund Transactions (contributor preloaded).
+        Must be idempotent per refund.reference. Returns {reference: PayoutResult};
+        references missing from the result stay pending.
+        """
+        raise NotImplementedError
+
+
+def get_provider():
+    path = getattr(settings, 'PAYOUT_PROVIDER', '')
+    if not path:
+        raise ImproperlyConfigured("Set PAYOUT_PROVIDER to process refunds")
+    return import_string(path)()
+
+
+def refund_reference(contributor_id):
+    return f"{REFUND_PREFIX}{uuid.UUID(str(contributor_id)).hex}"
+
+
+def cancel_collection(collection):
+    """Cancel a collection and open its refund job. Returns the RefundJob."""
+    with db_transaction.atomic(using=current_db()):
+        cancelled = Collection.objects.filter(pk=collection.pk).exclude(status='cancelled').update(
+            status='cancelled',
+            version=F('version') + 1,
+            updated_at=timezone.now()
+        )
+        job, _ = RefundJob.objects.get_or_create(collection=collection)
+        if cancelled:
+            outbox.publish(
+                outbox.COLLECTION_CANCELLED,
+                {'collection_id': str(collection.id), 'slug': collection.slug},
+                collection=collection
+            )
+    return job
+
+
+def _select(job, chunk_size):
+    """Create refund transactions for every paid contributor after the cursor"""
+    while True:
+        with db_transaction.atomic(using=current_db()):
+            contributors = Contributor.objects.filter(
+                collection_id=job.collection_id,
+                payment_status='paid',
+                amount_paid__gt=0
+            )
+            if job.cursor:
+                contributors = contributors.filter(id__gt=job.cursor)
+            chunk = list(contributors.order_by('id').values_list('id', 'amount_paid')[:chunk_size])
+            if not chunk:
+                # Recount: a rescan (see process_job) passes contributors twice
+                job.created_count = Transaction.objects.filter(
+                    collection_id=job.collection_id,
+                    transaction_type='refund'
+                ).count()
+                job.status = 'submitting'
+                job.save(update_fields=['status', 'created_count', 'updated_at'])
+                return
+
+            # ignore_conflicts skips contributors that already have a refund row
+            Transaction.objects.bulk_create([
+                Transaction(
+                    collection_id=job.collection_id,
+                    contributor_id=contributor_id,
+                    transaction_type='refund',
+                    amount=amount,
+                    status='pending',
+                    reference=refund_reference(contributor_id)
+                )
+                for contributor_id, amount in chunk
+            ], ignore_conflicts=True)
+
+            job.cursor = chunk[-1][0]
+            job.created_count += len(chunk)
+            job.save(update_fields=['cursor', 'created_count', 'updated_at'])
+
+
+def _submit(job, provider, batch_size):
+    """Send pending refunds once each. Returns False if the provider errored."""
+    last_reference = ''
+    while True:
+        batch = list(
+            Transaction.objects.filter(
+                collection_id=job.collection_id,
+                transaction_type='refund',
+                status='pending',
+                reference__gt=last_reference
+            ).select_related('contributor').order_by('reference')[:batch_size]
+        )
+        if not batch:
+            return True
+        last_reference = batch[-1].reference
+
+        try:
+            results = provider.submit(batch)
+        except Exception as e:
+            logger.exception("Payout provider failed for refund job %s", job.pk)
+            job.last_error = str(e)
+            job.save(update_fields=['last_error', 'updated_at'])
+            return False
+
+        now = timezone.now()
+        changed, refunded = [], []
+        failed = 0
+        for refund in batch:
+            result = results.get(refund.reference)
+            if result is None or result.status == 'pending':
+                continue
+            refund.status = result.status
+            refund.paystack_reference = result.provider_reference or ''
+            refund.updated_at = now
+            if result.error:
+                refund.metadata = {**refund.metadata, 'payout_error': result.error}
+            changed.append(refund)
+            if result.status == 'success':
+                refunded.append(refund.contributor_id)
+            else:
+                failed += 1
+
+        with db_transaction.atomic(using=current_db()):
+            Transaction.objects.bulk_update(changed, ['status', 'paystack_reference', 'metadata', 'updated_at'])
+            Contributor.objects.filter(id__in=refunded, payment_status='paid').update(
+                payment_status='refunded',
+                version=F('version') + 1
+            )
+            RefundJob.objects.filter(pk=job.pk).update(
+                refunded_count=F('refunded_count') + len(refunded),
+                failed_count=F('failed_count') + failed,
+                updated_at=now
+            )
+        job.refunded_count += len(refunded)
+        job.failed_count += failed
+
+
+def process_job(job, provider, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """Advance one job as far as it goes. Returns True once it is completed."""
+    if job.status == 'selecting':
+        _select(job, chunk_size)
+
+    if job.status == 'submitting':
+        if not _submit(job, provider, batch_size):
+            return False
+
+        refunds = Transaction.objects.filter(collection_id=job.collection_id, transaction_type='refund')
+        if refunds.filter(status='pending').exists():
+            # The provider has not settled some payouts yet; poll again next run
+            return False
+
+        # Someone confirmed a payment after selection went past them
+        missed = Contributor.objects.filter(
+            collection_id=job.collection_id,
+            payment_status='paid',
+            amount_paid__gt=0
+        ).exclude(id__in=refunds.filter(contributor__isnull=False).values('contributor_id'))
+        if missed.exists():
+            job.status = 'selecting'
+            job.cursor = None
+            job.save(update_fields=['status', 'cursor', 'updated_at'])
+            return process_job(job, provider, chunk_size, batch_size)
+
+        job.status = 'completed'
+        job.completed_at = timezone.now()
+        job.save(update_fields=['status', 'completed_at', 'updated_at'])
+
+    return job.status == 'completed'
+
+
+def retry_failed(job):
+    """Put a job's failed refunds back in the queue"""
+    with db_transaction.atomic(using=current_db()):
+        retried = Transaction.objects.filter(
+            collection_id=job.collection_id,
+            transaction_type='refund',
+            status='failed'
+        ).update(status='pending', updated_at=timezone.now())
+        if retried:
+            job.status = 'submitting'
+            job.failed_count = max(job.failed_count - retried, 0)
+            job.completed_at = None
+            job.save(update_fields=['status', 'failed_count', 'completed_at', 'updated_at'])
+    return retried
+
+
+def process_open_jobs(provider, chunk_size=CHUNK_SIZE, batch_size=BATCH_SIZE):
+    """Work through every unfinished job on the current shard. Returns (completed, open) counts."""
+    completed = still_open = 0
+    for job in RefundJob.objects.exclude(status='completed').order_by('created_at'):
+        if process_job(job, provider, chunk_size, batch_size):
+            completed += 1
+        else:
+            still_open += 1
+    return completed, still_open
@@ -0,0 +1,183 @@
+"""
+Collection analytics reports
+
+Columns are streamed out of the database with values_list iterators,
+packed into NumPy arrays one chunk at a time and aggregated vectorized,
+so a report over millions of contributors never builds model instances.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import chain, islice
+
+import numpy as np
+from django.utils import timezone
+
+from kontribute.sharding import shard_aliases
+
+from .models import Contributor
+
+CHUNK_SIZE = 50000
+DAY_SECONDS = 86400
+TIME_TO_PAY_BUCKETS = [
+    ('< 1 hour', 3600),
+    ('1-6 hours', 6 * 3600),
+    ('6-24 hours', DAY_SECONDS),
+    ('1-3 days', 3 * DAY_SECONDS),
+    ('3-7 days', 7 * DAY_SECONDS),
+    ('> 7 days', np.inf),
+]
+# Every Contributor.payment_status, in choice order: pending 0, paid 1, failed 2, ...
+STATUS_CODES = {status: code for code, (status, _) in enumerate(Contributor.STATUS_CHOICES)}
+
+
+def _epoch(value):
+    return value.timestamp() if value else np.nan
+
+
+def _chunks(queryset, fields, chunk_size=CHUNK_SIZE):
+    """Yield lists of value tuples from the queryset, chunk_size rows at a time"""
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def load_contributor_arrays(since=None, chunk_size=CHUNK_SIZE):
+    """
+    Load the contributor columns needed for reporting into NumPy arrays
+
+    Returns a dict of equal-length arrays: status (STATUS_CODES, -1 for
+    anything else), amount_paid, created_at and paid_at (epoch seconds,
+    NaN when unpaid) and organizer (organizer phone).
+    """
+    fields = [
+        'payment_status', 'amount_paid', 'created_at', 'paid_at',
+        'collection__organizer_phone'
+    ]
+    parts = {'status': [], 'amount_paid': [], 'created_at': [], 'paid_at': [], 'organizer': []}
+
+    chunks = []
+    for alias in shard_aliases():
+        queryset = Contributor.objects.using(alias).all()
+        if since:
+            queryset = queryset.filter(created_at__gte=since)
+        chunks.append(_chunks(queryset.order_by(), fields, chunk_size))
+
+    for chunk in chain.from_iterable(chunks):
+        statuses, amounts, created, paid, organizers = zip(*chunk)
+        count = len(chunk)
+        parts['status'].append(np.fromiter(
+            (STATUS_CODES.get(s, -1) for s in statuses), dtype=np.int8, count=count
+        ))
+        parts['amount_paid'].append(np.fromiter(amounts, dtype=np.float64, count=count))
+        parts['created_at'].append(np.fromiter(map(_epoch, created), dtype=np.float64, count=count))
+        parts['paid_at'].append(np.fromiter(map(_epoch, paid), dtype=np.float64, count=count))
+        parts['organizer'].append(np.array(organizers, dtype=object))
+
+    empty = {
+        'status': np.int8, 'amount_paid': np.float64, 'created_at': np.float64,
+        'paid_at': np.float64, 'organizer': object
+    }
+    return {
+        key: np.concatenate(values) if values else np.empty(0, dtype=empty[key])
+        for key, values in parts.items()
+    }
+
+
+def daily_volume(arrays):
+    """Number and sum of confirmed payments per day (by paid_at)"""
+    paid = (arrays['status'] == STATUS_CODES['paid']) & ~np.isnan(arrays['paid_at'])
+    if not paid.any():
+        return []
+
+    days = (arrays['paid_at'][paid] // DAY_SECONDS).astype(np.int64)
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    counts = np.bincount(inverse)
+    totals = np.bincount(inverse, weights=arrays['amount_paid'][paid])
+
+    return [
+        {
+            'date': datetime.fromtimestamp(int(day) * DAY_SECONDS, tz=dt_timezone.utc).date().isoformat(),
+            'payments': int(count),
+            'amount': round(float(total), 2)
+        }
+        for day, count, total in zip(unique_days, counts, totals)
+    ]
+
+
+def conversion_rate(arrays):
+    """Share of contributors that went on to pay, with a count for every status"""
+    total = arrays['status'].size
+    counts = np.bincount(arrays['status'][arrays['status'] >= 0], minlength=len(STATUS_CODES))
+    return {
+        'total_contributors': int(total),
+        **{status: int(counts[code]) for status, code in STATUS_CODES.items()},
+        'conversion_rate': round(float(counts[STATUS_CODES['paid']]) / total * 100, 2) if total else 0
+    }
+
+
+def time_to_pay(arrays):
+    """Distribution of seconds between joining a collection and paying"""
+    paid = (arrays['status'] == STATUS_CODES['paid']) & ~np.isnan(arrays['paid_at'])
+    durations = arrays['paid_at'][paid] - arrays['created_at'][paid]
+    durations = durations[durations >= 0]
+    if not durations.size:
+        return {'count': 0, 'mean_seconds': None, 'percentiles': {}, 'buckets': []}
+
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+    upper_bounds = np.array([upper for _, upper in TIME_TO_PAY_BUCKETS[:-1]])
+    bucket_counts = np.bincount(
+        np.searchsorted(upper_bounds, durations, side='right'),
+        minlength=len(TIME_TO_PAY_BUCKETS)
+    )
+
+    return {
+        'count': int(durations.size),
+        'mean_seconds': round(float(durations.mean()), 1),
+        'percentiles': {
+            'p50_seconds': round(float(p50), 1),
+            'p90_seconds': round(float(p90), 1),
+            'p99_seconds': round(float(p99), 1),
+        },
+        'buckets': [
+            {'label': label, 'count': int(count)}
+            for (label, _), count in zip(TIME_TO_PAY_BUCKETS, bucket_counts)
+        ]
+    }
+
+
+def top_organizers(arrays, limit=10):
+    """Organizers ranked by amount collected"""
+    paid = arrays['status'] == STATUS_CODES['paid']
+    if not paid.any():
+        return []
+
+    organizers, inverse = np.unique(arrays['organizer'][paid].astype(str), return_inverse=True)
+    totals = np.bincount(inverse, weights=arrays['amount_paid'][paid])
+    counts = np.bincount(inverse)
+    order = np.argsort(-totals, kind='stable')[:limit]
+
+    return [
+        {
+            'organizer_phone': str(organizers[i]),
+            'amount_collected': round(float(totals[i]), 2),
+            'payments': int(counts[i])
+        }
+        for i in order
+    ]
+
+
+def build_report(days=None, top=10, chunk_size=CHUNK_SIZE):
+    """Build the full analytics report, optionally limited to the last `days` days"""
+    since = timezone.now() - timedelta(days=days) if days else None
+    arrays = load_contributor_arrays(since=since, chunk_size=chunk_size)
+
+    return {
+        'generated_at': timezone.now().isoformat(),
+        'since': since.isoformat() if since else None,
+        'daily_volume': daily_volume(arrays),
+        'conversion': conversion_rate(arrays),
+        'time_to_pay': time_to_pay(arrays),
+        'top_organizers': top_organizers(arrays, limit=top),
+    }
@@ -0,0 +1,167 @@
+"""
+Daily rollup tables for reporting
+
+refresh_daily_rollups() is run periodically (see the refresh_rollups
+management command). It only looks at transactions whose updated_at is
+at or after the stored watermark, recomputes the (collection, day)
+buckets those rows fall in, then rebuilds the global rows for the
+affected days from the per-collection table. Recomputing whole buckets
+keeps the job idempotent, so a crashed run is simply repeated.
+
+updated_at is stamped when a row is written, not when its transaction
+commits, so a row can become visible with an updated_at older than the
+watermark a run already moved past. Each run therefore re-scans
+ROLLUP_LAG before the watermark; the buckets it sees twice are just
+recomputed to the same totals.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction as db_transaction
+from django.db.models import Count, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from kontribute.sharding import current_db
+
+from .models import (
+    CollectionDailyRollup,
+    DailyRollup,
+    RollupWatermark,
+    Transaction
+)
+
+WATERMARK_NAME = 'daily_rollups'
+BATCH_SIZE = 500
+# Longer than any write transaction runs
+ROLLUP_LAG = timedelta(minutes=5)
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def _rebuild_collection_buckets(day, collection_ids):
+    start, end = _day_bounds(day)
+    rows = Transaction.objects.filter(
+        collection_id__in=collection_ids,
+        created_at__gte=start,
+        created_at__lt=end
+    ).values(
+        'collection_id', 'transaction_type', 'status',
+        method=Coalesce('contributor__payment_method', Value(''))
+    ).annotate(
+        total_count=Count('id'),
+        total_amount=Sum('amount')
+    ).order_by()
+
+    CollectionDailyRollup.objects.filter(date=day, collection_id__in=collection_ids).delete()
+    CollectionDailyRollup.objects.bulk_create([
+        CollectionDailyRollup(
+            collection_id=row['collection_id'],
+            date=day,
+            transaction_type=row['transaction_type'],
+            status=row['status'],
+            payment_method=row['method'],
+            count=row['total_count'],
+            amount=row['total_amount'] or 0
+        )
+        for row in rows
+    ])
+
+
+def _rebuild_global_day(day):
+    rows = CollectionDailyRollup.objects.filter(date=day).values(
+        'transaction_type', 'status', 'payment_method'
+    ).annotate(
+        total_count=Sum('count'),
+        total_amount=Sum('amount')
+    ).order_by()
+
+    DailyRollup.objects.filter(date=day).delete()
+    DailyRollup.objects.bulk_create([
+        DailyRollup(
+            date=day,
+            transaction_type=row['transaction_type'],
+            status=row['status'],
+            payment_method=row['payment_method'],
+            count=row['total_count'] or 0,
+            amount=row['total_amount'] or 0
+        )
+        for row in rows
+    ])
+
+
+def refresh_daily_rollups(batch_size=BATCH_SIZE, lag=ROLLUP_LAG):
+    """
+    Bring the rollup tables up to date with transactions changed since the
+    last run (less `lag`). Returns a summary of what was recomputed.
+    """
+    watermark, _ = RollupWatermark.objects.get_or_create(name=WATERMARK_NAME)
+
+    changed = Transaction.objects.all()
+    if watermark.value:
+        changed = changed.filter(updated_at__gte=watermark.value - lag)
+
+    latest = changed.aggregate(latest=Max('updated_at'))['latest']
+    if latest is None:
+        return {'buckets': 0, 'days': 0, 'watermark': watermark.value}
+
+    # Pin the upper bound so rows written while we run wait for the next run
+    changed = changed.filter(updated_at__lte=latest)
+    buckets = changed.annotate(
+        day=TruncDate('created_at')
+    ).values_list('day', 'collection_id').distinct().order_by()
+
+    collections_by_day = {}
+    for day, collection_id in buckets:
+        collections_by_day.setdefault(day, []).append(collection_id)
+
+    bucket_count = 0
+    for day in sorted(collections_by_day):
+        collection_ids = collections_by_day[day]
+        with db_transaction.atomic(using=current_db()):
+            for i in range(0, len(collection_ids), batch_size):
+                _rebuild_collection_buckets(day, collection_ids[i:i + batch_size])
+            _rebuild_global_day(day)
+        bucket_count += len(collection_ids)
+
+    # The re-scanned window may hold nothing newer than the old watermark
+    watermark.value = max(latest, watermark.value) if watermark.value else latest
+    watermark.save(update_fields=['value', 'updated_at'])
+
+    return {'buckets': bucket_count, 'days': len(collections_by_day), 'watermark': watermark.value}
+
+
+def reset_daily_rollups():
+    """Drop every rollup row and the watermark so the next refresh rebuilds from scratch"""
+    with db_transaction.atomic(using=current_db()):
+        CollectionDailyRollup.objects.all().delete()
+        DailyRollup.objects.all().delete()
+        RollupWatermark.objects.filter(name=WATERMARK_NAME).delete()
+
+
+def collection_daily_series(collection, days=30):
+    """Daily payment counts and amounts for one collection, read from the rollup table"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = CollectionDailyRollup.objects.filter(
+        collection=collection,
+        date__gte=since,
+        transaction_type='payment'
+    ).values('date').annotate(
+        total_count=Sum('count'),
+        total_amount=Sum('amount'),
+        success_count=Sum('count', filter=Q(status='success')),
+        success_amount=Sum('amount', filter=Q(status='success'))
+    ).order_by('date')
+
+    return [
+        {
+            'date': row['date'].isoformat(),
+            'payments': row['total_count'],
+            'amount': float(row['total_amount'] or 0),
+            'successful_payments': row['success_count'] or 0,
+            'amount_collected': float(row['success_amount'] or 0)
+        }
+        for row in rows
+    ]
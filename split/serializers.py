@@ -1,12 +1,104 @@
+from functools import lru_cache
+
+from kontribute.egress import UnsafeURL, check_url
+
 from .models import *
-from rest_framework.serializers import ModelSerializer, UUIDField
+from rest_framework.serializers import ModelSerializer, UUIDField, ValidationError
+
+
+def clean_phone(value):
+    """Validate Nigerian phone number"""
+    phone = value.replace(' ', '').replace('-', '')
+
+    if phone.startswith('0') and len(phone) == 11:
+        return phone
+    if phone.startswith('+234') and len(phone) == 14:
+        return phone
+    if phone.startswith('234') and len(phone) == 13:
+        return phone
+
+    raise ValidationError(
+        'Invalid phone number format. Use: 08012345678'
+    )
+
+
+def canonical_phone(value):
+    """E.164 form (+234...) of a valid Nigerian phone number"""
+    phone = clean_phone(value)
+    if phone.startswith('0'):
+        return '+234' + phone[1:]
+    if phone.startswith('234'):
+        return '+' + phone
+    return phone
+
+
+def validate_public_url(value):
+    """Webhook targets must be http(s) URLs whose host resolves to public addresses only"""
+    try:
+        check_url(value)
+    except UnsafeURL as e:
+        raise ValidationError(str(e))
+    return value
+
+
+@lru_cache(maxsize=None)
+def _readable_sources(serializer_class):
+    """{output field name: model attribute} for a serializer, built once per class"""
+    return {
+        name: field.source
+        for name, field in serializer_class().fields.items()
+        if not field.write_only
+    }
+
+
+def sparse_fields(request, serializer_class):
+    """
+    The ?fields=a,b sparse fieldset as a list, or None when every field is wanted.
+    Raises ValidationError for names the serializer does not output.
+    """
+    return sparse_keys(request, _readable_sources(serializer_class))
+
+
+def sparse_keys(request, available):
+    """sparse_fields() for responses built as dicts, with `available` top-level keys"""
+    raw = request.query_params.get('fields', '')
+    requested = [name.strip() for name in raw.split(',') if name.strip()]
+    if not requested:
+        return None
 
-class CollectionSerializers(ModelSerializer):
+    unknown = [name for name in requested if name not in available]
+    if unknown:
+        raise ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(available)}"})
+    return requested
+
+
+def only_fields(serializer_class, fields, *extra):
+    """Model columns behind a sparse fieldset, for queryset.only()"""
+    model_fields = {field.name for field in serializer_class.Meta.model._meta.concrete_fields}
+    sources = _readable_sources(serializer_class)
+    return [
+        name for name in {sources[field] for field in fields} | set(extra)
+        if name in model_fields
+    ]
+
+
+class SparseFieldsMixin:
+    """Pass fields=[...] to output only those fields"""
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class CollectionSerializers(SparseFieldsMixin, ModelSerializer):
   class Meta:
     model = Collection
     fields = "__all__"
+    read_only_fields = ['version']
 
-class ContributorSerializer(ModelSerializer):
+class ContributorSerializer(SparseFieldsMixin, ModelSerializer):
     collection_id = UUIDField(write_only=True)  # Accept collection_id in POST
     
     class Meta:
@@ -22,27 +114,41 @@ class ContributorSerializer(ModelSerializer):
             'payment_status',
             'payment_reference',
             'created_at',
-            'paid_at'
+            'paid_at',
+            'version'
         ]
-        read_only_fields = ['id', 'payment_status', 'payment_reference', 'created_at', 'paid_at']
+        read_only_fields = ['id', 'payment_status', 'payment_reference', 'created_at', 'paid_at', 'version']
     
     def validate_phone(self, value):
         """Validate Nigerian phone number"""
-        phone = value.replace(' ', '').replace('-', '')
-        
-        if phone.startswith('0') and len(phone) == 11:
-            return phone
-        if phone.startswith('+234') and len(phone) == 14:
-            return phone
-        if phone.startswith('234') and len(phone) == 13:
-            return phone
-        
-        raise serializers.ValidationError(
-            'Invalid phone number format. Use: 08012345678'
-        )
+        return clean_phone(value)
 
     
 class TransactionSeriliazer(ModelSerializer):
   class Meta:
     model = Transaction
-    fields = "__all__"
\ No newline at end of file
+    fields = "__all__"
+
+
+class WebhookSubscriptionSerializer(ModelSerializer):
+    class Meta:
+        model = WebhookSubscription
+        fields = ['id', 'url', 'event_types', 'is_active', 'created_at']
+        read_only_fields = ['id', 'is_active', 'created_at']
+
+    def validate_url(self, value):
+        return validate_public_url(value)
+
+    def validate_event_types(self, value):
+        allowed = [choice for choice, _ in WebhookSubscription.EVENT_CHOICES]
+        if not isinstance(value, list) or any(event_type not in allowed for event_type in value):
+            raise ValidationError(f"event_types must be a list of: {', '.join(allowed)}")
+        return value
+
+
+class RecurringScheduleSerializer(ModelSerializer):
+    class Meta:
+        model = RecurringSchedule
+        fields = ['id', 'interval', 'next_run_at', 'is_active', 'run_count', 'last_slug', 'created_at']
+        read_only_fields = ['id', 'is_active', 'run_count', 'last_slug', 'created_at']
+        extra_kwargs = {'next_run_at': {'required': False}}
@@ -0,0 +1,143 @@
+"""
+Share pages for collection links
+
+The collection_url handed out by create_collections is pasted into chat
+apps, whose crawlers fetch link previews in bursts. /collections/<slug>/
+serves a small HTML page with Open Graph tags (title, progress, amount)
+instead of the JSON API.
+
+The rendered page and its ETag are cached per slug. The outbox handler
+below drops the entry when an event changes the collection's stats
+(contribution created, confirmed or expired, withdrawal, cancellation),
+so the next request renders it again; SHARE_PAGE_CACHE_TIMEOUT bounds
+how stale a page can get if the relay is behind. Until then every
+request, conditional or not, is served from the cache without touching
+the database.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils.html import format_html
+
+from . import outbox
+from .models import Collection
+
+SHARE_PAGE_CACHE_TIMEOUT = 60 * 60
+# What browsers and crawlers may reuse without asking again
+SHARE_PAGE_MAX_AGE = 60
+
+STATS_EVENTS = (
+    outbox.CONTRIBUTION_CREATED,
+    outbox.PAYMENT_CONFIRMED,
+    outbox.CONTRIBUTION_EXPIRED,
+    outbox.WITHDRAWAL_REQUESTED,
+    outbox.COLLECTION_CANCELLED,
+)
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{title}</title>
+<meta name="description" content="{description}">
+<meta property="og:type" content="website">
+<meta property="og:site_name" content="Kontribute">
+<meta property="og:title" content="{title}">
+<meta property="og:description" content="{description}">
+<meta property="og:url" content="{url}">
+<meta name="twitter:card" content="summary">
+<meta name="twitter:title" content="{title}">
+<meta name="twitter:description" content="{description}">
+</head>
+<body>
+<h1>{title}</h1>
+<p>Organized by {organizer}</p>
+<p>{description}</p>
+<progress max="100" value="{percentage}">{percentage}%</progress>
+</body>
+</html>
+"""
+
+
+def share_cache_key(slug):
+    return f"share-page:{slug}"
+
+
+def _naira(amount):
+    return f"₦{amount:,.2f}".removesuffix('.00')
+
+
+def collection_stats(collection):
+    """Paid total and counts for one collection, in a single query"""
+    stats = collection.contributors.aggregate(
+        total_collected=Sum('amount_paid', filter=Q(payment_status='paid')),
+        paid_count=Count('id', filter=Q(payment_status='paid')),
+        pending_count=Count('id', filter=Q(payment_status='pending')),
+    )
+    stats['total_collected'] = stats['total_collected'] or 0
+    if collection.total_amount:
+        stats['completion_percentage'] = round(stats['total_collected'] / collection.total_amount * 100, 2)
+    else:
+        stats['completion_percentage'] = 100
+    return stats
+
+
+def share_description(collection, stats):
+    parts = [f"{_naira(stats['total_collected'])} raised"]
+    if collection.total_amount:
+        parts[0] += f" of {_naira(collection.total_amount)} ({float(stats['completion_percentage']):g}%)"
+    if collection.amount_per_person:
+        parts.append(f"{_naira(collection.amount_per_person)} per person")
+    parts.append(f"{stats['paid_count']} paid")
+    if collection.status != 'active':
+        parts.append(collection.get_status_display())
+    return " · ".join(parts)
+
+
+def render_share_page(collection, stats, url):
+    return format_html(
+        PAGE_TEMPLATE,
+        title=collection.title,
+        description=share_description(collection, stats),
+        url=url,
+        organizer=collection.organizer_name,
+        percentage=min(int(stats['completion_percentage']), 100),
+    )
+
+
+def share_page(slug, url):
+    """
+    The cached {'html', 'etag'} for a collection's share page, rendering
+    it on a miss. Returns None for an unknown slug.
+    """
+    key = share_cache_key(slug)
+    page = cache.get(key)
+    if page is not None:
+        return page
+
+    collection = Collection.objects.filter(slug=slug).first()
+    if collection is None:
+        return None
+    html = render_share_page(collection, collection_stats(collection), url)
+    page = {
+        'html': html,
+        'etag': '"%s"' % hashlib.md5(html.encode()).hexdigest(),
+    }
+    cache.set(key, page, SHARE_PAGE_CACHE_TIMEOUT)
+    return page
+
+
+def invalidate_share_pages(*slugs):
+    cache.delete_many([share_cache_key(slug) for slug in slugs])
+
+
+@outbox.register(*STATS_EVENTS)
+def refresh_share_page(event):
+    """Outbox handler: drop the cached page of a collection whose stats changed"""
+    slug = (event.payload or {}).get('slug')
+    if not slug and event.collection_id:
+        slug = Collection.objects.filter(pk=event.collection_id).values_list('slug', flat=True).first()
+    if slug:
+        invalidate_share_pages(slug)
@@ -1,3 +1,1475 @@
-from django.test import TestCase
+import contextlib
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock, skipUnless
+from urllib.parse import urlsplit
 
-# Create your tests here.
+import httpx
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.cache import cache
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.db import OperationalError, connections, transaction as db_transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from kontribute import routers
+from kontribute.sharding import ID_BLOCK, current_db, each_shard, shard_for_slug, use_shard, uuid_for_slug
+
+from . import anomalies, outbox, references, webhooks
+from .models import (
+    Collection,
+    CollectionDailyRollup,
+    Contributor,
+    FlaggedEvent,
+    OutboxEvent,
+    RecurringSchedule,
+    ReferenceSequence,
+    RefundJob,
+    Transaction,
+    WebhookDeadLetter,
+    WebhookEvent,
+    WebhookSubscription
+)
+from .payments import CircuitBreaker, PaystackClient, reconcile_pending
+from .expiry import expire_stale_contributions
+from .management.commands.rebalance_shards import move_collection
+from .recurring import add_months, run_due_schedules
+from .reports import build_report
+from .rollups import ROLLUP_LAG, refresh_daily_rollups
+from .refunds import PayoutProvider, PayoutResult, cancel_collection, process_job, retry_failed
+from .serializers import canonical_phone
+from .views import CONFIRMABLE_COLLECTION_STATUSES
+from .webhooks import WebhookSender, deliver_pending, new_secret, verify
+
+
+def make_collection(**fields):
+    defaults = {
+        'title': "Monthly Dues",
+        'slug': "monthly-dues-0000001",
+        'organizer_name': "Ade",
+        'organizer_phone': "08012345678",
+        'status': 'active',
+    }
+    defaults.update(fields)
+    return Collection.objects.create(**defaults)
+
+
+def stub_dns(test, records):
+    """Resolve host names from `records` ({host: [address]}) instead of DNS for the rest of the test"""
+    patcher = mock.patch('kontribute.egress.resolve', side_effect=lambda host, port: records.get(host, []))
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+class BulkAddContributorsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.collection = make_collection(total_amount=50000)
+        self.url = f"/api/collections/{self.collection.slug}/contributors/bulk/"
+
+    def test_invalid_rows_are_skipped_not_fatal(self):
+        result = self.client.post(self.url, {'contributors': [
+            "x",
+            {'name': "Zero", 'phone': "08030000001", 'amount': 0},
+            {'name': "Negative", 'phone': "08030000002", 'amount': -500},
+            {'name': "NaN", 'phone': "08030000003", 'amount': "NaN"},
+            {'name': "Infinite", 'phone': "08030000004", 'amount': "Infinity"},
+            {'name': "Good", 'phone': "08030000005", 'amount': 1500},
+        ]}, format='json')
+
+        self.assertEqual(result.status_code, 201)
+        self.assertEqual(result.data['data']['created_count'], 1)
+        self.assertEqual([row['row'] for row in result.data['data']['skipped']], [1, 2, 3, 4, 5])
+        self.assertEqual(result.data['data']['skipped'][0]['reason'], "Each contributor must be an object")
+        self.assertEqual(list(Contributor.objects.values_list('name', flat=True)), ["Good"])
+
+    def test_amounts_with_more_than_two_decimal_places_are_skipped(self):
+        result = self.client.post(self.url, {'contributors': [
+            {'name': "Fractional", 'phone': "08030000001", 'amount': "1.234"},
+            {'name': "Cents", 'phone': "08030000002", 'amount': "1.5"},
+            {'name': "Padded", 'phone': "08030000003", 'amount': "2.500"},
+        ]}, format='json')
+
+        self.assertEqual(result.status_code, 201)
+        self.assertEqual(result.data['data']['skipped'], [
+            {'row': 1, 'reason': "Amount can have at most 2 decimal places"}
+        ])
+        # What comes back is what was stored
+        stored = dict(Contributor.objects.values_list('name', 'amount_owed'))
+        self.assertEqual(stored, {"Cents": Decimal('1.50'), "Padded": Decimal('2.50')})
+        self.assertEqual(
+            {row['name']: row['amount'] for row in result.data['data']['contributors']},
+            {name: float(amount) for name, amount in stored.items()}
+        )
+
+    def test_added_contributors_are_scored(self):
+        cache.clear()
+        result = self.client.post(self.url, {'contributors': [
+            {'name': "Usual", 'phone': "08030000001", 'amount': 1500},
+            {'name': "Outlier", 'phone': "08030000002", 'amount': 60000},
+        ]}, format='json')
+
+        self.assertEqual(result.status_code, 201)
+        self.assertEqual(
+            list(FlaggedEvent.objects.values_list('rule', 'contributor__name')),
+            [('amount_outlier', "Outlier")]
+        )
+
+
+
+class PhoneDedupeTests(TestCase):
+    FORMATS = ["08031234567", "+2348031234567", "2348031234567"]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.collection = make_collection(amount_per_person=1000)
+
+    def test_formats_share_one_canonical_form(self):
+        self.assertEqual({canonical_phone(phone) for phone in self.FORMATS}, {"+2348031234567"})
+
+    def test_contribute_finds_the_pending_contribution_in_any_format(self):
+        url = f"/api/collections/{self.collection.slug}/contribute/"
+        ids = {
+            self.client.post(url, {'name': "Bola", 'phone': phone}, format='json').data['data']['contributor_id']
+            for phone in self.FORMATS
+        }
+
+        self.assertEqual(len(ids), 1)
+        self.assertEqual(Contributor.objects.count(), 1)
+
+    def test_bulk_add_skips_other_formats_of_the_same_phone(self):
+        result = self.client.post(
+            f"/api/collections/{self.collection.slug}/contributors/bulk/",
+            {'contributors': [{'name': "Bola", 'phone': phone} for phone in self.FORMATS]},
+            format='json'
+        )
+
+        self.assertEqual(result.data['data']['created_count'], 1)
+        self.assertEqual(
+            [(row['row'], row['reason']) for row in result.data['data']['skipped']],
+            [(2, "Duplicate phone number"), (3, "Duplicate phone number")]
+        )
+
+    def test_backfill_migration_fills_every_batch(self):
+        backfill = importlib.import_module('split.migrations.0012_backfill_phone_e164')
+        phones = self.FORMATS + ["0803 123 4568", "not-a-phone"]
+        Contributor.objects.bulk_create([
+            Contributor(collection=self.collection, name=f"c{n}", phone=phone, amount_owed=1000)
+            for n, phone in enumerate(phones)
+        ])
+
+        with mock.patch.object(backfill, 'BATCH_SIZE', 2):
+            backfill.backfill_phone_e164(apps, mock.Mock(connection=connections['default']))
+
+        self.assertEqual(
+            dict(Contributor.objects.values_list('phone', 'phone_e164')),
+            {
+                "08031234567": "+2348031234567",
+                "+2348031234567": "+2348031234567",
+                "2348031234567": "+2348031234567",
+                "0803 123 4568": "+2348031234568",
+                "not-a-phone": "",
+            }
+        )
+
+
+class OutboxRelayTests(TestCase):
+    EVENT = 'test.event'
+
+    def setUp(self):
+        self.collection = make_collection()
+        self.handled = []
+        self.failing = set()
+        patcher = mock.patch.dict(outbox._handlers, {self.EVENT: [self.handler]})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def handler(self, event):
+        n = event.payload['n']
+        self.handled.append(n)
+        Contributor.objects.create(collection=self.collection, name=f"from-{n}", phone="08030000001")
+        if n in self.failing:
+            raise RuntimeError(f"handler failed on {n}")
+
+    def publish(self, n, delay=0):
+        event = outbox.publish(self.EVENT, {'n': n}, collection=self.collection)
+        if delay:
+            OutboxEvent.objects.filter(pk=event.pk).update(available_at=timezone.now() + timedelta(seconds=delay))
+        return event
+
+    def test_events_are_handled_in_order(self):
+        self.publish(1)
+        self.publish(2, delay=-60)
+        self.publish(3)
+
+        self.assertEqual(outbox.relay(batch_size=2), (2, 0))
+        self.assertEqual(outbox.relay(batch_size=2), (1, 0))
+        self.assertEqual(self.handled, [2, 1, 3])
+
+    def test_failed_event_is_rolled_back_and_retried(self):
+        self.failing = {2}
+        failed = self.publish(2)
+        self.publish(1)
+
+        self.assertEqual(outbox.relay(), (1, 1))
+        failed.refresh_from_db()
+        self.assertEqual((failed.attempts, failed.last_error, failed.processed_at), (1, "handler failed on 2", None))
+        self.assertGreater(failed.available_at, timezone.now())
+        # The failed handler's writes went with its savepoint
+        self.assertEqual(list(Contributor.objects.values_list('name', flat=True)), ["from-1"])
+
+        # Not retried before its backoff is up
+        self.assertEqual(outbox.relay(), (0, 0))
+
+        self.failing = set()
+        OutboxEvent.objects.filter(pk=failed.pk).update(available_at=timezone.now())
+        self.assertEqual(outbox.relay(), (1, 0))
+        self.assertEqual(self.handled, [2, 1, 2])
+        self.assertEqual(sorted(Contributor.objects.values_list('name', flat=True)), ["from-1", "from-2"])
+
+    def test_each_event_is_handled_once(self):
+        for n in range(5):
+            self.publish(n)
+
+        call_command('relay_outbox', batch_size=2, stdout=open(os.devnull, 'w'))
+        call_command('relay_outbox', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(self.handled, [0, 1, 2, 3, 4])
+        self.assertFalse(OutboxEvent.objects.filter(processed_at__isnull=True).exists())
+
+class WebhookDeliveryTests(TestCase):
+    def setUp(self):
+        self.collection = make_collection()
+        self.subscription = WebhookSubscription.objects.create(
+            collection=self.collection,
+            url="https://hooks.example.com/kontribute",
+            secret=new_secret()
+        )
+        self.requests = []
+        self.status_code = 200
+        self.dns = {'hooks.example.com': ["93.184.216.34"]}
+        stub_dns(self, self.dns)
+
+    def queue_events(self, count):
+        return WebhookEvent.objects.bulk_create([
+            WebhookEvent(
+                subscription=self.subscription,
+                outbox_event_id=n,
+                event_type='contribution.created',
+                payload={'slug': self.collection.slug, 'n': n}
+            )
+            for n in range(count)
+        ])
+
+    def handler(self, request):
+        self.requests.append(request)
+        return httpx.Response(self.status_code)
+
+    def deliver(self, **kwargs):
+        sender = WebhookSender(transport=httpx.MockTransport(self.handler))
+        try:
+            return deliver_pending(sender, **kwargs)
+        finally:
+            sender.close()
+
+    def test_batches_are_signed_with_the_subscription_secret(self):
+        self.queue_events(2)
+
+        self.assertEqual(self.deliver(), (2, 0, 0))
+        request = self.requests[0]
+        body = request.read()
+        self.assertTrue(verify(
+            self.subscription.secret,
+            request.headers['X-Kontribute-Timestamp'],
+            body,
+            request.headers['X-Kontribute-Signature']
+        ))
+        self.assertFalse(verify("another secret", request.headers['X-Kontribute-Timestamp'], body,
+                                request.headers['X-Kontribute-Signature']))
+        self.assertEqual([e['data']['n'] for e in json.loads(body)['events']], [0, 1])
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_events_are_coalesced_into_batches(self):
+        self.queue_events(5)
+
+        self.assertEqual(self.deliver(batch_size=2), (5, 0, 0))
+        self.assertEqual(sorted(len(json.loads(r.read())['events']) for r in self.requests), [1, 2, 2])
+
+    def test_failed_batch_is_retried_with_backoff(self):
+        self.queue_events(2)
+        self.status_code = 500
+
+        before = timezone.now()
+        self.assertEqual(self.deliver(), (0, 2, 0))
+        for event in WebhookEvent.objects.all():
+            self.assertEqual(event.attempts, 1)
+            self.assertEqual(event.last_error, "HTTP 500")
+            self.assertGreaterEqual(event.next_attempt_at, before + timedelta(seconds=60))
+
+        # Not due yet, so nothing is sent
+        self.assertEqual(self.deliver(), (0, 0, 0))
+        self.assertEqual(len(self.requests), 1)
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        self.status_code = 204
+        self.assertEqual(self.deliver(), (2, 0, 0))
+
+    def test_last_failed_attempt_moves_events_to_dead_letters(self):
+        self.queue_events(2)
+        WebhookEvent.objects.update(attempts=webhooks.MAX_ATTEMPTS - 1)
+        self.status_code = 503
+
+        self.assertEqual(self.deliver(), (0, 0, 2))
+        self.assertFalse(WebhookEvent.objects.exists())
+        dead_letter = WebhookDeadLetter.objects.get()
+        self.assertEqual(dead_letter.attempts, webhooks.MAX_ATTEMPTS)
+        self.assertEqual(dead_letter.status_code, 503)
+        self.assertEqual(len(dead_letter.events), 2)
+
+    def test_requests_connect_to_the_checked_address(self):
+        self.queue_events(1)
+
+        self.assertEqual(self.deliver(), (1, 0, 0))
+        request = self.requests[0]
+        self.assertEqual(request.url.host, "93.184.216.34")
+        self.assertEqual(request.headers['Host'], "hooks.example.com")
+        self.assertEqual(request.extensions['sni_hostname'], "hooks.example.com")
+
+    def test_host_rebound_to_an_internal_address_is_not_sent(self):
+        self.queue_events(2)
+        self.dns['hooks.example.com'] = ["93.184.216.34", "169.254.169.254"]
+
+        self.assertEqual(self.deliver(), (0, 2, 0))
+        self.assertEqual(self.requests, [])
+        self.assertEqual(WebhookEvent.objects.first().last_error, "URL must point at a public host")
+
+
+class WebhookSubscriptionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.collection = make_collection()
+        self.url = f"/api/collections/{self.collection.slug}/webhooks/"
+        stub_dns(self, {
+            'hooks.example.com': ["93.184.216.34", "2606:2800:220:1::1"],
+            'rebind.example.com': ["127.0.0.1"],
+            'mixed.example.com': ["93.184.216.34", "10.1.2.3"],
+            'metadata.example.com': ["::ffff:169.254.169.254"],
+        })
+
+    def test_internal_and_non_http_urls_are_rejected(self):
+        for url in [
+            "http://127.0.0.1/hook",
+            "http://localhost:8000/hook",
+            "http://169.254.169.254/latest/meta-data/",
+            "http://10.0.0.5/hook",
+            "http://[::1]/hook",
+            "http://2130706433/hook",
+            "ftp://example.com/hook",
+            "https://rebind.example.com/hook",
+            "https://mixed.example.com/hook",
+            "https://metadata.example.com/hook",
+            "https://unknown.example.com/hook",
+        ]:
+            with self.subTest(url=url):
+                result = self.client.post(self.url, {'url': url}, format='json')
+                self.assertEqual(result.status_code, 400)
+                self.assertIn('url', result.data['errors'])
+        self.assertFalse(WebhookSubscription.objects.exists())
+
+    def test_public_url_is_accepted(self):
+        result = self.client.post(self.url, {'url': "https://hooks.example.com/kontribute"}, format='json')
+        self.assertEqual(result.status_code, 201)
+        self.assertTrue(result.data['data']['secret'])
+
+
+class PaystackReconcileTests(TestCase):
+    def setUp(self):
+        self.collection = make_collection(amount_per_person=1000)
+        # reference: (status code, Paystack transaction status, amount in kobo)
+        self.responses = {}
+        self.calls = []
+
+    def pending_payment(self, reference, status='pending'):
+        contributor = Contributor.objects.create(
+            collection=self.collection,
+            name=reference,
+            phone="08030000001",
+            amount_owed=1000,
+            payment_status=status,
+            payment_method='card',
+            payment_reference=reference
+        )
+        payment = Transaction.objects.create(
+            collection=self.collection,
+            contributor=contributor,
+            transaction_type='payment',
+            amount=1000,
+            status='pending',
+            reference=reference
+        )
+        # Past the grace period
+        Transaction.objects.filter(pk=payment.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        return contributor
+
+    def handler(self, request):
+        reference = request.url.path.rsplit('/', 1)[-1]
+        self.calls.append(reference)
+        status_code, status, amount = self.responses[reference]
+        if status_code != 200:
+            return httpx.Response(status_code)
+        return httpx.Response(200, json={'status': True, 'data': {
+            'reference': reference, 'status': status, 'amount': amount, 'paid_at': "2026-10-19T10:00:00Z"
+        }})
+
+    def paystack(self, **kwargs):
+        client = PaystackClient(
+            secret_key="sk_test", base_url="https://paystack.test",
+            transport=httpx.MockTransport(self.handler), **kwargs
+        )
+        self.addCleanup(client.close)
+        return client
+
+    def test_paid_reference_is_confirmed(self):
+        contributor = self.pending_payment("KTR-PAID")
+        self.responses["KTR-PAID"] = (200, 'success', 100000)
+
+        self.assertEqual(reconcile_pending(self.paystack()), (1, 0, 0))
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'paid')
+        self.assertEqual(contributor.amount_paid, 1000)
+        self.assertEqual(contributor.verified_by, 'paystack')
+        self.assertEqual(Transaction.objects.get(reference="KTR-PAID").status, 'success')
+        self.assertEqual(OutboxEvent.objects.filter(event_type=outbox.PAYMENT_CONFIRMED).count(), 1)
+
+    def test_already_paid_contributor_is_not_announced_again(self):
+        self.pending_payment("KTR-DONE", status='paid')
+        self.responses["KTR-DONE"] = (200, 'success', 100000)
+
+        self.assertEqual(reconcile_pending(self.paystack()), (1, 0, 0))
+        self.assertEqual(Transaction.objects.get(reference="KTR-DONE").status, 'success')
+        self.assertFalse(OutboxEvent.objects.filter(event_type=outbox.PAYMENT_CONFIRMED).exists())
+
+    def test_abandoned_reference_fails_the_payment(self):
+        contributor = self.pending_payment("KTR-GONE")
+        self.responses["KTR-GONE"] = (200, 'abandoned', 100000)
+
+        self.assertEqual(reconcile_pending(self.paystack()), (0, 1, 0))
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'failed')
+        self.assertEqual(Transaction.objects.get(reference="KTR-GONE").status, 'failed')
+
+    def test_underpaid_reference_stays_pending(self):
+        contributor = self.pending_payment("KTR-SHORT")
+        self.responses["KTR-SHORT"] = (200, 'success', 50000)
+
+        self.assertEqual(reconcile_pending(self.paystack()), (0, 0, 0))
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'pending')
+        payment = Transaction.objects.get(reference="KTR-SHORT")
+        self.assertEqual((payment.status, payment.verify_attempts), ('pending', 1))
+        self.assertGreater(payment.next_verify_at, timezone.now())
+
+    def test_missing_amount_is_not_confirmed(self):
+        contributor = self.pending_payment("KTR-NOAMOUNT")
+        self.responses["KTR-NOAMOUNT"] = (200, 'success', None)
+
+        self.assertEqual(reconcile_pending(self.paystack()), (0, 0, 0))
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'pending')
+        self.assertFalse(OutboxEvent.objects.filter(event_type=outbox.PAYMENT_CONFIRMED).exists())
+
+    def test_unresolved_references_do_not_starve_newer_payments(self):
+        for reference in ["KTR-STUCK1", "KTR-STUCK2"]:
+            self.pending_payment(reference)
+            self.responses[reference] = (200, 'ongoing', None)
+        newer = self.pending_payment("KTR-NEW")
+        Transaction.objects.filter(reference="KTR-NEW").update(created_at=timezone.now() - timedelta(minutes=30))
+        self.responses["KTR-NEW"] = (200, 'success', 100000)
+        client = self.paystack()
+
+        self.assertEqual(reconcile_pending(client, limit=2), (0, 0, 0))
+        self.assertEqual(reconcile_pending(client, limit=2), (1, 0, 0))
+        self.assertEqual(sorted(self.calls[:2]), ["KTR-STUCK1", "KTR-STUCK2"])
+        self.assertEqual(self.calls[2:], ["KTR-NEW"])
+        newer.refresh_from_db()
+        self.assertEqual(newer.payment_status, 'paid')
+
+    def test_server_error_is_retried_on_the_next_sweep(self):
+        contributor = self.pending_payment("KTR-RETRY")
+        self.responses["KTR-RETRY"] = (502, None, None)
+        client = self.paystack()
+
+        self.assertEqual(reconcile_pending(client), (0, 0, 1))
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'pending')
+
+        # Backed off, so not checked again straight away
+        self.assertEqual(reconcile_pending(client), (0, 0, 0))
+        self.assertEqual(self.calls, ["KTR-RETRY"])
+
+        Transaction.objects.update(next_verify_at=timezone.now())
+        self.responses["KTR-RETRY"] = (200, 'success', 100000)
+        self.assertEqual(reconcile_pending(client), (1, 0, 0))
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'paid')
+
+    def test_circuit_opens_then_half_opens(self):
+        for reference in ["KTR-A", "KTR-B", "KTR-C"]:
+            self.responses[reference] = (503, None, None)
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+        client = self.paystack(breaker=breaker, concurrency=1)
+
+        with mock.patch('split.payments.time.monotonic', return_value=1000.0):
+            results = client.verify_many(["KTR-A", "KTR-B", "KTR-C"])
+            self.assertEqual(breaker.state, 'open')
+        self.assertEqual(self.calls, ["KTR-A", "KTR-B"])
+        self.assertEqual(results[2].error, "Payment provider circuit is open")
+
+        self.responses["KTR-C"] = (200, 'success', 100000)
+        with mock.patch('split.payments.time.monotonic', return_value=1031.0):
+            self.assertEqual(breaker.state, 'half-open')
+            result = client.verify_many(["KTR-C"])[0]
+        self.assertEqual((result.status, result.error), ('success', None))
+        self.assertEqual(breaker.state, 'closed')
+
+
+@skipUnless(apps.is_installed('django.contrib.admin'), "The admin is not installed (settings_api)")
+class ContributorAdminActionTests(TestCase):
+    def setUp(self):
+        from django.contrib.admin.sites import site
+
+        from .admin import ContributorAdmin
+
+        self.collection = make_collection(amount_per_person=1000)
+        self.admin = ContributorAdmin(Contributor, site)
+        self.request = RequestFactory().post("/admin/split/contributor/")
+        self.request.user = User(username="support")
+        self.contributors = {
+            status: Contributor.objects.create(
+                collection=self.collection,
+                name=status,
+                phone="08030000001",
+                amount_owed=1000,
+                payment_status=status
+            )
+            for status in ['pending', 'failed', 'paid', 'refunded', 'expired']
+        }
+
+    def test_confirmations_are_scored(self):
+        cache.clear()
+        with mock.patch.dict(anomalies.RULES, {'confirmation_burst': anomalies.Rule(300, 1)}):
+            self.run_action(self.admin.confirm_payments)
+
+        self.assertEqual(list(FlaggedEvent.objects.values_list('rule', flat=True)), ['confirmation_burst'])
+
+    def run_action(self, action):
+        with mock.patch.object(self.admin, 'message_user'):
+            action(self.request, Contributor.objects.all())
+        return dict(Contributor.objects.values_list('name', 'payment_status'))
+
+    def test_confirm_only_touches_pending_and_failed(self):
+        statuses = self.run_action(self.admin.confirm_payments)
+
+        self.assertEqual(statuses, {
+            'pending': 'paid', 'failed': 'paid', 'paid': 'paid', 'refunded': 'refunded', 'expired': 'expired'
+        })
+        self.assertEqual(OutboxEvent.objects.filter(event_type=outbox.PAYMENT_CONFIRMED).count(), 2)
+
+    def test_expired_events_belong_to_the_collection(self):
+        other = make_collection(slug="weekly-dues-0000002")
+        Contributor.objects.create(collection=other, name="other", phone="08030000002", amount_owed=500)
+
+        statuses = self.run_action(self.admin.expire_contributions)
+
+        self.assertEqual(statuses['pending'], 'expired')
+        self.assertEqual(statuses['other'], 'expired')
+        events = OutboxEvent.objects.filter(event_type=outbox.CONTRIBUTION_EXPIRED)
+        self.assertEqual(
+            sorted((e.payload['contributor_id'], e.collection_id) for e in events),
+            sorted([
+                (str(self.contributors['pending'].id), self.collection.id),
+                (str(Contributor.objects.get(name="other").id), other.id),
+            ])
+        )
+
+
+    def test_search_accepts_hand_typed_references_and_rejects_typos(self):
+        reference = references.format_reference(1)
+        Contributor.objects.filter(pk=self.contributors['pending'].pk).update(payment_reference=reference)
+        request = RequestFactory().get("/admin/split/contributor/")
+
+        typed = reference.lower().replace('0', 'o').replace('-', ' ')
+        results, _ = self.admin.get_search_results(request, Contributor.objects.all(), typed)
+        self.assertEqual([c.name for c in results], ['pending'])
+
+        typo = reference[:-2] + ('2' if reference[-2] != '2' else '3') + reference[-1]
+        with mock.patch.object(self.admin, 'message_user') as message_user:
+            results, _ = self.admin.get_search_results(request, Contributor.objects.all(), typo)
+        self.assertEqual(list(results), [])
+        message_user.assert_called_once()
+
+
+class ReferenceTests(TransactionTestCase):
+    def setUp(self):
+        references._blocks.clear()
+        self.addCleanup(references._blocks.clear)
+
+    def test_check_character_catches_single_character_typos(self):
+        code = references.encode(123456789, references.REFERENCE_WIDTH)
+        reference = references.format_reference(123456789)
+        self.assertTrue(references.is_valid_reference(reference))
+
+        for position, original in enumerate(code):
+            for char in references.ALPHABET.replace(original, ''):
+                typo = code[:position] + char + code[position + 1:]
+                self.assertFalse(references.is_valid_reference(typo + reference[-1]), typo)
+
+    def test_check_character_catches_most_neighbour_swaps(self):
+        caught = total = 0
+        for number in range(1, 2000, 7):
+            code = references.format_reference(number)[len(references.REFERENCE_PREFIX):]
+            for position in range(len(code) - 1):
+                if code[position] == code[position + 1]:
+                    continue
+                swapped = code[:position] + code[position + 1] + code[position] + code[position + 2:]
+                total += 1
+                caught += not references.is_valid_reference(swapped)
+        self.assertGreater(caught / total, 0.9)
+
+    def test_references_are_read_back_through_look_alikes(self):
+        reference = references.format_reference(1)
+
+        self.assertEqual(references.canonical_reference(f" {reference.lower().replace('0', 'o')} "), reference)
+        self.assertEqual(references.canonical_reference(reference[4:]), reference)
+        self.assertIsNone(references.canonical_reference("KTR-1A2B3C4D"))
+        self.assertFalse(references.looks_like_reference("KTR-1A2B3C4D"))
+
+    def test_ids_come_from_reserved_blocks(self):
+        self.assertEqual(references.allocate('test', 2, block_size=5), [1, 2])
+        self.assertEqual(references.allocate('test', 4, block_size=5), [3, 4, 5, 6])
+        # Two blocks reserved, two ids still held in memory
+        self.assertEqual(ReferenceSequence.objects.get(name='test').next_value, 11)
+        self.assertEqual(references.allocate('test', 1, block_size=5), [7])
+
+    def test_allocations_inside_a_transaction_keep_nothing_back(self):
+        with db_transaction.atomic():
+            self.assertEqual(references.allocate('test', 2, block_size=5), [1, 2])
+        self.assertNotIn('test', references._blocks)
+        self.assertEqual(ReferenceSequence.objects.get(name='test').next_value, 3)
+
+class FakePayoutProvider(PayoutProvider):
+    """Pays every refund, except references in `failing`; resubmissions return the first payout"""
+
+    def __init__(self, failing=(), error_on_call=None):
+        self.payouts = {}
+        self.submitted = []
+        self.failing = set(failing)
+        self.error_on_call = error_on_call
+
+    def submit(self, refunds):
+        self.submitted.append([refund.reference for refund in refunds])
+        if len(self.submitted) == self.error_on_call:
+            raise ConnectionError("Payout provider unavailable")
+        results = {}
+        for refund in refunds:
+            if refund.reference in self.failing:
+                results[refund.reference] = PayoutResult('failed', '', "Account closed")
+                continue
+            payout = self.payouts.setdefault(refund.reference, f"FAKE-{len(self.payouts) + 1}")
+            results[refund.reference] = PayoutResult('success', payout, '')
+        return results
+
+
+class RefundTests(TestCase):
+    def setUp(self):
+        self.collection = make_collection(amount_per_person=1000)
+        self.paid = [
+            Contributor.objects.create(
+                collection=self.collection,
+                name=f"Paid {n}",
+                phone=f"0803000000{n}",
+                amount_owed=1000,
+                amount_paid=1000,
+                payment_status='paid'
+            )
+            for n in range(3)
+        ]
+        Contributor.objects.create(
+            collection=self.collection, name="Pending", phone="08030000009", amount_owed=1000
+        )
+        self.job = cancel_collection(self.collection)
+
+    def statuses(self):
+        return sorted(Contributor.objects.values_list('payment_status', flat=True))
+
+    def test_paid_contributors_are_refunded(self):
+        provider = FakePayoutProvider()
+
+        self.assertTrue(process_job(self.job, provider))
+        self.assertEqual(self.statuses(), ['pending', 'refunded', 'refunded', 'refunded'])
+        self.assertEqual(
+            Transaction.objects.filter(transaction_type='refund', status='success').count(), 3
+        )
+        job = RefundJob.objects.get()
+        self.assertEqual((job.status, job.created_count, job.refunded_count), ('completed', 3, 3))
+
+    def test_failed_refunds_are_retried(self):
+        provider = FakePayoutProvider(failing={f"RFD-{self.paid[0].id.hex}"})
+
+        self.assertTrue(process_job(self.job, provider))
+        self.assertEqual(self.job.failed_count, 1)
+        failing = Transaction.objects.get(transaction_type='refund', status='failed')
+        self.assertEqual(failing.metadata['payout_error'], "Account closed")
+
+        provider.failing.clear()
+        self.assertEqual(retry_failed(self.job), 1)
+        self.assertTrue(process_job(self.job, provider))
+        self.assertEqual(self.statuses(), ['pending', 'refunded', 'refunded', 'refunded'])
+        self.assertEqual(RefundJob.objects.get().failed_count, 0)
+
+    def test_provider_error_leaves_the_job_resumable(self):
+        provider = FakePayoutProvider(error_on_call=2)
+
+        self.assertFalse(process_job(self.job, provider, chunk_size=1, batch_size=1))
+        job = RefundJob.objects.get()
+        self.assertEqual((job.status, job.refunded_count), ('submitting', 1))
+        self.assertEqual(job.last_error, "Payout provider unavailable")
+
+        self.assertTrue(process_job(job, provider, chunk_size=1, batch_size=1))
+        self.assertEqual(self.statuses(), ['pending', 'refunded', 'refunded', 'refunded'])
+        # The refund paid before the error is not sent again
+        submitted = [reference for batch in provider.submitted for reference in batch]
+        self.assertEqual(len(submitted), 4)
+        self.assertEqual(len(set(submitted)), 3)
+
+    def test_interrupted_selection_resumes_from_the_cursor(self):
+        first = min(self.paid, key=lambda contributor: contributor.id.hex)
+        Transaction.objects.create(
+            collection=self.collection,
+            contributor=first,
+            transaction_type='refund',
+            amount=1000,
+            status='pending',
+            reference=f"RFD-{first.id.hex}"
+        )
+        RefundJob.objects.filter(pk=self.job.pk).update(cursor=first.id, created_count=1)
+        self.job.refresh_from_db()
+
+        self.assertTrue(process_job(self.job, FakePayoutProvider(), chunk_size=1))
+        self.assertEqual(Transaction.objects.filter(transaction_type='refund').count(), 3)
+        self.assertEqual(RefundJob.objects.get().created_count, 3)
+        self.assertEqual(self.statuses(), ['pending', 'refunded', 'refunded', 'refunded'])
+
+    @override_settings(PAYOUT_PROVIDER="")
+    def test_command_refuses_to_run_without_a_provider(self):
+        with self.assertRaisesMessage(CommandError, "PAYOUT_PROVIDER"):
+            call_command('process_refunds')
+        self.assertFalse(Transaction.objects.filter(transaction_type='refund').exists())
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.collection = make_collection()
+        self.contributor = Contributor.objects.create(
+            collection=self.collection,
+            name="Ade",
+            phone="08030000001",
+            phone_e164="+2348030000001",
+            amount_owed=1000,
+            amount_paid=1000,
+            payment_status='paid',
+            payment_reference="KTR-SPARSE",
+            paid_at=timezone.now()
+        )
+
+    def test_receipt_returns_only_requested_fields(self):
+        url = f"/api/receipts/{self.contributor.id}/"
+
+        result = self.client.get(url, {'fields': "reference,payment"})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(set(result.data['data']), {'reference', 'payment'})
+        self.assertEqual(result.data['data']['reference'], "KTR-SPARSE")
+
+        self.assertEqual(self.client.get(url, {'fields': "secret"}).status_code, 400)
+
+    def test_lookup_returns_only_requested_fields(self):
+        result = self.client.get("/api/contributions/lookup/", {'phone': "08030000001", 'fields': "payment_status"})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.data['data']['contributions'], [{'payment_status': 'paid'}])
+
+        # Served from the cache, which still has every field
+        result = self.client.get("/api/contributions/lookup/", {'phone': "08030000001"})
+        self.assertEqual(result.data['data']['contributions'][0]['payment_reference'], "******ARSE")
+
+    def test_lookup_does_not_expose_receipt_ids(self):
+        result = self.client.get("/api/contributions/lookup/", {'phone': "08030000001"})
+
+        row = result.data['data']['contributions'][0]
+        self.assertNotIn('contributor_id', row)
+        self.assertNotIn(str(self.contributor.id), json.dumps(result.data, default=str))
+        self.assertEqual(self.client.get("/api/contributions/lookup/", {
+            'phone': "08030000001", 'fields': "contributor_id"
+        }).status_code, 400)
+
+
+@override_settings(COMPRESSION_MIN_BYTES=0)
+class SharePageTests(TestCase):
+    def setUp(self):
+        self.collection = make_collection()
+        self.url = f"/collections/{self.collection.slug}/"
+
+    def test_compressed_etag_revalidates(self):
+        first = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+
+        second = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 304)
+        self.assertIn('max-age', second['Cache-Control'])
+
+    def test_collection_url_is_the_share_page(self):
+        result = APIClient().post("/api/collections/", {
+            'title': "Class Trip",
+            'organizer_name': "Ade",
+            'organizer_phone': "08012345678",
+        }, format='json')
+
+        self.assertEqual(result.status_code, 201)
+        path = urlsplit(result.data['collection_url']).path
+        self.assertTrue(path.endswith('/'))
+        self.assertEqual(self.client.get(path).status_code, 200)
+
+
+class RecurringScheduleTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        # Not a slug the sequence can hand out
+        self.template = make_collection(slug="monthly-dues-template", amount_per_person=1000)
+        for n, status in enumerate(['paid', 'pending', 'refunded']):
+            Contributor.objects.create(
+                collection=self.template,
+                name=f"Member {n}",
+                phone=f"0803000000{n}",
+                amount_owed=1000,
+                payment_status=status,
+                payment_reference=f"KTR-OLD{n}"
+            )
+        self.schedule = RecurringSchedule.objects.create(
+            collection=self.template,
+            interval='monthly',
+            next_run_at=self.now - timedelta(hours=1)
+        )
+
+    def test_due_schedule_clones_the_template(self):
+        self.assertEqual(run_due_schedules(self.now), 1)
+
+        self.schedule.refresh_from_db()
+        self.assertEqual((self.schedule.run_count, self.schedule.pending_slug), (1, ''))
+        self.assertGreater(self.schedule.next_run_at, self.now)
+        clone = Collection.objects.get(slug=self.schedule.last_slug)
+        self.assertEqual((clone.title, clone.status), (self.template.title, 'active'))
+
+        # Refunded members are not carried over
+        contributors = list(clone.contributors.all())
+        self.assertEqual(sorted(c.name for c in contributors), ["Member 0", "Member 1"])
+        for contributor in contributors:
+            self.assertEqual(contributor.payment_status, 'pending')
+            self.assertTrue(contributor.payment_reference.startswith('KTR-'))
+            self.assertNotIn(contributor.payment_reference, ["KTR-OLD0", "KTR-OLD1"])
+            payment = Transaction.objects.get(reference=contributor.payment_reference)
+            self.assertEqual((payment.contributor_id, payment.status), (contributor.id, 'pending'))
+
+        # Not due again until next_run_at
+        self.assertEqual(run_due_schedules(self.now), 0)
+
+    def test_rerun_after_a_crash_reuses_the_clone(self):
+        with mock.patch('split.recurring.next_run', side_effect=RuntimeError("scheduler died")):
+            with self.assertRaises(RuntimeError):
+                run_due_schedules(self.now)
+        self.schedule.refresh_from_db()
+        slug = self.schedule.pending_slug
+        self.assertTrue(Collection.objects.filter(slug=slug).exists())
+        self.assertEqual(self.schedule.run_count, 0)
+
+        self.assertEqual(run_due_schedules(self.now), 0)
+        self.schedule.refresh_from_db()
+        self.assertEqual((self.schedule.last_slug, self.schedule.run_count), (slug, 1))
+        self.assertEqual(Collection.objects.filter(slug=slug).count(), 1)
+        self.assertEqual(Contributor.objects.filter(collection__slug=slug).count(), 2)
+
+    def test_cancelled_template_deactivates_its_schedule(self):
+        Collection.objects.filter(pk=self.template.pk).update(status='cancelled')
+
+        self.assertEqual(run_due_schedules(self.now), 0)
+        self.schedule.refresh_from_db()
+        self.assertFalse(self.schedule.is_active)
+        self.assertEqual(Collection.objects.count(), 1)
+
+    def test_add_months_clamps_to_the_end_of_the_month(self):
+        def day(year, month, d):
+            return datetime(year, month, d, 9, 30, tzinfo=dt_timezone.utc)
+
+        self.assertEqual(add_months(day(2027, 1, 31), 1), day(2027, 2, 28))
+        self.assertEqual(add_months(day(2028, 1, 31), 1), day(2028, 2, 29))
+        self.assertEqual(add_months(day(2027, 3, 31), 1), day(2027, 4, 30))
+        self.assertEqual(add_months(day(2027, 12, 31), 2), day(2028, 2, 29))
+        self.assertEqual(add_months(day(2027, 5, 15), 1), day(2027, 6, 15))
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.collection = make_collection()
+        self.path = f"/api/collections/{self.collection.slug}/"
+        self.events = []
+
+    def batch(self, requests, parallel=False):
+        return self.client.post("/api/batch/", {'requests': requests, 'parallel': parallel}, format='json')
+
+    def fake_run_one(self, delays, barriers):
+        """run_one stand-in: waits on its group's barrier, so grouped GETs only finish if run together"""
+        def run_one(request, sub):
+            self.events.append(('start', sub.id))
+            if sub.id in barriers:
+                barriers[sub.id].wait()
+            time.sleep(delays.get(sub.id, 0))
+            self.events.append(('end', sub.id))
+            return {'id': sub.id, 'status': 200, 'body': None}
+        return run_one
+
+    def test_parallel_results_keep_request_order(self):
+        barrier = threading.Barrier(3, timeout=5)
+        run_one = self.fake_run_one({'a': 0.05, 'b': 0.02}, {'a': barrier, 'b': barrier, 'c': barrier})
+
+        with mock.patch('split.batch.run_one', side_effect=run_one):
+            result = self.batch([{'id': name, 'path': self.path} for name in "abc"], parallel=True)
+
+        self.assertEqual([r['id'] for r in result.data['data']['responses']], ['a', 'b', 'c'])
+        # Finished in the opposite order they were sent
+        self.assertEqual([name for event, name in self.events if event == 'end'], ['c', 'b', 'a'])
+
+    def test_write_is_a_barrier_between_parallel_reads(self):
+        before = threading.Barrier(2, timeout=5)
+        after = threading.Barrier(2, timeout=5)
+        run_one = self.fake_run_one({}, {'a': before, 'b': before, 'c': after, 'd': after})
+
+        with mock.patch('split.batch.run_one', side_effect=run_one):
+            result = self.batch([
+                {'id': 'a', 'path': self.path},
+                {'id': 'b', 'path': self.path},
+                {'id': 'w', 'method': 'POST', 'path': f"{self.path}remind/", 'body': {}},
+                {'id': 'c', 'path': self.path},
+                {'id': 'd', 'path': self.path},
+            ], parallel=True)
+
+        self.assertEqual([r['id'] for r in result.data['data']['responses']], ['a', 'b', 'w', 'c', 'd'])
+        start, end = self.events.index(('start', 'w')), self.events.index(('end', 'w'))
+        self.assertEqual(end, start + 1)
+        self.assertEqual({name for _, name in self.events[:start]}, {'a', 'b'})
+        self.assertEqual({name for _, name in self.events[end + 1:]}, {'c', 'd'})
+
+    def test_unknown_path_is_a_404_entry(self):
+        result = self.batch([
+            {'id': 'missing', 'path': "/api/nothing-here/"},
+            {'id': 'collection', 'path': self.path},
+        ])
+
+        self.assertEqual(result.status_code, 200)
+        missing, found = result.data['data']['responses']
+        self.assertEqual(missing['status'], 404)
+        self.assertEqual(found['status'], 200)
+        self.assertEqual(found['body']['data']['slug'], self.collection.slug)
+
+    def test_nested_batches_are_rejected(self):
+        result = self.batch([
+            {'path': self.path},
+            {'method': 'POST', 'path': "/api/batch/", 'body': {'requests': [{'path': self.path}]}},
+        ])
+
+        self.assertEqual(result.status_code, 400)
+        self.assertIn("cannot be nested", result.data['errors'])
+
+    @override_settings(SHARD_DATABASES=['default', 'shard2'])
+    def test_shard_is_picked_from_each_sub_request(self):
+        # One slug per shard
+        slugs = {}
+        for n in range(100):
+            slugs.setdefault(shard_for_slug(f"dues-{n:07d}"), f"dues-{n:07d}")
+        self.assertEqual(set(slugs), {'default', 'shard2'})
+
+        # Found on the test database, but its id routes it to shard2
+        contributor = Contributor.objects.create(
+            id=uuid_for_slug(slugs['shard2']),
+            collection=self.collection,
+            name="Ade",
+            phone="08030000001",
+            amount_owed=1000
+        )
+        used = []
+
+        def use_shard(alias):
+            used.append(alias)
+            # shard2 is not a real database here, so stay on the test database
+            return contextlib.nullcontext(alias)
+
+        with mock.patch('split.batch.use_shard', side_effect=use_shard):
+            self.batch([
+                {'path': f"/api/collections/{slugs['shard2']}/"},
+                {'path': f"/api/collections/{slugs['default']}/"},
+                {'path': f"/api/receipts/{contributor.id}/"},
+            ])
+
+        self.assertEqual(used, ['shard2', 'default', 'shard2'])
+
+
+class ConfirmPaymentTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.collection = make_collection(amount_per_person=1000)
+        self.url = f"/api/collections/{self.collection.slug}/confirm-payment/"
+
+    def contributor(self, status):
+        return Contributor.objects.create(
+            collection=self.collection,
+            name=status,
+            phone="08030000001",
+            amount_owed=1000,
+            payment_status=status
+        )
+
+    def confirm(self, contributor):
+        return self.client.post(self.url, {'contributor_id': str(contributor.id)}, format='json')
+
+    def test_expired_contribution_can_be_confirmed(self):
+        contributor = self.contributor('expired')
+
+        self.assertEqual(self.confirm(contributor).status_code, 200)
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'paid')
+
+    def test_refunded_contribution_is_not_reopened(self):
+        contributor = self.contributor('refunded')
+
+        self.assertEqual(self.confirm(contributor).status_code, 400)
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'refunded')
+        self.assertFalse(OutboxEvent.objects.filter(event_type=outbox.PAYMENT_CONFIRMED).exists())
+
+    def test_cancelled_collection_rejects_confirmations(self):
+        contributor = self.contributor('pending')
+        Collection.objects.filter(pk=self.collection.pk).update(status='cancelled')
+
+        self.assertEqual(self.confirm(contributor).status_code, 400)
+        contributor.refresh_from_db()
+        self.assertEqual(contributor.payment_status, 'pending')
+
+    def test_cancellation_after_the_checks_still_blocks_the_swap(self):
+        contributor = self.contributor('pending')
+        # cancel_collection does not touch contributor versions
+        cancel_collection(self.collection)
+
+        self.assertFalse(contributor.compare_and_swap(
+            payment_status='paid',
+            where={'collection__status__in': CONFIRMABLE_COLLECTION_STATUSES}
+        ))
+        contributor.refresh_from_db()
+        self.assertEqual((contributor.payment_status, contributor.version), ('pending', 1))
+
+
+class VersionConflictTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.collection = make_collection(amount_per_person=1000)
+        self.contributor = Contributor.objects.create(
+            collection=self.collection, name="Bola", phone="08030000001", amount_owed=1000
+        )
+        Contributor.objects.get(pk=self.contributor.pk).compare_and_swap(email="bola@example.com")
+
+    def test_stale_contribution_version_is_rejected(self):
+        result = self.client.post(
+            f"/api/collections/{self.collection.slug}/confirm-payment/",
+            {'contributor_id': str(self.contributor.id), 'version': 1},
+            format='json'
+        )
+
+        self.assertEqual(result.status_code, 409)
+        self.contributor.refresh_from_db()
+        # The other write is kept and the confirmation did not happen
+        self.assertEqual(
+            (self.contributor.payment_status, self.contributor.email, self.contributor.version),
+            ('pending', "bola@example.com", 2)
+        )
+        self.assertFalse(OutboxEvent.objects.filter(event_type=outbox.PAYMENT_CONFIRMED).exists())
+
+    def test_collection_changed_after_it_was_read_is_not_overwritten(self):
+        Contributor.objects.filter(pk=self.contributor.pk).update(payment_status='paid', amount_paid=1000)
+
+        def load_then_cancel(*args, **kwargs):
+            collection = get_object_or_404(*args, **kwargs)
+            # Another request changes the row after this one has read it
+            Collection.objects.get(pk=collection.pk).compare_and_swap(status='cancelled')
+            return collection
+
+        with mock.patch('split.views.get_object_or_404', side_effect=load_then_cancel):
+            result = self.client.post(f"/api/collections/{self.collection.slug}/withdraw/", {}, format='json')
+
+        self.assertEqual(result.status_code, 409)
+        self.collection.refresh_from_db()
+        self.assertEqual((self.collection.status, self.collection.version), ('cancelled', 2))
+        self.assertFalse(OutboxEvent.objects.filter(event_type=outbox.WITHDRAWAL_REQUESTED).exists())
+
+class ExpiryTests(TestCase):
+    def setUp(self):
+        self.collections = [make_collection(), make_collection(slug="weekly-dues-0000002")]
+
+    def contributor(self, collection, name, age_hours):
+        contributor = Contributor.objects.create(
+            collection=collection, name=name, phone="08030000001", amount_owed=1000
+        )
+        Contributor.objects.filter(pk=contributor.pk).update(
+            created_at=timezone.now() - timedelta(hours=age_hours)
+        )
+        for transaction_type in ['payment', 'refund']:
+            Transaction.objects.create(
+                collection=collection,
+                contributor=contributor,
+                transaction_type=transaction_type,
+                amount=1000,
+                status='pending',
+                reference=f"{transaction_type}-{name}"
+            )
+        return contributor
+
+    def test_stale_contributions_expire_with_their_collection_events(self):
+        stale = [self.contributor(collection, f"stale-{n}", 100) for n, collection in enumerate(self.collections)]
+        fresh = self.contributor(self.collections[0], "fresh", 1)
+
+        self.assertEqual(expire_stale_contributions(ttl=timedelta(hours=72), batch_size=1), 2)
+
+        self.assertEqual(
+            dict(Contributor.objects.values_list('name', 'payment_status')),
+            {'stale-0': 'expired', 'stale-1': 'expired', 'fresh': 'pending'}
+        )
+        # Only the payment transactions fail; refunds and the fresh payment stay pending
+        self.assertEqual(
+            sorted(Transaction.objects.filter(status='failed').values_list('reference', flat=True)),
+            ["payment-stale-0", "payment-stale-1"]
+        )
+        events = OutboxEvent.objects.filter(event_type=outbox.CONTRIBUTION_EXPIRED)
+        self.assertEqual(
+            sorted((e.payload['contributor_id'], e.collection_id) for e in events),
+            sorted((str(c.id), c.collection_id) for c in stale)
+        )
+        self.assertNotIn(str(fresh.id), [e.payload['contributor_id'] for e in events])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.collection = make_collection()
+
+    def payment(self, reference):
+        return Transaction.objects.create(
+            collection=self.collection,
+            transaction_type='payment',
+            amount=1000,
+            status='success',
+            reference=reference
+        )
+
+    def rolled_up(self):
+        return CollectionDailyRollup.objects.filter(collection=self.collection).aggregate(
+            count=Sum('count')
+        )['count']
+
+    def test_late_commit_behind_the_watermark_is_counted(self):
+        self.payment("KTR-FIRST")
+        first = refresh_daily_rollups()
+        self.assertEqual(self.rolled_up(), 1)
+
+        # Written before the last run read, but committed after it
+        late = self.payment("KTR-LATE")
+        Transaction.objects.filter(pk=late.pk).update(updated_at=first['watermark'] - ROLLUP_LAG / 2)
+
+        second = refresh_daily_rollups()
+        self.assertEqual(self.rolled_up(), 2)
+        self.assertEqual(second['watermark'], first['watermark'])
+
+    def test_rerunning_does_not_double_count(self):
+        self.payment("KTR-ONE")
+        self.payment("KTR-TWO")
+
+        refresh_daily_rollups()
+        refresh_daily_rollups()
+        self.assertEqual(self.rolled_up(), 2)
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        self.collection = make_collection()
+        for n, (status, _) in enumerate(Contributor.STATUS_CHOICES):
+            Contributor.objects.create(
+                collection=self.collection,
+                name=status,
+                phone=f"0803000000{n}",
+                amount_owed=1000,
+                amount_paid=1000 if status == 'paid' else 0,
+                payment_status=status,
+                paid_at=timezone.now() if status == 'paid' else None
+            )
+
+    def test_conversion_counts_every_status(self):
+        conversion = build_report()['conversion']
+
+        self.assertEqual(conversion['total_contributors'], 5)
+        self.assertEqual(
+            {status: conversion[status] for status, _ in Contributor.STATUS_CHOICES},
+            {'pending': 1, 'paid': 1, 'failed': 1, 'expired': 1, 'refunded': 1}
+        )
+        self.assertEqual(conversion['conversion_rate'], 20.0)
+
+    def test_top_is_clamped(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username="staff", is_staff=True))
+
+        result = client.get("/api/reports/", {'top': -1})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(result.data['data']['top_organizers']), 1)
+        self.assertEqual(client.get("/api/reports/", {'days': -3}).status_code, 400)
+
+
+class ApiSettingsTests(SimpleTestCase):
+    def test_api_settings_boot(self):
+        # A fresh interpreter: INSTALLED_APPS can't change inside this one
+        script = (
+            "import django; django.setup()\n"
+            "from django.core.management import call_command\n"
+            "from django.urls import resolve\n"
+            "import split.tests\n"
+            "call_command('check')\n"
+            "print(resolve('/api/batch/').url_name)\n"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', script],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'kontribute.settings_api'},
+            capture_output=True,
+            text=True,
+            timeout=120
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn('batch', result.stdout)
+
+
+REPLICA = 'replica_test'
+
+# Registered at import so the test runner sets it up as a mirror of the test database
+connections.settings.setdefault(REPLICA, {**connections.settings['default'], 'TEST': {'MIRROR': 'default'}})
+
+
+@override_settings(REPLICA_DATABASES=[REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reads through a second connection to the test database, set up as a test mirror of it"""
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        cache.clear()
+        routers._down_until.clear()
+        self.collection = make_collection()
+        self.url = f"/api/collections/{self.collection.slug}/"
+
+    def get(self):
+        """GET the collection; returns (status, queries on the primary, queries on the replica)"""
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                result = self.client.get(self.url)
+        return result.status_code, len(primary), len(replica)
+
+    def test_reads_go_to_the_replica(self):
+        status_code, primary, replica = self.get()
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_client_reads_its_own_writes_from_the_primary(self):
+        result = self.client.post(f"{self.url}confirm-payment/", {}, content_type='application/json')
+        self.assertIn(routers.STICKY_COOKIE, result.cookies)
+
+        status_code, primary, replica = self.get()
+        self.assertEqual((status_code, replica), (200, 0))
+        self.assertGreater(primary, 0)
+
+        # Without the cookie the cache marker for the address still pins it
+        self.client.cookies.clear()
+        self.assertEqual(self.get()[2], 0)
+
+        cache.clear()
+        self.assertGreater(self.get()[2], 0)
+
+    def test_unavailable_replica_falls_back_to_the_primary(self):
+        connections[REPLICA].close()
+        with mock.patch.object(connections[REPLICA], 'ensure_connection', side_effect=OperationalError("down")):
+            with CaptureQueriesContext(connections['default']) as primary:
+                result = self.client.get(self.url)
+
+        self.assertEqual(result.status_code, 200)
+        self.assertGreater(len(primary), 0)
+        self.assertIn(REPLICA, routers._down_until)
+
+        # Not retried until REPLICA_RETRY_SECONDS have passed
+        self.assertEqual(self.get()[2], 0)
+        routers._down_until.clear()
+        self.assertGreater(self.get()[2], 0)
+
+
+SHARD = 'shard_test'
+
+# A second, separate test database to spread collections over
+connections.settings.setdefault(SHARD, {**connections.settings['default'], 'TEST': {**connections.settings['default']['TEST']}})
+
+
+def slug_on(alias, aliases):
+    """First generated slug that hashes to `alias` among `aliases`"""
+    return next(
+        slug for slug in (f"dues-{n:07d}" for n in range(1000))
+        if shard_for_slug(slug, aliases) == alias
+    )
+
+
+@override_settings(SHARD_DATABASES=['default', SHARD])
+class ShardTests(TransactionTestCase):
+    databases = {'default', SHARD}
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def make_on_shard(self, alias, **fields):
+        """A collection with one paid contributor, created on `alias`"""
+        slug = slug_on(alias, ['default', SHARD])
+        with use_shard(alias):
+            collection = make_collection(slug=slug, **fields)
+            contributor = Contributor.objects.create(
+                id=uuid_for_slug(slug),
+                collection=collection,
+                name="Bola",
+                phone="08030000001",
+                amount_owed=5000,
+                amount_paid=5000,
+                payment_status='paid',
+                paid_at=timezone.now()
+            )
+        return collection, contributor
+
+    def test_requests_are_routed_by_slug_and_contributor_id(self):
+        for alias in ['default', SHARD]:
+            collection, contributor = self.make_on_shard(alias)
+            self.assertTrue(Collection.objects.using(alias).filter(id=collection.id).exists())
+
+            result = self.client.get(f"/api/collections/{collection.slug}/")
+            self.assertEqual(result.status_code, 200)
+
+            result = self.client.get(f"/api/receipts/{contributor.id}/")
+            self.assertEqual(result.status_code, 200)
+
+        self.assertEqual(Collection.objects.using('default').count(), 1)
+        self.assertEqual(Collection.objects.using(SHARD).count(), 1)
+
+    def test_each_shard_visits_every_shard(self):
+        for alias in ['default', SHARD]:
+            self.make_on_shard(alias)
+
+        seen = {alias: (current_db(), Collection.objects.count()) for alias in each_shard()}
+        self.assertEqual(seen, {'default': ('default', 1), SHARD: (SHARD, 1)})
+        self.assertEqual(current_db(), 'default')
+
+        result = self.client.get("/api/organizers/collections/", {'phone': "08012345678"})
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(len(result.data['data']['collections']), 2)
+
+
+class RebalanceShardsTests(TransactionTestCase):
+    databases = {'default', SHARD}
+
+    def setUp(self):
+        # Created while "default" was the only shard
+        slug = slug_on(SHARD, ['default', SHARD])
+        self.collection = make_collection(slug=slug)
+        self.stays = make_collection(slug=slug_on('default', ['default', SHARD]))
+        self.contributor = Contributor.objects.create(
+            collection=self.collection, name="Bola", phone="08030000001", amount_owed=5000
+        )
+        subscription = WebhookSubscription.objects.create(
+            collection=self.collection, url="https://hooks.example.com/", secret=new_secret()
+        )
+        self.delivered = outbox.publish('payment.confirmed', {'n': 1}, collection=self.collection)
+        self.delivered.processed_at = timezone.now()
+        self.delivered.save()
+        self.pending = outbox.publish('contribution.created', {'n': 2}, collection=self.collection)
+        WebhookEvent.objects.create(
+            subscription=subscription,
+            outbox_event_id=self.pending.pk,
+            event_type=self.pending.event_type
+        )
+
+    def rebalance(self):
+        with override_settings(SHARD_DATABASES=['default', SHARD]):
+            call_command('rebalance_shards', stdout=open(os.devnull, 'w'))
+
+    def test_rows_move_with_their_primary_keys(self):
+        self.rebalance()
+
+        self.assertFalse(Collection.objects.using('default').filter(id=self.collection.id).exists())
+        self.assertTrue(Collection.objects.using('default').filter(id=self.stays.id).exists())
+        self.assertTrue(Contributor.objects.using(SHARD).filter(id=self.contributor.id).exists())
+
+        # The pending event keeps its id, so fan-out on the new shard is still deduplicated
+        moved = OutboxEvent.objects.using(SHARD).get()
+        self.assertEqual(moved.pk, self.pending.pk)
+        self.assertEqual(
+            list(WebhookEvent.objects.using(SHARD).values_list('outbox_event_id', flat=True)),
+            [self.pending.pk]
+        )
+        with override_settings(SHARD_DATABASES=['default', SHARD]), use_shard(SHARD):
+            webhooks.queue_webhook_events(moved)
+            self.assertEqual(WebhookEvent.objects.count(), 1)
+
+            # New rows on the second shard get ids from its own block
+            self.assertGreater(outbox.publish('payment.confirmed', {}, collection=moved.collection).pk, ID_BLOCK)
+
+        # Delivered events stay behind
+        self.assertEqual(list(OutboxEvent.objects.using('default').values_list('pk', flat=True)), [self.delivered.pk])
+
+    def test_move_replaces_a_copy_left_by_a_failed_run(self):
+        # What a run that died between committing the copy and deleting the source leaves
+        for model, rows in [
+            (Collection, [self.collection]),
+            (Contributor, [self.contributor]),
+            (OutboxEvent, [self.pending]),
+        ]:
+            model.objects.using(SHARD).bulk_create(rows)
+
+        self.rebalance()
+        self.rebalance()
+
+        self.assertEqual(Collection.objects.using(SHARD).count(), 1)
+        self.assertEqual(Contributor.objects.using(SHARD).count(), 1)
+        self.assertEqual(list(OutboxEvent.objects.using(SHARD).values_list('pk', 'collection_id')), [
+            (self.pending.pk, self.collection.id)
+        ])
+        self.assertEqual(Collection.objects.using('default').get().id, self.stays.id)
@@ -0,0 +1,7 @@
+from rest_framework.throttling import AnonRateThrottle
+
+
+class PhoneLookupThrottle(AnonRateThrottle):
+    """Per-client limit on phone lookups, which reveal who contributed where"""
+    scope = 'phone_lookup'
+    rate = '10/minute'
@@ -1,4 +1,3 @@
-from django.contrib import admin
 from django.urls import path
 from . import views
 app_name = 'kontribute'
@@ -8,18 +7,37 @@ urlpatterns = [
     path('collections/', views.create_collections, name='create-collection'),
     path('collections/<slug:slug>/', views.get_collection, name='get-collection'),
     path('collections/<slug:slug>/dashboard/', views.get_dashboard, name='dashboard'),
+    path('collections/<slug:slug>/daily/', views.get_daily_stats, name='daily-stats'),
     
     # Contribution endpoints
     path('collections/<slug:slug>/contribute/', views.make_contribution, name='contribute'),
     path('collections/<slug:slug>/confirm-payment/', views.confirm_payment, name='confirm-payment'),
+    path('collections/<slug:slug>/contributors/bulk/', views.bulk_add_contributors, name='bulk-add-contributors'),
     
     # Action endpoints
     path('collections/<slug:slug>/remind/', views.send_reminders, name='send-reminders'),
     path('collections/<slug:slug>/withdraw/', views.request_withdrawal, name='withdraw'),
+    path('collections/<slug:slug>/webhooks/', views.collection_webhooks, name='collection-webhooks'),
+    path('collections/<slug:slug>/webhooks/<uuid:webhook_id>/', views.delete_webhook, name='delete-webhook'),
+    path('collections/<slug:slug>/recurring/', views.collection_recurring, name='collection-recurring'),
     
+    # Organizer endpoints
+    path('organizers/collections/', views.get_organizer_overview, name='organizer-overview'),
+
+    # Reports and profiles (staff only)
+    path('reports/', views.get_reports, name='reports'),
+    path('profiles/', views.list_profiles, name='list-profiles'),
+    path('profiles/<int:profile_id>/', views.get_profile, name='get-profile'),
+
     # Webhook
     path('webhooks/paystack/', views.paystack_webhook, name='paystack-webhook'),
     
+    # Contributor self-service
+    path('contributions/lookup/', views.lookup_contributions, name='lookup-contributions'),
+    
     # Receipt
     path('receipts/<uuid:contributor_id>/', views.get_receipt, name='get-receipt'),
+
+    # Several calls in one round trip
+    path('batch/', views.batch_requests, name='batch'),
 ]
@@ -1,29 +1,72 @@
 from django.shortcuts import render, get_object_or_404
+from django.http import Http404, HttpResponse
 from django.utils import timezone
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes, throttle_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Sum, Q
+from django.views.decorators.http import require_safe
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.db import transaction as db_transaction
+from django.db.models import Sum, Q, Count
+from django.core.cache import cache
+from django.core.paginator import Paginator
 from .serializers import (
     CollectionSerializers, 
     ContributorSerializer,
-    TransactionSeriliazer
+    RecurringScheduleSerializer,
+    TransactionSeriliazer,
+    WebhookSubscriptionSerializer,
+    canonical_phone,
+    clean_phone,
+    only_fields,
+    sparse_fields,
+    sparse_keys
+)
+from rest_framework.serializers import ValidationError
+from decimal import Decimal, InvalidOperation
+import csv
+import io
+import logging
+import sys
+from kontribute.sharding import (
+    current_db,
+    each_shard,
+    is_sharded,
+    shard_aliases,
+    shard_for_slug,
+    use_shard,
+    uuid_for_slug
+)
+from .models import Collection, Contributor, RequestProfile, Transaction, WebhookSubscription
+from .rollups import collection_daily_series
+from . import anomalies, batch, outbox, recurring
+from .sharing import SHARE_PAGE_MAX_AGE, share_page
+from .webhooks import new_secret
+from .throttles import PhoneLookupThrottle
+from .references import (
+    new_collection_slug,
+    new_payment_reference,
+    new_payment_references
 )
-from django.utils.text import slugify
-import uuid
-from .models import Collection, Contributor, Transaction
+
+logger = logging.getLogger(__name__)
 
 website_url = "http://127.0.0.1:8000"
 website_url = "http://10.42.134.92:8000"
 
 def response(status_bool, message, data=None, code=None, errors=None, **others):
-    """Helper function for consistent API responses"""
+    """Helper function for consistent API responses (server errors are logged with their traceback)"""
     if code == None:
         status_code = status.HTTP_200_OK if status_bool == True else status.HTTP_400_BAD_REQUEST
     else:
         status_code = code
     
+    if status_code >= 500:
+        # Views call this from their except blocks, so the exception is still active
+        logger.error(message, exc_info=sys.exc_info()[0] is not None, extra={'status_code': status_code})
+    
     return Response({
         'status': "success" if status_bool == True else "failed",
         'message': message,
@@ -45,8 +88,7 @@ def create_collections(request):
             return response(False, "The data are not valid", errors=serializers.errors)
         
         validated_data = serializers.validated_data
-        base_slug = slugify(validated_data['title'])
-        unique_slug = f"{base_slug}-{uuid.uuid4().hex[:6]}"
+        unique_slug = new_collection_slug(validated_data['title'])
         
         # Calculate total amount
         total_amount_conditions = [
@@ -59,11 +101,12 @@ def create_collections(request):
                 validated_data['number_of_people']
             )
         
-        collection = Collection.objects.create(
-            **validated_data,
-            slug=unique_slug,
-            status='active'
-        )
+        with use_shard(shard_for_slug(unique_slug)):
+            collection = Collection.objects.create(
+                **validated_data,
+                slug=unique_slug,
+                status='active'
+            )
         
         response_serializer = CollectionSerializers(collection)
         
@@ -72,7 +115,7 @@ def create_collections(request):
             "Collection Created Successfully",
             data=response_serializer.data,
             code=status.HTTP_201_CREATED,
-            collection_url=f"{website_url}/collections/{collection.slug}"
+            collection_url=f"{website_url}/collections/{collection.slug}/"
         )
         
     except Exception as e:
@@ -86,10 +129,24 @@ def create_collections(request):
 
 @api_view(['GET'])   
 def get_collection(request, slug):
-    """Get collection details by slug"""
+    """
+    Get collection details by slug
+
+    Query params:
+        fields - optional comma-separated collection fields to return (e.g. title,status)
+    """
     try:
-        collection = get_object_or_404(Collection, slug=slug)
-        serializers = CollectionSerializers(collection)
+        try:
+            fields = sparse_fields(request, CollectionSerializers)
+        except ValidationError as e:
+            return response(False, "Invalid fields", errors=e.detail, code=status.HTTP_400_BAD_REQUEST)
+        
+        collections = Collection.objects.all()
+        if fields:
+            # total_amount is needed for the completion percentage
+            collections = collections.only(*only_fields(CollectionSerializers, fields, 'total_amount'))
+        collection = get_object_or_404(collections, slug=slug)
+        serializers = CollectionSerializers(collection, fields=fields)
         
         # Get contribution stats
         total_collected = collection.contributors.filter(
@@ -125,6 +182,26 @@ def get_collection(request, slug):
         )
 
 
+@require_safe
+def share_collection(request, slug):
+    """
+    HTML share page with Open Graph tags for link previews (served at the collection_url)
+
+    Rendered from cached stats; a matching If-None-Match gets a 304. The
+    comparison is weak, since compression turns the ETag into W/"...".
+    """
+    page = share_page(slug, f"{website_url}/collections/{slug}/")
+    if page is None:
+        raise Http404("No Collection matches the given query.")
+
+    result = get_conditional_response(request, etag=page['etag'])
+    if result is None:
+        result = HttpResponse(page['html'], content_type='text/html; charset=utf-8')
+    result['ETag'] = page['etag']
+    patch_cache_control(result, public=True, max_age=SHARE_PAGE_MAX_AGE)
+    return result
+
+
 # ==================== CONTRIBUTION ENDPOINTS ====================
 
 @api_view(["POST"])
@@ -172,11 +249,23 @@ def make_contribution(request, slug):
                     code=status.HTTP_400_BAD_REQUEST
                 )
         
+        try:
+            phone = clean_phone(str(request.data['phone']))
+            phone_e164 = canonical_phone(phone)
+        except ValidationError as e:
+            return response(
+                False,
+                "Invalid phone number",
+                errors=e.detail,
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        
         amount_to_be_paid = collection.amount_per_person if collection.amount_per_person else request.data["amount"]
-        # Check for duplicate contribution (same phone number)
+        # Check for duplicate contribution (same phone number in any format)
         existing_contributor = Contributor.objects.filter(
             collection=collection,
-            phone=request.data['phone']
+            phone_e164=phone_e164,
+            payment_status__in=['pending', 'paid']
         ).first()
         
         if existing_contributor:
@@ -205,31 +294,43 @@ def make_contribution(request, slug):
                 )
         
         # Create contributor record
-        payment_reference = f"KTR-{uuid.uuid4().hex[:8].upper()}"
+        payment_reference = new_payment_reference()
         
-        print(amount_to_be_paid)
-        contributor = Contributor.objects.create(
-            collection=collection,
-            name=request.data['name'],
-            phone=request.data['phone'],
-            email=request.data.get('email', ''),
-            amount_owed=amount_to_be_paid,
-            amount_paid=0,
-            payment_status='pending',
-            payment_method='bank_transfer',
-            payment_reference=payment_reference
-        )
-        
-        # Create transaction record
-        transaction = Transaction.objects.create(
-            collection=collection,
-            contributor=contributor,
-            transaction_type='payment',
-            amount=amount_to_be_paid,
-            status='pending',
-            reference=payment_reference
+        with db_transaction.atomic(using=current_db()):
+            contributor = Contributor.objects.create(
+                id=uuid_for_slug(collection.slug),
+                collection=collection,
+                name=request.data['name'],
+                phone=phone,
+                phone_e164=phone_e164,
+                email=request.data.get('email', ''),
+                amount_owed=amount_to_be_paid,
+                amount_paid=0,
+                payment_status='pending',
+                payment_method='bank_transfer',
+                payment_reference=payment_reference
+            )
+            
+            # Create transaction record
+            transaction = Transaction.objects.create(
+                collection=collection,
+                contributor=contributor,
+                transaction_type='payment',
+                amount=amount_to_be_paid,
+                status='pending',
+                reference=payment_reference
+            )
+            
+            outbox.publish(
+                outbox.CONTRIBUTION_CREATED,
+                outbox.contribution_payload(contributor, collection),
+                collection=collection
+            )
+        logger.info(
+            "Contribution created",
+            extra={'slug': collection.slug, 'contributor_id': str(contributor.id), 'amount': str(amount_to_be_paid)}
         )
-        print("about to take off")
+        anomalies.score_contribution(contributor, collection)
         
         # Return payment instructions
         return response(
@@ -270,6 +371,11 @@ def make_contribution(request, slug):
         )
 
 
+# Refunded contributions and cancelled collections are settled for good
+CONFIRMABLE_STATUSES = ('pending', 'failed', 'expired')
+CONFIRMABLE_COLLECTION_STATUSES = ('active', 'closed', 'withdrawn')
+
+
 @api_view(['POST'])
 def confirm_payment(request, slug):
     """
@@ -278,7 +384,8 @@ def confirm_payment(request, slug):
     Expected payload:
     {
         "contributor_id": "uuid-here",
-        "payment_proof": "Bank reference or note"
+        "payment_proof": "Bank reference or note",
+        "version": 3 (optional, the version the organizer last saw)
     }
     """
     try:
@@ -306,25 +413,66 @@ def confirm_payment(request, slug):
                 "This contribution has already been confirmed",
                 code=status.HTTP_400_BAD_REQUEST
             )
+        if contributor.payment_status not in CONFIRMABLE_STATUSES:
+            return response(
+                False,
+                f"A {contributor.payment_status} contribution cannot be confirmed",
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        if collection.status == 'cancelled':
+            return response(
+                False,
+                "This collection has been cancelled",
+                code=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Update contributor
-        contributor.payment_status = 'paid'
-        contributor.amount_paid = contributor.amount_owed
-        contributor.paid_at = timezone.now()
-        contributor.payment_proof = request.data.get('payment_proof', '')
-        contributor.verified_by = request.data.get('verified_by', 'organizer')
-        contributor.verified_at = timezone.now()
-        contributor.save()
-        
-        # Update transaction
-        transaction = Transaction.objects.filter(
-            contributor=contributor,
-            status='pending'
-        ).first()
+        expected_version = request.data.get('version')
+        if expected_version is not None and not str(expected_version).isdigit():
+            return response(
+                False,
+                "Version must be a whole number",
+                code=status.HTTP_400_BAD_REQUEST
+            )
         
-        if transaction:
-            transaction.status = 'success'
-            transaction.save()
+        now = timezone.now()
+        with db_transaction.atomic(using=current_db()):
+            # One conditional UPDATE: a concurrent confirmation or refund
+            # bumps the version first, a cancellation changes the collection,
+            # and either way this one matches no row
+            confirmed = contributor.compare_and_swap(
+                expected_version=expected_version,
+                where={
+                    'payment_status__in': CONFIRMABLE_STATUSES,
+                    'collection__status__in': CONFIRMABLE_COLLECTION_STATUSES
+                },
+                payment_status='paid',
+                amount_paid=contributor.amount_owed,
+                paid_at=now,
+                payment_proof=request.data.get('payment_proof', ''),
+                verified_by=request.data.get('verified_by', 'organizer'),
+                verified_at=now
+            )
+            if not confirmed:
+                return response(
+                    False,
+                    "This contribution was changed by another request. Reload it and try again.",
+                    code=status.HTTP_409_CONFLICT
+                )
+            
+            # Update transaction
+            # An expired contribution's transaction was marked failed
+            Transaction.objects.filter(
+                contributor=contributor,
+                transaction_type='payment',
+                status__in=['pending', 'failed']
+            ).update(status='success', updated_at=now)
+            
+            outbox.publish(
+                outbox.PAYMENT_CONFIRMED,
+                outbox.contribution_payload(contributor, collection),
+                collection=collection
+            )
+        anomalies.score_confirmation(contributor, collection)
         
         return response(
             True,
@@ -333,7 +481,8 @@ def confirm_payment(request, slug):
                 'contributor_id': str(contributor.id),
                 'name': contributor.name,
                 'amount_paid': float(contributor.amount_paid),
-                'paid_at': contributor.paid_at.isoformat()
+                'paid_at': contributor.paid_at.isoformat(),
+                'version': contributor.version
             }
         )
         
@@ -346,18 +495,217 @@ def confirm_payment(request, slug):
         )
 
 
+BULK_IMPORT_MAX_ROWS = 1000
+BULK_IMPORT_MAX_AMOUNT = Decimal('10000000000')
+KOBO = Decimal('0.01')
+
+
+def _read_bulk_rows(request):
+    """Read contributor rows from a CSV upload, a raw CSV body or JSON"""
+    if request.content_type.startswith('text/csv'):
+        return list(csv.DictReader(io.StringIO(request.body.decode('utf-8-sig'))))
+
+    if 'file' in request.FILES:
+        upload = io.TextIOWrapper(request.FILES['file'].file, encoding='utf-8-sig')
+        return list(csv.DictReader(upload))
+
+    rows = request.data.get('contributors', [])
+    if not isinstance(rows, list):
+        raise ValueError("contributors must be a list")
+    return rows
+
+
+@api_view(['POST'])
+def bulk_add_contributors(request, slug):
+    """
+    Add many pre-registered contributors to a collection at once
+
+    Expected payload (JSON):
+    {
+        "contributors": [
+            {"name": "John Doe", "phone": "08012345678", "email": "", "amount": 5000},
+            ...
+        ]
+    }
+    or a CSV (uploaded as "file" or sent as text/csv) with the header
+    name,phone,email,amount. "amount" is only needed for flexible collections.
+    """
+    try:
+        collection = get_object_or_404(Collection, slug=slug)
+
+        if collection.status != 'active':
+            return response(
+                False,
+                "This collection is no longer accepting contributions",
+                code=status.HTTP_400_BAD_REQUEST
+            )
+
+        if collection.deadline and collection.deadline < timezone.now():
+            return response(
+                False,
+                "This collection deadline has passed",
+                code=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            rows = _read_bulk_rows(request)
+        except (ValueError, csv.Error) as e:
+            return response(False, "Could not read contributors", errors=str(e))
+
+        if not rows:
+            return response(False, "No contributors provided")
+
+        if len(rows) > BULK_IMPORT_MAX_ROWS:
+            return response(
+                False,
+                f"A maximum of {BULK_IMPORT_MAX_ROWS} contributors can be added at once"
+            )
+
+        # Validate every row before touching the database
+        valid_rows = []
+        skipped = []
+        for line, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                skipped.append({'row': line, 'reason': "Each contributor must be an object"})
+                continue
+
+            name = str(row.get('name') or '').strip()
+            if not name:
+                skipped.append({'row': line, 'reason': "Missing required field: name"})
+                continue
+
+            try:
+                phone = clean_phone(str(row.get('phone') or ''))
+            except ValidationError as e:
+                skipped.append({'row': line, 'reason': e.detail[0]})
+                continue
+
+            if collection.amount_per_person:
+                amount = collection.amount_per_person
+            else:
+                try:
+                    amount = Decimal(str(row.get('amount') or ''))
+                except InvalidOperation:
+                    amount = None
+                # Amounts are stored as DecimalField(max_digits=12, decimal_places=2)
+                if amount is None or not amount.is_finite() or amount <= 0 or amount >= BULK_IMPORT_MAX_AMOUNT:
+                    skipped.append({'row': line, 'reason': "Missing or invalid field: amount"})
+                    continue
+                # Rounding would silently change what the organizer typed
+                if amount != amount.quantize(KOBO):
+                    skipped.append({'row': line, 'reason': "Amount can have at most 2 decimal places"})
+                    continue
+                amount = amount.quantize(KOBO)
+
+            valid_rows.append((line, name, phone, canonical_phone(phone), str(row.get('email') or '').strip(), amount))
+
+        # Dedupe against existing contributors with a single query
+        existing_phones = set(
+            Contributor.objects.filter(
+                collection=collection,
+                phone_e164__in=[phone_e164 for _, _, _, phone_e164, _, _ in valid_rows],
+                payment_status__in=['pending', 'paid']
+            ).values_list('phone_e164', flat=True)
+        )
+
+        new_rows = []
+        for line, name, phone, phone_e164, email, amount in valid_rows:
+            if phone_e164 in existing_phones:
+                skipped.append({'row': line, 'reason': "Duplicate phone number"})
+                continue
+            existing_phones.add(phone_e164)
+            new_rows.append((name, phone, phone_e164, email, amount))
+
+        contributors = []
+        transactions = []
+        payment_references = new_payment_references(len(new_rows))
+        for (name, phone, phone_e164, email, amount), payment_reference in zip(new_rows, payment_references):
+            contributor = Contributor(
+                id=uuid_for_slug(collection.slug),
+                collection=collection,
+                name=name,
+                phone=phone,
+                phone_e164=phone_e164,
+                email=email,
+                amount_owed=amount,
+                amount_paid=0,
+                payment_status='pending',
+                payment_method='bank_transfer',
+                payment_reference=payment_reference
+            )
+            contributors.append(contributor)
+            transactions.append(Transaction(
+                collection=collection,
+                contributor=contributor,
+                transaction_type='payment',
+                amount=amount,
+                status='pending',
+                reference=payment_reference
+            ))
+
+        with db_transaction.atomic(using=current_db()):
+            Contributor.objects.bulk_create(contributors)
+            Transaction.objects.bulk_create(transactions)
+            outbox.publish_many(
+                outbox.CONTRIBUTION_CREATED,
+                [outbox.contribution_payload(c, collection) for c in contributors],
+                collection=collection
+            )
+        anomalies.score_contributions(contributors, collection)
+
+        return response(
+            True,
+            f"{len(contributors)} contributor(s) added successfully",
+            data={
+                'created_count': len(contributors),
+                'skipped_count': len(skipped),
+                'contributors': [
+                    {
+                        'contributor_id': str(c.id),
+                        'name': c.name,
+                        'phone': c.phone,
+                        'payment_reference': c.payment_reference,
+                        'amount': float(c.amount_owed)
+                    }
+                    for c in contributors
+                ],
+                'skipped': sorted(skipped, key=lambda s: s['row'])
+            },
+            code=status.HTTP_201_CREATED
+        )
+
+    except Exception as e:
+        return response(
+            False,
+            "An error occurred while adding contributors",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 # ==================== DASHBOARD ENDPOINT ====================
 
 @api_view(['GET'])
 def get_dashboard(request, slug):
     """
     Get organizer dashboard with all contributors and stats
+
+    Query params:
+        fields - optional comma-separated contributor fields to return (e.g. name,payment_status)
     """
     try:
+        try:
+            fields = sparse_fields(request, ContributorSerializer)
+        except ValidationError as e:
+            return response(False, "Invalid fields", errors=e.detail, code=status.HTTP_400_BAD_REQUEST)
+        
         collection = get_object_or_404(Collection, slug=slug)
         
         # Get all contributors
         contributors = collection.contributors.all().order_by('-created_at')
+        if fields:
+            # collection_id must stay loaded: the related manager sets .collection on every row
+            contributors = contributors.only(*only_fields(ContributorSerializer, fields, 'collection'))
         
         # Separate paid and pending
         paid_contributors = contributors.filter(payment_status='paid')
@@ -369,8 +717,8 @@ def get_dashboard(request, slug):
         )['total'] or 0
         
         # Serialize contributors
-        paid_data = ContributorSerializer(paid_contributors, many=True).data
-        pending_data = ContributorSerializer(pending_contributors, many=True).data
+        paid_data = ContributorSerializer(paid_contributors, many=True, fields=fields).data
+        pending_data = ContributorSerializer(pending_contributors, many=True, fields=fields).data
         
         return response(
             True,
@@ -380,7 +728,7 @@ def get_dashboard(request, slug):
                     'id': str(collection.id),
                     'title': collection.title,
                     'slug': collection.slug,
-                    'total_amount': float(collection.total_amount),
+                    'total_amount': float(collection.total_amount) if collection.total_amount else None,
                     'amount_per_person': float(collection.amount_per_person) if collection.amount_per_person else "Flexible amount",
                     'number_of_people': collection.number_of_people,
                     'status': collection.status,
@@ -389,13 +737,13 @@ def get_dashboard(request, slug):
                 },
                 'stats': {
                     'total_collected': float(total_collected),
-                    'total_target': float(collection.total_amount),
+                    'total_target': float(collection.total_amount) if collection.total_amount else None,
                     'paid_count': paid_contributors.count(),
                     'pending_count': pending_contributors.count(),
                     'total_contributors': contributors.count(),
                     'completion_percentage': round(
                         (total_collected / collection.total_amount * 100) 
-                        if collection.total_amount > 0 else 0, 
+                        if collection.total_amount else 0, 
                         2
                     )
                 },
@@ -415,6 +763,185 @@ def get_dashboard(request, slug):
         )
 
 
+@api_view(['GET'])
+def get_daily_stats(request, slug):
+    """
+    Daily payment totals for a collection, read from the rollup tables
+
+    Query params:
+        days - how many days back to include (default 30, max 366)
+    """
+    try:
+        collection = get_object_or_404(Collection, slug=slug)
+
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 366)
+        except ValueError:
+            return response(
+                False,
+                "days must be a number",
+                code=status.HTTP_400_BAD_REQUEST
+            )
+
+        return response(
+            True,
+            "Daily stats retrieved successfully",
+            data={
+                'slug': collection.slug,
+                'days': days,
+                'series': collection_daily_series(collection, days=days)
+            }
+        )
+
+    except Exception as e:
+        return response(
+            False,
+            "Error retrieving daily stats",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+# ==================== ORGANIZER ENDPOINT ====================
+
+ORGANIZER_OVERVIEW_CACHE_TIMEOUT = 60
+ORGANIZER_OVERVIEW_PAGE_SIZE = 20
+ORGANIZER_OVERVIEW_MAX_PAGE_SIZE = 100
+
+
+@api_view(['GET'])
+def get_organizer_overview(request):
+    """
+    Get all collections run by an organizer with their stats
+
+    Query params:
+        phone or email - organizer identifier (one is required)
+        page - page number (default 1)
+        page_size - collections per page (default 20, max 100)
+    """
+    try:
+        phone = request.query_params.get('phone', '').strip()
+        email = request.query_params.get('email', '').strip()
+
+        if not phone and not email:
+            return response(
+                False,
+                "Organizer phone or email is required",
+                code=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            page_number = max(int(request.query_params.get('page', 1)), 1)
+            page_size = int(request.query_params.get('page_size', ORGANIZER_OVERVIEW_PAGE_SIZE))
+        except ValueError:
+            return response(
+                False,
+                "page and page_size must be numbers",
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        page_size = min(max(page_size, 1), ORGANIZER_OVERVIEW_MAX_PAGE_SIZE)
+
+        cache_key = f"organizer-overview:{phone}:{email.lower()}:{page_number}:{page_size}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return response(True, "Organizer overview retrieved successfully", data=cached)
+
+        organizer_filter = Q(organizer_phone=phone) if phone else Q(organizer_email__iexact=email)
+
+        # Collections can sit on any shard: page over (created_at, id) keys
+        # from every shard, then load only the page's rows from their shards
+        keys = []
+        for alias in each_shard():
+            keys.extend(
+                (created_at, collection_id, alias)
+                for created_at, collection_id in Collection.objects.filter(
+                    organizer_filter
+                ).values_list('created_at', 'id')
+            )
+        keys.sort(reverse=True)
+
+        paginator = Paginator(keys, page_size)
+        page = paginator.get_page(page_number)
+
+        page_ids_by_shard = {}
+        for _, collection_id, alias in page.object_list:
+            page_ids_by_shard.setdefault(alias, []).append(collection_id)
+
+        collections_by_id = {}
+        stats_by_collection = {}
+        for alias, collection_ids in page_ids_by_shard.items():
+            with use_shard(alias):
+                collections_by_id.update(
+                    (c.id, c) for c in Collection.objects.filter(id__in=collection_ids).only(
+                        'id', 'title', 'slug', 'status', 'total_amount',
+                        'deadline', 'created_at'
+                    )
+                )
+
+                # One grouped aggregate for every collection on this page
+                stats_rows = Contributor.objects.filter(
+                    collection_id__in=collection_ids
+                ).values('collection_id').annotate(
+                    total_collected=Sum('amount_paid', filter=Q(payment_status='paid')),
+                    paid_count=Count('id', filter=Q(payment_status='paid')),
+                    pending_count=Count('id', filter=Q(payment_status='pending')),
+                ).order_by()
+                stats_by_collection.update((row['collection_id'], row) for row in stats_rows)
+
+        page_collections = [
+            collections_by_id[collection_id]
+            for _, collection_id, _ in page.object_list
+            if collection_id in collections_by_id
+        ]
+
+        results = []
+        for collection in page_collections:
+            row = stats_by_collection.get(collection.id, {})
+            total_collected = row.get('total_collected') or 0
+            paid_count = row.get('paid_count', 0)
+            pending_count = row.get('pending_count', 0)
+            if collection.total_amount:
+                completion_percentage = round(total_collected / collection.total_amount * 100, 2)
+            else:
+                completion_percentage = 100
+
+            results.append({
+                'id': str(collection.id),
+                'title': collection.title,
+                'slug': collection.slug,
+                'status': collection.status,
+                'total_amount': float(collection.total_amount) if collection.total_amount else None,
+                'deadline': collection.deadline.isoformat() if collection.deadline else None,
+                'created_at': collection.created_at.isoformat(),
+                'stats': {
+                    'total_collected': float(total_collected),
+                    'paid_count': paid_count,
+                    'pending_count': pending_count,
+                    'total_contributors': paid_count + pending_count,
+                    'completion_percentage': float(completion_percentage)
+                }
+            })
+
+        data = {
+            'count': paginator.count,
+            'page': page.number,
+            'num_pages': paginator.num_pages,
+            'page_size': page_size,
+            'collections': results
+        }
+        cache.set(cache_key, data, ORGANIZER_OVERVIEW_CACHE_TIMEOUT)
+
+        return response(True, "Organizer overview retrieved successfully", data=data)
+
+    except Exception as e:
+        return response(
+            False,
+            "Error retrieving organizer overview",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
 # ==================== REMINDER ENDPOINT ====================
 
 @api_view(['POST'])
@@ -518,8 +1045,24 @@ def request_withdrawal(request, slug):
         ).aggregate(total=Sum('amount_paid'))['total'] or 0
         
         # Update collection status
-        collection.status = 'closed'
-        collection.save()
+        with db_transaction.atomic(using=current_db()):
+            if not collection.compare_and_swap(status='closed'):
+                return response(
+                    False,
+                    "This collection was changed by another request. Please try again.",
+                    code=status.HTTP_409_CONFLICT
+                )
+            
+            outbox.publish(
+                outbox.WITHDRAWAL_REQUESTED,
+                {
+                    'collection_id': str(collection.id),
+                    'slug': collection.slug,
+                    'total_amount': total_collected,
+                    'paid_contributors': paid_count
+                },
+                collection=collection
+            )
         
         # For manual system, just return confirmation
         # In future with Paystack, you'd initiate actual transfer here
@@ -545,6 +1088,248 @@ def request_withdrawal(request, slug):
         )
 
 
+# ==================== ORGANIZER WEBHOOKS ====================
+
+@api_view(['GET', 'POST'])
+def collection_webhooks(request, slug):
+    """
+    List or create webhook subscriptions for a collection
+
+    Expected payload (POST):
+    {
+        "url": "https://example.com/hooks/kontribute",
+        "event_types": ["contribution.created", "payment.confirmed"]  // optional, empty = all
+    }
+    The signing secret is only returned once, when the subscription is created.
+    """
+    try:
+        collection = get_object_or_404(Collection, slug=slug)
+
+        if request.method == 'GET':
+            subscriptions = collection.webhooks.filter(is_active=True).order_by('-created_at')
+            return response(
+                True,
+                "Webhooks retrieved successfully",
+                data=WebhookSubscriptionSerializer(subscriptions, many=True).data
+            )
+
+        serializer = WebhookSubscriptionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return response(False, "The data are not valid", errors=serializer.errors)
+
+        subscription = serializer.save(collection=collection, secret=new_secret())
+
+        return response(
+            True,
+            "Webhook created successfully",
+            data={
+                **WebhookSubscriptionSerializer(subscription).data,
+                'secret': subscription.secret
+            },
+            code=status.HTTP_201_CREATED
+        )
+
+    except Exception as e:
+        return response(
+            False,
+            "Error managing webhooks",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['DELETE'])
+def delete_webhook(request, slug, webhook_id):
+    """Deactivate a webhook subscription"""
+    try:
+        subscription = get_object_or_404(
+            WebhookSubscription,
+            id=webhook_id,
+            collection__slug=slug,
+            is_active=True
+        )
+        subscription.is_active = False
+        subscription.save(update_fields=['is_active'])
+        subscription.pending_events.all().delete()
+
+        return response(True, "Webhook deleted successfully")
+
+    except Exception as e:
+        return response(
+            False,
+            "Error deleting webhook",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+
+@api_view(['GET', 'POST', 'DELETE'])
+def collection_recurring(request, slug):
+    """
+    Show, set or stop the recurring schedule of a collection
+
+    Expected payload (POST):
+    {
+        "interval": "monthly",                   // or "weekly"
+        "next_run_at": "2026-11-01T08:00:00Z"    // optional, default one interval after creation
+    }
+    Every run creates a new collection with this one's details and members
+    (see split/recurring.py). POSTing again updates the active schedule.
+    """
+    try:
+        collection = get_object_or_404(Collection, slug=slug)
+        schedule = collection.recurring_schedules.filter(is_active=True).first()
+
+        if request.method == 'GET':
+            return response(
+                True,
+                "Recurring schedule retrieved successfully",
+                data=RecurringScheduleSerializer(schedule).data if schedule else None
+            )
+
+        if request.method == 'DELETE':
+            if schedule is None:
+                return response(False, "This collection is not recurring", code=status.HTTP_404_NOT_FOUND)
+            schedule.is_active = False
+            schedule.save(update_fields=['is_active', 'updated_at'])
+            return response(True, "Recurring schedule stopped")
+
+        if collection.status == 'cancelled':
+            return response(False, "A cancelled collection cannot recur")
+
+        serializer = RecurringScheduleSerializer(schedule, data=request.data, partial=schedule is not None)
+        if not serializer.is_valid():
+            return response(False, "The data are not valid", errors=serializer.errors)
+
+        created = schedule is None
+        extra = {}
+        if created and 'next_run_at' not in serializer.validated_data:
+            interval = serializer.validated_data.get('interval', 'monthly')
+            extra['next_run_at'] = recurring.next_run(collection.created_at, interval, timezone.now())
+        schedule = serializer.save(collection=collection, **extra)
+
+        return response(
+            True,
+            "Recurring schedule saved successfully",
+            data=RecurringScheduleSerializer(schedule).data,
+            code=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+
+    except Exception as e:
+        return response(
+            False,
+            "Error managing recurring schedule",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+# ==================== REPORTS ENDPOINT ====================
+
+REPORT_CACHE_TIMEOUT = 60 * 15
+REPORT_MAX_TOP = 100
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_reports(request):
+    """
+    Collection analytics for staff (cached)
+
+    Query params:
+        days - only include contributors from the last N days (optional)
+        top - number of top organizers to list (default 10, at most REPORT_MAX_TOP)
+    """
+    try:
+        # numpy is only needed for reporting, keep it out of the request path
+        from .reports import build_report
+
+        try:
+            days = int(request.query_params['days']) if request.query_params.get('days') else None
+            top = int(request.query_params.get('top', 10))
+        except ValueError:
+            return response(
+                False,
+                "days and top must be numbers",
+                code=status.HTTP_400_BAD_REQUEST
+            )
+        if days is not None and days < 1:
+            return response(False, "days must be at least 1", code=status.HTTP_400_BAD_REQUEST)
+        top = min(max(top, 1), REPORT_MAX_TOP)
+
+        cache_key = f"collection-report:{days}:{top}"
+        report = cache.get(cache_key)
+        if report is None:
+            report = build_report(days=days, top=top)
+            cache.set(cache_key, report, REPORT_CACHE_TIMEOUT)
+
+        return response(True, "Report generated successfully", data=report)
+
+    except Exception as e:
+        return response(
+            False,
+            "Error generating report",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+# ==================== PROFILING ENDPOINTS (staff only) ====================
+
+PROFILE_INDEX_LIMIT = 50
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def list_profiles(request):
+    """
+    Recent request profiles, newest first
+
+    Query params:
+        slug - only profiles of requests for this collection (optional)
+        route - only profiles of this URL route (optional)
+    """
+    try:
+        profiles = RequestProfile.objects.order_by('-created_at')
+        if request.query_params.get('slug'):
+            profiles = profiles.filter(slug=request.query_params['slug'])
+        if request.query_params.get('route'):
+            profiles = profiles.filter(route=request.query_params['route'])
+
+        results = [
+            {
+                **profile,
+                'report_url': f"/api/profiles/{profile['id']}/"
+            }
+            for profile in profiles.values(
+                'id', 'method', 'path', 'route', 'slug', 'status_code',
+                'duration_ms', 'query_count', 'trigger', 'created_at'
+            )[:PROFILE_INDEX_LIMIT]
+        ]
+
+        return response(
+            True,
+            "Profiles retrieved successfully",
+            data={'count': len(results), 'profiles': results}
+        )
+
+    except Exception as e:
+        return response(
+            False,
+            "Error retrieving profiles",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_profile(request, profile_id):
+    """The pyinstrument HTML report of one profile"""
+    profile = get_object_or_404(RequestProfile.objects.only('html'), pk=profile_id)
+    return HttpResponse(profile.html, content_type='text/html; charset=utf-8')
+
+
 # ==================== WEBHOOK ENDPOINT (For Future Paystack Integration) ====================
 
 @csrf_exempt
@@ -560,16 +1345,134 @@ def paystack_webhook(request):
         code=status.HTTP_200_OK
     )
 
+# ==================== CONTRIBUTOR LOOKUP ENDPOINT ====================
+
+PHONE_LOOKUP_CACHE_TIMEOUT = 60
+PHONE_LOOKUP_LIMIT = 50
+PHONE_LOOKUP_FIELDS = (
+    'collection', 'amount_owed', 'amount_paid',
+    'payment_status', 'payment_reference', 'created_at', 'paid_at'
+)
+# Characters of a payment reference the lookup shows
+PHONE_LOOKUP_REFERENCE_VISIBLE = 4
+
+
+def mask_reference(reference):
+    """Hide all but the last few characters, enough to tell contributions apart"""
+    visible = reference[-PHONE_LOOKUP_REFERENCE_VISIBLE:]
+    return '*' * (len(reference) - len(visible)) + visible
+
+
+@api_view(['GET'])
+@throttle_classes([PhoneLookupThrottle])
+def lookup_contributions(request):
+    """
+    Find a contributor's contributions across collections by phone number
+
+    Anyone can look up any number, so rows carry no contributor id (it is
+    the key to the receipt, with the contributor's name, phone and email)
+    and payment references are masked.
+
+    Query params:
+        phone - any accepted format (08012345678, +2348012345678, 2348012345678)
+        fields - optional comma-separated fields to return per contribution (e.g. collection,payment_status)
+    """
+    try:
+        try:
+            fields = sparse_keys(request, PHONE_LOOKUP_FIELDS)
+        except ValidationError as e:
+            return response(False, "Invalid fields", errors=e.detail, code=status.HTTP_400_BAD_REQUEST)
+        try:
+            phone_e164 = canonical_phone(request.query_params.get('phone', ''))
+        except ValidationError as e:
+            return response(False, "Invalid phone number", errors=e.detail)
+
+        cache_key = f"phone-lookup:{phone_e164}"
+        results = cache.get(cache_key)
+        if results is None:
+            contributors = []
+            for alias in each_shard():
+                contributors.extend(
+                    Contributor.objects.filter(
+                        phone_e164=phone_e164
+                    ).select_related('collection').only(
+                        'amount_owed', 'amount_paid', 'payment_status', 'payment_reference',
+                        'created_at', 'paid_at', 'collection__title', 'collection__slug'
+                    ).order_by('-created_at')[:PHONE_LOOKUP_LIMIT]
+                )
+            contributors.sort(key=lambda c: c.created_at, reverse=True)
+
+            results = [
+                {
+                    'collection': {
+                        'title': c.collection.title,
+                        'slug': c.collection.slug
+                    },
+                    'amount_owed': float(c.amount_owed) if c.amount_owed is not None else None,
+                    'amount_paid': float(c.amount_paid),
+                    'payment_status': c.payment_status,
+                    'payment_reference': mask_reference(c.payment_reference),
+                    'created_at': c.created_at.isoformat(),
+                    'paid_at': c.paid_at.isoformat() if c.paid_at else None
+                }
+                for c in contributors[:PHONE_LOOKUP_LIMIT]
+            ]
+            cache.set(cache_key, results, PHONE_LOOKUP_CACHE_TIMEOUT)
+
+        if not results:
+            return response(
+                False,
+                "No contributions found for this phone number",
+                code=status.HTTP_404_NOT_FOUND
+            )
+
+        if fields:
+            # The cache holds full rows, so one entry serves every fieldset
+            results = [{name: row[name] for name in fields} for row in results]
+
+        return response(
+            True,
+            "Contributions retrieved successfully",
+            data={'count': len(results), 'contributions': results}
+        )
+
+    except Exception as e:
+        return response(
+            False,
+            "Error looking up contributions",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 
 # ==================== RECEIPT ENDPOINT ====================
 
+RECEIPT_FIELDS = ('receipt_id', 'reference', 'date', 'contributor', 'collection', 'payment')
+
+
 @api_view(['GET'])
 def get_receipt(request, contributor_id):
     """
     Get receipt for a contribution
+
+    Query params:
+        fields - optional comma-separated receipt fields to return (e.g. reference,payment)
     """
     try:
-        contributor = get_object_or_404(Contributor, id=contributor_id)
+        try:
+            fields = sparse_keys(request, RECEIPT_FIELDS)
+        except ValidationError as e:
+            return response(False, "Invalid fields", errors=e.detail, code=status.HTTP_400_BAD_REQUEST)
+
+        contributor = Contributor.objects.filter(id=contributor_id).first()
+        if contributor is None and is_sharded():
+            # Ids issued before sharding don't carry their bucket, so check every shard
+            for alias in shard_aliases():
+                contributor = Contributor.objects.using(alias).filter(id=contributor_id).first()
+                if contributor:
+                    break
+        if contributor is None:
+            raise Http404("No Contributor matches the given query.")
         
         if contributor.payment_status != 'paid':
             return response(
@@ -600,6 +1503,9 @@ def get_receipt(request, contributor_id):
             }
         }
         
+        if fields:
+            receipt_data = {name: receipt_data[name] for name in fields}
+
         # TODO: Generate actual PDF here
         # For now, return JSON data
         
@@ -615,4 +1521,46 @@ def get_receipt(request, contributor_id):
             "Error retrieving receipt",
             errors=str(e),
             code=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
\ No newline at end of file
+        )
+
+
+# ==================== BATCH ENDPOINT ====================
+
+@api_view(['POST'])
+def batch_requests(request):
+    """
+    Run several API calls in one round trip
+
+    Expected payload:
+    {
+        "parallel": false,    // optional: run consecutive GETs concurrently
+        "requests": [
+            {"id": "collection", "method": "GET", "path": "/api/collections/dues-0000001/"},
+            {"id": "dashboard", "method": "GET", "path": "/api/collections/dues-0000001/dashboard/?fields=name"},
+            {"id": "remind", "method": "POST", "path": "/api/collections/dues-0000001/remind/", "body": {...}}
+        ]
+    }
+    Each result has the sub-request's id, status and body, in request order.
+    Sub-requests are not one transaction (see split/batch.py).
+    """
+    try:
+        try:
+            subs = batch.parse(request.data)
+        except batch.BatchError as e:
+            return response(False, "Invalid batch", errors=str(e))
+
+        results = batch.run(request._request, subs, parallel=bool(request.data.get('parallel')))
+
+        return response(
+            True,
+            f"{len(results)} request(s) processed",
+            data={'responses': results}
+        )
+
+    except Exception as e:
+        return response(
+            False,
+            "Error processing batch",
+            errors=str(e),
+            code=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
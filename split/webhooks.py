@@ -0,0 +1,216 @@
+"""
+Outbound organizer webhooks
+
+An outbox handler copies contribution events into WebhookEvent rows for
+every matching subscription. The deliver_webhooks worker then coalesces
+each subscription's pending events into batched POSTs, sent concurrently
+over one pooled httpx.AsyncClient. Each body is signed with the
+subscription secret:
+
+    X-Kontribute-Timestamp: <unix seconds>
+    X-Kontribute-Signature: sha256=<hex HMAC of "<timestamp>.<body>">
+
+Failed batches are retried with backoff and moved to WebhookDeadLetter
+after MAX_ATTEMPTS. Every request goes through
+kontribute.egress.PinnedTransport, so a subscription whose host has come
+to resolve to an internal address fails instead of being delivered.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from kontribute.egress import PinnedTransport
+from kontribute.sharding import current_db
+
+from . import outbox
+from .models import WebhookDeadLetter, WebhookEvent, WebhookSubscription
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+FETCH_LIMIT = 1000
+CONCURRENCY = 20
+TIMEOUT_SECONDS = 10
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 3600
+
+
+def new_secret():
+    return secrets.token_hex(32)
+
+
+def sign(secret, timestamp, body):
+    message = f"{timestamp}.".encode() + body
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+def signed_headers(secret, body):
+    timestamp = str(int(time.time()))
+    return {
+        'Content-Type': 'application/json',
+        'User-Agent': 'Kontribute-Webhooks/1.0',
+        'X-Kontribute-Timestamp': timestamp,
+        'X-Kontribute-Signature': f"sha256={sign(secret, timestamp, body)}",
+    }
+
+
+def verify(secret, timestamp, body, signature):
+    """Check a signature header value; what receivers should do on their side"""
+    expected = f"sha256={sign(secret, timestamp, body)}"
+    return hmac.compare_digest(expected, signature)
+
+
+@outbox.register(outbox.CONTRIBUTION_CREATED, outbox.PAYMENT_CONFIRMED)
+def queue_webhook_events(event):
+    """Outbox handler: fan an event out to the collection's subscriptions"""
+    if not event.collection_id:
+        return
+
+    subscriptions = WebhookSubscription.objects.filter(
+        collection_id=event.collection_id,
+        is_active=True
+    )
+    # ignore_conflicts keeps redelivered outbox events from queueing twice
+    WebhookEvent.objects.bulk_create([
+        WebhookEvent(
+            subscription=subscription,
+            outbox_event_id=event.pk,
+            event_type=event.event_type,
+            payload=event.payload
+        )
+        for subscription in subscriptions
+        if subscription.wants(event.event_type)
+    ], ignore_conflicts=True)
+
+
+def _event_body(event):
+    return {
+        'id': event.outbox_event_id,
+        'type': event.event_type,
+        'created_at': event.created_at,
+        'data': event.payload,
+    }
+
+
+class WebhookSender:
+    """Owns an event loop and a pooled AsyncClient reused across worker runs"""
+
+    def __init__(self, concurrency=CONCURRENCY, timeout=TIMEOUT_SECONDS, transport=None):
+        import httpx
+
+        self.httpx = httpx
+        self.loop = asyncio.new_event_loop()
+        self.concurrency = concurrency
+        if transport is None:
+            transport = httpx.AsyncHTTPTransport(
+                limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+            )
+        # Subscription URLs are re-checked on every send: DNS may have changed since
+        self.client = httpx.AsyncClient(timeout=timeout, transport=PinnedTransport(transport))
+
+    async def _post(self, semaphore, subscription, body):
+        async with semaphore:
+            try:
+                result = await self.client.post(
+                    subscription.url,
+                    content=body,
+                    headers=signed_headers(subscription.secret, body)
+                )
+            except self.httpx.HTTPError as e:
+                return None, str(e) or e.__class__.__name__
+        if 200 <= result.status_code < 300:
+            return result.status_code, None
+        return result.status_code, f"HTTP {result.status_code}"
+
+    async def _send_all(self, batches):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*(
+            self._post(semaphore, subscription, body)
+            for subscription, _, body in batches
+        ))
+
+    def send(self, batches):
+        """batches: list of (subscription, events, body). Returns [(status_code, error)]"""
+        return self.loop.run_until_complete(self._send_all(batches))
+
+    def close(self):
+        self.loop.run_until_complete(self.client.aclose())
+        self.loop.close()
+
+
+def _backoff(attempts):
+    return timedelta(seconds=min(2 ** attempts * 30, MAX_BACKOFF_SECONDS))
+
+
+def _build_batches(events, batch_size):
+    by_subscription = {}
+    for event in events:
+        by_subscription.setdefault(event.subscription_id, []).append(event)
+
+    batches = []
+    for subscription_events in by_subscription.values():
+        subscription = subscription_events[0].subscription
+        for i in range(0, len(subscription_events), batch_size):
+            chunk = subscription_events[i:i + batch_size]
+            body = json.dumps(
+                {'events': [_event_body(e) for e in chunk]},
+                cls=DjangoJSONEncoder
+            ).encode()
+            batches.append((subscription, chunk, body))
+    return batches
+
+
+def deliver_pending(sender, batch_size=BATCH_SIZE, limit=FETCH_LIMIT):
+    """Send one round of due webhook events. Returns (delivered, failed, dead) event counts."""
+    now = timezone.now()
+    events = list(
+        WebhookEvent.objects.filter(
+            next_attempt_at__lte=now,
+            subscription__is_active=True
+        ).select_related('subscription').order_by('id')[:limit]
+    )
+    if not events:
+        return 0, 0, 0
+
+    batches = _build_batches(events, batch_size)
+    results = sender.send(batches)
+
+    delivered = failed = dead = 0
+    with db_transaction.atomic(using=current_db()):
+        for (subscription, chunk, _), (status_code, error) in zip(batches, results):
+            ids = [e.pk for e in chunk]
+            if error is None:
+                WebhookEvent.objects.filter(pk__in=ids).delete()
+                delivered += len(chunk)
+                continue
+
+            attempts = max(e.attempts for e in chunk) + 1
+            if attempts >= MAX_ATTEMPTS:
+                WebhookDeadLetter.objects.create(
+                    subscription=subscription,
+                    events=[_event_body(e) for e in chunk],
+                    attempts=attempts,
+                    status_code=status_code,
+                    last_error=error
+                )
+                WebhookEvent.objects.filter(pk__in=ids).delete()
+                dead += len(chunk)
+            else:
+                WebhookEvent.objects.filter(pk__in=ids).update(
+                    attempts=attempts,
+                    next_attempt_at=now + _backoff(attempts),
+                    last_error=error
+                )
+                failed += len(chunk)
+            logger.warning("Webhook delivery to %s failed: %s", subscription.url, error)
+
+    return delivered, failed, dead